@@ -1,49 +1,55 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Header, Request
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Header, Request, Response
 from sqlalchemy.orm import Session, aliased
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, or_, and_, select
 from datetime import datetime, date, timedelta
 from typing import List
-import csv
-import azure.cognitiveservices.speech as speechsdk
 import os
 import json
+import asyncio
 import re # 引入正则库
 from dotenv import load_dotenv
-from openai import OpenAI
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
+from fastapi.exceptions import RequestValidationError
 import random
 import stripe
 
-from .database import SessionLocal
+from .database import SessionLocal, AsyncSessionLocal, release_db, open_read_session, open_async_read_session, wrote_recently, replicas
 from .model import Word, UserWordProgress, QuizMistake, UserGrammarAnalysis, UserFeedback
-from .schemas import WordDTO, StudySubmit, ArticleDTO, QuizItem, MistakeCreate, MistakeDTO, WritingSubmit, WritingDTO, FeedbackCreate
-from .srs_algo import calculate_review
+from .schemas import (WordDTO, StudySubmit, StudyResult, StudyBatchSubmit, ArticleDTO, QuizItem, MistakeCreate, MistakeDTO, WritingSubmit, WritingDTO, WritingFeedback, FeedbackCreate,
+                      GrammarDTO, MistakePage, WritingHistoryPage, GrammarHistoryPage)
+from .study_queue import fetch_study_queue
+from .lexicon import get_lexicon, build_lexicon
+from .glossary import get_article_glossary
+from .importer import import_ecdict, refresh_after_import
+from .services.llm import llm
+from .services.tts import tts_jobs
+from .levels import LEVEL_CONFIG
+from .logs import get_logger
+from .article_gen import (
+    generate_article, create_article_quiz, pregenerate_article_quiz, EmptyVocabularyError, PREGENERATE_QUIZ,
+    pick_article_words, build_article_prompt, save_article
+)
+from .article_pool import claim_pooled_article, request_refill
+from .streaming import sse, sse_response, stream_json_events
+from .study_submit import apply_study_results
+from .user_context import UserContext, invalidate_user
+from .quota import consume_quota
+from .pagination import PageParams, keyset_page
+from .mistakes import save_mistakes
 
-from .model import Article, UserStats, UserWriting, RedemptionCode 
+from .model import Article, UserStats, UserLevelStats, UserWriting, RedemptionCode, ArticleQuiz
 
 # 1. 加载本地 .env 文件 (否则读不到 API Key)
 load_dotenv()
 
-# 2. 初始化 DeepSeek 客户端
-# 即使部署到云端，这段代码也兼容（云端会自动注入环境变量，本地则读取 .env）
-client = OpenAI(
-    api_key=os.getenv("DEEPSEEK_API_KEY"),
-    base_url=os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com")
-)
+# 2. DeepSeek 调用统一走 services/llm.py 里的异步网关 (限流 + 超时)
 
 stripe.api_key = os.getenv("STRIPE_API_KEY")
 WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
 
-# 等级配置：数据库Tag -> AI Prompt 描述
-LEVEL_CONFIG = {
-    "zk": {"name": "中考", "prompt": "Middle School Student (approx. 1500 vocabulary)", "total": 1600},
-    "gk": {"name": "高考", "prompt": "High School Student (approx. 3500 vocabulary)", "total": 3500},
-    "cet4": {"name": "CET-4", "prompt": "College Student (CET-4 level)", "total": 4500},
-    "cet6": {"name": "CET-6", "prompt": "College Student (CET-6 level)", "total": 6000},
-    "ky": {"name": "考研", "prompt": "Postgraduate Entrance Exam candidate", "total": 5500},
-    "ielts": {"name": "雅思", "prompt": "IELTS candidate (Band 7.0 target)", "total": 8000},
-    "toefl": {"name": "托福", "prompt": "TOEFL candidate (Score 100+ target)", "total": 10000},
-}
+log = get_logger("api")
+
 
 class GrammarRequest(BaseModel):
     sentence: str
@@ -67,6 +73,12 @@ router = APIRouter()
 def get_current_user_id(x_user_id: str = Header(...)):
     return x_user_id
 
+def get_beacon_user_id(x_user_id: str = Header(None), uid: str = None):
+    # 前端关页面时用 navigator.sendBeacon 提交，它不能带自定义请求头，用户 ID 放在 ?uid= 里
+    if not (x_user_id or uid):
+        raise HTTPException(status_code=422, detail="Missing x-user-id header")
+    return x_user_id or uid
+
 def get_db():
     db = SessionLocal()
     try:
@@ -74,90 +86,99 @@ def get_db():
     finally:
         db.close()
 
-def run_import_task():
-    print("🚀 开始后台导入单词任务...")
+async def get_async_db():
+    # 高频接口走异步引擎：等数据库时不占线程池，几个 worker 就能扛住大量同时在线的学生
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def read_from_primary(request: Request):
+    """读己之写：前端声明刚写过 (X-Read-Primary: 1)，或者这个用户几秒内在本进程写过，就别读副本"""
+    if request.headers.get("x-read-primary") == "1":
+        return True
+    user_id = request.headers.get("x-user-id")
+    return bool(user_id) and wrote_recently(user_id)
+
+def get_read_db(request: Request):
+    # 只读接口：有副本读副本 (轮询、连不上自动换)，没配副本就是主库
+    db = open_read_session(primary=read_from_primary(request))
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_read_db(request: Request):
+    db = await open_async_read_session(primary=read_from_primary(request))
+    try:
+        yield db
+    finally:
+        await db.close()
+
+def run_import_task(start_offset: int = 0):
+    log.info("import_started", offset=start_offset)
     csv_path = 'scripts/ecdict.csv' # Render 上文件路径是相对于根目录的
     
     if not os.path.exists(csv_path):
-        print(f"❌ 找不到文件: {csv_path}")
+        log.error("import_file_missing", path=csv_path)
         return
 
+    def report(stats):
+        log.info("import_progress", inserted=stats["inserted"], rows_per_sec=round(stats["rows_per_sec"]), offset=stats["offset"])
+
     db = SessionLocal()
     try:
-        with open(csv_path, newline='', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            count = 0
-            for row in reader:
-                tags = row.get('tag', '')
-                if 'zk' in tags or 'gk' in tags: # 只导入中高考
-                    # 检查是否存在
-                    existing = db.query(Word).filter(Word.spell == row['word']).first()
-                    if not existing:
-                        word = Word(
-                            spell=row['word'],
-                            phonetic=row['phonetic'],
-                            definition=row['definition'],
-                            translation=row['translation'],
-                            exchange=row['exchange'],
-                            tag=tags
-                        )
-                        db.add(word)
-                        count += 1
-                        if count % 100 == 0:
-                            db.commit()
-                            print(f"已导入 {count} ...")
-            db.commit()
-            print(f"✅ 导入完成！共 {count} 个单词。")
+        # 只导入中高考
+        stats = import_ecdict(db, csv_path, tags=("zk", "gk"), start_offset=start_offset, on_chunk=report)
+        log.info("import_done", inserted=stats["inserted"], seconds=round(stats["elapsed"], 1))
+        refresh_after_import(db)
     except Exception as e:
-        print(f"❌ 导入出错: {e}")
+        log.exception("import_failed", error=str(e))
     finally:
         db.close()
 
+# 依赖注入：本请求的用户上下文 (UserStats 只查一次，等级等字段有跨请求缓存)
+def get_user_context(db: Session = Depends(get_db), user_id: str = Depends(get_current_user_id)):
+    return UserContext(db, user_id)
+
 # 新增这个辅助函数
-def check_and_consume_quota(user_id: str, db: Session, quota_type: str = "reading"):
+def check_and_consume_quota(ctx: UserContext, quota_type: str = "reading"):
     """
     quota_type: "reading" (limit 3) or "writing" (limit 1)
     """
-    # 1. 获取用户统计
-    user_stats = db.query(UserStats).filter(UserStats.user_id == user_id).first()
-    if not user_stats:
-        # 如果是新用户，先创建
-        user_stats = UserStats(user_id=user_id, daily_target=15, today_ai_usage=0, last_ai_date=date.today())
-        db.add(user_stats)
-        db.commit()
-        db.refresh(user_stats)
-
-    # 2. 如果是会员，且未过期，直接通过
-    if user_stats.is_pro and user_stats.pro_until and user_stats.pro_until > datetime.utcnow():
+    # 1. 如果是会员，且未过期，直接通过 (会员状态走缓存，不查库)
+    if ctx.is_pro:
         return True
 
-    # 3. 检查日期：如果是新的一天，重置计数器
-    if user_stats.last_ai_date != date.today():
-        user_stats.usage_reading = 0
-        user_stats.usage_writing = 0
-        user_stats.last_ai_date = date.today()
-        db.commit()
-
-    # 4. 定义限额配置
-    LIMITS = {
-        "reading": 3,
-        "writing": 1  # 写作和语法共用这个昂贵的额度
-    }
-
-    current_usage = getattr(user_stats, f"usage_{quota_type}")
-    limit = LIMITS.get(quota_type, 1)
-
-    if current_usage >= limit:
+    # 2. 一条条件 UPDATE 完成跨天清零 + 检查 + 扣费，并发请求也不会多扣 / 多放
+    if consume_quota(ctx.db, ctx.user_id, quota_type) is None:
         raise HTTPException(
             status_code=403,
             detail=f"Daily limit reached for {quota_type}. Upgrade to Pro!"
         )
+    return True
 
+# async 的 AI 接口：同步 Session 的操作都用 asyncio.to_thread 放到线程里跑，事件循环只用来等 AI。
+# 在循环里直接查库，一个慢查询 / 锁等待会卡住这个 worker 上的所有请求
+def charge_and_release(ctx: UserContext, quota_type: str):
+    """扣额度，再结束事务把连接还回去 (接下来要等 AI)"""
+    check_and_consume_quota(ctx, quota_type=quota_type)
+    release_db(ctx.db)
 
-    # 5. 扣费 (计数 + 1)
-    setattr(user_stats, f"usage_{quota_type}", current_usage + 1)
-    db.commit()
-    return True
+def load_level(ctx: UserContext):
+    """读出等级 (跨请求缓存没命中时要查库)，再把连接还回去"""
+    level_tag = ctx.level
+    release_db(ctx.db)
+    return level_tag
+
+async def complete_charged(ctx: UserContext, quota_type: str, endpoint: str, prompt: str, **kwargs):
+    """
+    走缓存的 AI 接口 (grammar / writing)：同样的请求已经有结果就直接返回，不扣额度；
+    没命中才扣额度再调 AI
+    """
+    content = await llm.cached(endpoint, prompt, **kwargs)
+    if content is None:
+        await asyncio.to_thread(charge_and_release, ctx, quota_type)
+        content = await llm.complete(endpoint, prompt, **kwargs)
+    return content
 
 @router.post("/payment/create-checkout-session")
 def create_checkout_session(plan: str = "monthly", user_id: str = Depends(get_current_user_id)):
@@ -202,12 +223,14 @@ async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
             # 简单处理：给30天，严谨做法是解析 subscription 对象看具体时间
             user_stats.pro_until = datetime.utcnow() + timedelta(days=30)
             db.commit()
-            print(f"💰 用户 {user_id} 充值成功！")
+            invalidate_user(user_id)
+            log.info("payment_completed", user_id=user_id)
 
     return {"status": "success"}
 
 @router.post("/payment/redeem")
-def redeem_code(data: RedeemRequest, db: Session = Depends(get_db), user_id: str = Depends(get_current_user_id)):
+def redeem_code(data: RedeemRequest, db: Session = Depends(get_db), user_id: str = Depends(get_current_user_id),
+                ctx: UserContext = Depends(get_user_context)):
     # 1. 查找代码
     # 移除空格，转大写，防止用户手误
     clean_code = data.code.strip().upper()
@@ -221,11 +244,8 @@ def redeem_code(data: RedeemRequest, db: Session = Depends(get_db), user_id: str
         raise HTTPException(status_code=400, detail="无效的兑换码或已被使用")
     
     # 2. 找到用户
-    user_stats = db.query(UserStats).filter(UserStats.user_id == user_id).first()
-    if not user_stats:
-        # 如果是新用户还没记录，先创建（虽然理论上登录就有，但防万一）
-        user_stats = UserStats(user_id=user_id)
-        db.add(user_stats)
+    # 如果是新用户还没记录，先创建（虽然理论上登录就有，但防万一）
+    user_stats = ctx.stats(create=True)
     
     # 3. 计算过期时间
     days = 30 if code_record.plan_type == 'monthly' else 365
@@ -244,6 +264,7 @@ def redeem_code(data: RedeemRequest, db: Session = Depends(get_db), user_id: str
     code_record.used_at = datetime.utcnow()
     
     db.commit()
+    ctx.invalidate()
     
     return {"status": "success", "new_expiry": user_stats.pro_until}
 
@@ -270,27 +291,29 @@ def generate_codes(amount: int, plan: str, secret: str):
     return {"codes": new_codes}
 
 @router.get("/user/dashboard")
-def get_user_dashboard(db: Session = Depends(get_db), user_id: str = Depends(get_current_user_id)):
-    
+async def get_user_dashboard(db: AsyncSession = Depends(get_async_read_db), user_id: str = Depends(get_current_user_id)):
+    # 一条查询读一行：UserStats + 当前等级的已学计数 (都是提交学习时增量维护的)
+    row = (await db.execute(
+        select(UserStats, UserLevelStats.learned_count).outerjoin(
+            UserLevelStats,
+            and_(UserLevelStats.user_id == UserStats.user_id, UserLevelStats.level == UserStats.current_level)
+        ).where(UserStats.user_id == user_id)
+    )).first()
+    user_stats, level_learned = row if row else (None, None)
+
     # 1. 总共已背单词数 (is_learned = 1)
-    total_learned = db.query(UserWordProgress).filter(
-        UserWordProgress.user_id == user_id,
-        UserWordProgress.is_learned == 1
-    ).count()
+    total_learned = 0
     
     # 2. 剩余待复习/新词 (今日任务)
-    # 逻辑：找出 next_review <= now 的词 + 还没背的新词(这里简单模拟一下，假设每日固定20个)
-    # 为了 MVP 简单展示，我们直接查 "queue" 接口同样的逻辑，看有多少个
-    daily_target = 15 # 暂时写个模拟数据，或者你可以复用 get_study_queue 的计数逻辑
+    daily_target = 15 # 新用户默认目标
     
     # 3. 真实：获取打卡天数 === 修改了这里 ===
     streak_days = 0
     daily_progress = 0 # 默认为0
     current_level = "zk" # 默认
 
-    user_stats = db.query(UserStats).filter(UserStats.user_id == user_id).first()
-
     if user_stats:
+        total_learned = user_stats.total_learned_count or 0
         streak_days = user_stats.streak_days
         daily_target = user_stats.daily_target or 15 # 获取数据库里的目标
         current_level = user_stats.current_level or "zk"
@@ -302,12 +325,15 @@ def get_user_dashboard(db: Session = Depends(get_db), user_id: str = Depends(get
 
     # 获取配置里的总数
     vocab_limit = LEVEL_CONFIG.get(current_level, {}).get("total", 2000)
+    level_learned = level_learned or 0
     
     return {
         "total_learned": total_learned,
         "today_task": daily_target,
         "streak_days": streak_days,
         "vocabulary_limit": vocab_limit,
+        "level_learned": level_learned, # 当前等级已学 / 还剩多少
+        "level_remaining": max(0, vocab_limit - level_learned),
         "daily_progress": daily_progress, # <--- 返回给前端的新字段
         "current_level": current_level,
         "level_display": LEVEL_CONFIG.get(current_level, {}).get("name", "中考")
@@ -315,159 +341,128 @@ def get_user_dashboard(db: Session = Depends(get_db), user_id: str = Depends(get
 
 # 1. 获取学习队列 (新词 + 需要复习的旧词)
 @router.get("/study/queue", response_model=List[WordDTO])
-def get_study_queue(db: Session = Depends(get_db), user_id: str = Depends(get_current_user_id)):
-    
-    # 1. 先查用户的等级
-    user_stats = db.query(UserStats).filter(UserStats.user_id == user_id).first()
-    level_tag = user_stats.current_level if user_stats else "zk"
+async def get_study_queue(db: AsyncSession = Depends(get_async_db), user_id: str = Depends(get_current_user_id)):
+    def run(session: Session):
+        ctx = UserContext(session, user_id)
+        # 1. 先查用户的等级
+        level_tag = ctx.level
 
-    # A. 找需要复习的词 (next_review <= now)
-    review_list = db.query(Word).join(UserWordProgress).filter(
-        UserWordProgress.user_id == user_id,
-        UserWordProgress.next_review <= datetime.utcnow()
-    ).limit(20).all()
-
-    # 如果复习词不够 10 个，就加点新词
-    if len(review_list) < 10:
-        limit_new = 10 - len(review_list)
-        # 找还没有进度的词 (LEFT JOIN check)
-        # 子查询：找出该用户学过的 word_id
-        subquery = db.query(UserWordProgress.word_id).filter(UserWordProgress.user_id == user_id)
-        
-        new_words = db.query(Word).filter(
-            Word.id.notin_(subquery),
-            Word.tag.contains(level_tag), # <--- 关键修改：只根据当前等级筛选
-            Word.ai_sentence != None  # 只出有 AI 例句的词
-        ).order_by(func.random()).limit(limit_new).all()
-        
-        review_list.extend(new_words)
+        # 2. 复习词走 (user_id, next_review) 索引，新词按用户自己的洗牌顺序从游标处读
+        return fetch_study_queue(session, user_id, level_tag, seed=ctx.deck_seed)
 
-    return review_list
+    # 选词逻辑是同步写的，run_sync 让它跑在异步连接上，不阻塞事件循环
+    return await db.run_sync(run)
 
-# 2. 提交学习结果
+# 2. 提交学习结果 (就是只有一张卡片的批量提交)
 @router.post("/study/submit")
-def submit_study(data: StudySubmit, db: Session = Depends(get_db), user_id: str = Depends(get_current_user_id)):
-    
-    # 查找或创建进度记录
-    progress = db.query(UserWordProgress).filter(
-        UserWordProgress.user_id == user_id,
-        UserWordProgress.word_id == data.word_id
-    ).first()
+async def submit_study(data: StudySubmit, db: AsyncSession = Depends(get_async_db), user_id: str = Depends(get_current_user_id)):
+    result = StudyResult(word_id=data.word_id, quality=data.quality)
+    next_reviews = await db.run_sync(apply_study_results, user_id, [result])
+    return {"status": "ok", "next_review": next_reviews[data.word_id]}
+
+# 3. 批量提交一整组卡片 (一次请求、一个事务)
+async def read_study_batch(request: Request):
+    # sendBeacon 发的是 text/plain (不触发 CORS 预检)，所以不看 Content-Type，直接按 JSON 解析
+    try:
+        return StudyBatchSubmit.model_validate_json(await request.body())
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
 
-    if not progress:
-        progress = UserWordProgress(
-            user_id=user_id, 
-            word_id=data.word_id, 
-            easiness=2.5, 
-            interval=0, 
-            repetitions=0
-        )
-        db.add(progress)
+@router.post("/study/submit_batch")
+async def submit_study_batch(data: StudyBatchSubmit = Depends(read_study_batch), db: AsyncSession = Depends(get_async_db),
+                             user_id: str = Depends(get_beacon_user_id)):
+    if not data.results:
+        return {"status": "ok", "count": 0, "next_review": {}}
 
-    # 调用算法计算
-    ef, interval, reps, next_date = calculate_review(
-        data.quality, progress.easiness, progress.interval, progress.repetitions
-    )
+    next_reviews = await db.run_sync(apply_study_results, user_id, data.results)
+    return {"status": "ok", "count": len(data.results), "next_review": next_reviews}
 
-    # 更新数据库
-    progress.easiness = ef
-    progress.interval = interval
-    progress.repetitions = reps
-    progress.next_review = next_date
-    progress.is_learned = 1
-    
-    # === 处理打卡逻辑 ===
-    today = date.today()
-
-    # 获取或创建用户统计
-    user_stats = db.query(UserStats).filter(UserStats.user_id == user_id).first()
-    if not user_stats:
-        user_stats = UserStats(user_id=user_id, streak_days=0, last_study_date=None, daily_progress=0)
-        db.add(user_stats)
-
-    last_date = user_stats.last_study_date.date() if user_stats.last_study_date else None
-
-    if last_date == today:
-        # 今天已经学过了，累加今日进度
-        user_stats.daily_progress += 1
-    elif last_date == today - timedelta(days=1):
-        # 昨天打卡了，连续天数+1
-        user_stats.streak_days += 1
-        user_stats.daily_progress = 1
-        user_stats.last_study_date = datetime.utcnow()
-    else:
-        # 断签了（或者是第一次），Streak重置为1，今日进度重置为1
-        user_stats.streak_days = 1
-        user_stats.daily_progress = 1
-        user_stats.last_study_date = datetime.utcnow()
+@router.post("/reading/generate")
+async def generate_new_article(background_tasks: BackgroundTasks, pregenerate_quiz: bool = PREGENERATE_QUIZ,
+                               db: Session = Depends(get_db), user_id: str = Depends(get_current_user_id),
+                               ctx: UserContext = Depends(get_user_context)):
+    # 1. 鉴权扣费 + 获取等级
+    def claim():
+        check_and_consume_quota(ctx, quota_type="reading")
+        level_tag = ctx.level
+        # 2. 先从文章池里领一篇现成的，领到了直接返回，后台再补货
+        article = claim_pooled_article(db, level_tag, user_id)
+        if article:
+            return level_tag, article.id, None
+        # 用这个学生正在学的词来写
+        return level_tag, None, pick_article_words(db, level_tag, user_id=user_id, seed=ctx.deck_seed)
+
+    level_tag, pooled_id, words = await asyncio.to_thread(claim)
+    if pooled_id:
+        request_refill()
+        return {"status": "ok", "article_id": pooled_id, "pooled": True}
+
+    # 3. 池子空了：现场调用 DeepSeek 生成
+    try:
+        article = await generate_article(db, level_tag, words=words)
+        request_refill()
 
-    db.commit()
-    return {"status": "ok", "next_review": next_date}
+        # 顺手把测验也出好，学生读完点 "AI 出题" 时直接读库
+        if pregenerate_quiz:
+            background_tasks.add_task(pregenerate_article_quiz, article.id, article.content, level_tag)
 
-@router.post("/reading/generate")
-def generate_new_article(db: Session = Depends(get_db), user_id: str = Depends(get_current_user_id)):
-    # === ✅ 一行代码搞定鉴权与扣费 ===
-    check_and_consume_quota(user_id, db, quota_type="reading")
-    # 1. 获取等级
-    user_stats = db.query(UserStats).filter(UserStats.user_id == user_id).first()
-    level_tag = user_stats.current_level if user_stats else "zk"
-    level_prompt = LEVEL_CONFIG[level_tag]["prompt"] # 获取 "IELTS candidate..."
-    # 1. 随机选词 (模拟：从库里随机挑 5 个中考词)
-    # 实际产品中，这里应该选用户"刚加入生词本"的词
-    words = db.query(Word).filter(Word.tag.contains(level_tag)).order_by(func.random()).limit(8).all()
-    if not words:
-        raise HTTPException(status_code=400, detail="Word database is empty")
-        
-    word_list_str = ", ".join([w.spell for w in words])
-    word_ids = [w.id for w in words]
-    
-    print(f"🤖 Generating article with: {word_list_str}")
+        return {"status": "ok", "article_id": article.id, "pooled": False}
 
-    # 2. 调用 DeepSeek
-    prompt = f"""
-    Write a short English article for a {level_prompt}.
-    Difficulty Level: {level_tag.upper()}.
-    It MUST include these words: {word_list_str}.
-    
-    Return strict JSON:
-    {{
-        "title": "Title Here",
-        "content": "Story content...",
-        "translation": "Chinese translation..."
-    }}
-    """
-    
-    try:
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[{"role": "user", "content": prompt}],
-            response_format={"type": "json_object"}
-        )
-        data = json.loads(response.choices[0].message.content)
-        
-        # 3. 存入数据库
-        article = Article(
-            title=data['title'],
-            content=data['content'],
-            translation=data.get('translation', ''), # 兼容有的AI没返回翻译
-            difficulty=level_tag,
-            vocab_list=word_ids
-        )
-        db.add(article)
-        db.commit()
-        db.refresh(article)
-        
-        return {"status": "ok", "article_id": article.id}
-        
+    except EmptyVocabularyError:
+        raise HTTPException(status_code=400, detail="Word database is empty")
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Gen Article Error: {e}")
+        log.exception("article_generate_failed", level=level_tag, error=str(e))
         raise HTTPException(status_code=500, detail="Failed to generate article")
 
+# 流式生成文章：标题、正文边生成边推 SSE；文章池里有现成的就直接推完
+@router.post("/reading/generate/stream")
+def generate_new_article_stream(background_tasks: BackgroundTasks, pregenerate_quiz: bool = PREGENERATE_QUIZ,
+                                db: Session = Depends(get_db), user_id: str = Depends(get_current_user_id),
+                                ctx: UserContext = Depends(get_user_context)):
+    check_and_consume_quota(ctx, quota_type="reading")
+    level_tag = ctx.level
+
+    article = claim_pooled_article(db, level_tag, user_id)
+    if article:
+        request_refill()
+        pooled = {"title": article.title, "content": article.content, "translation": article.translation}
+        done = {"article_id": article.id, "pooled": True}
+
+        def replay():
+            for key, value in pooled.items():
+                yield sse("field", {"key": key, "value": value})
+            yield sse("done", done)
+        return sse_response(replay())
+
+    words = pick_article_words(db, level_tag, user_id=user_id, seed=ctx.deck_seed)
+    if not words:
+        raise HTTPException(status_code=400, detail="Word database is empty")
+    word_ids = [w.id for w in words]
+    prompt = build_article_prompt(level_tag, ", ".join([w.spell for w in words]))
+    release_db(db) # 流可能持续几十秒，别一直占着连接
+
+    def on_complete(data):
+        session = SessionLocal()
+        try:
+            article = save_article(session, level_tag, word_ids, data)
+            request_refill()
+            if pregenerate_quiz:
+                background_tasks.add_task(pregenerate_article_quiz, article.id, article.content, level_tag)
+            return {"article_id": article.id, "pooled": False}
+        finally:
+            session.close()
+
+    return sse_response(stream_json_events(
+        "article", prompt, on_complete,
+        text_keys=["content"], response_format={"type": "json_object"}
+    ))
+
 @router.get("/reading/list", response_model=List[ArticleDTO])
-def get_articles(db: Session = Depends(get_db), user_id: str = Depends(get_current_user_id)):
+def get_articles(db: Session = Depends(get_read_db), user_id: str = Depends(get_current_user_id)):
     # 1. 查用户等级
-    user_stats = db.query(UserStats).filter(UserStats.user_id == user_id).first()
-    level_tag = user_stats.current_level if user_stats else "zk"
+    level_tag = UserContext(db, user_id).level
 
     # 默认过滤条件
     query = db.query(Article)
@@ -479,171 +474,109 @@ def get_articles(db: Session = Depends(get_db), user_id: str = Depends(get_curre
 
     # 临时方案：如果是新生成的文章，我们按 ID 倒序
     # 更好的方案是：
-    return query.filter(Article.difficulty == level_tag).order_by(Article.id.desc()).limit(10).all()
+    # 文章池里还没被领走的文章不展示
+    return query.filter(
+        Article.difficulty == level_tag,
+        or_(Article.is_pooled.isnot(True), Article.claimed_by.isnot(None))
+    ).order_by(Article.id.desc()).limit(10).all()
 
     #return query.order_by(Article.id.desc()).limit(10).all()
 
 @router.get("/reading/{article_id}", response_model=ArticleDTO)
-def get_article_detail(article_id: int, db: Session = Depends(get_db)):
+def get_article_detail(article_id: int, db: Session = Depends(get_read_db)):
     article = db.query(Article).filter(Article.id == article_id).first()
     if not article:
         raise HTTPException(status_code=404, detail="Article not found")
     return article
 
-@router.get("/reading/{article_id}/audio")
-def get_article_audio(article_id: int, db: Session = Depends(get_db)):
-    # 1. 查文章
-    article = db.query(Article).filter(Article.id == article_id).first()
-    if not article:
+# 阅读页一次拿到整篇文章的词表，点词不用再逐个请求 /word/lookup
+@router.get("/reading/{article_id}/glossary")
+def get_article_glossary_api(article_id: int, db: Session = Depends(get_read_db), user_id: str = Depends(get_current_user_id)):
+    row = db.query(Article.content).filter(Article.id == article_id).first()
+    if not row:
         raise HTTPException(status_code=404, detail="Article not found")
+    return get_article_glossary(db, article_id, row.content, user_id)
 
-    # 2. 定义文件名 (用文章ID命名)
-    filename = f"article_{article_id}.mp3"
-    file_path = f"static/audio/{filename}"
-    
-    # 3. 检查文件是否已存在 (缓存机制)
-    # 如果文件存在且大小不为0，直接返回 URL
-    if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
-        # 生产环境 URL (注意：要把这个换成你的域名)
-        # 或者为了通用，前端只拿相对路径，自己拼域名
-        return {"audio_url": f"/static/audio/{filename}"}
-
-    # 4. 调用 Azure 生成
-    print(f"🎙️ Generating audio for article {article_id} via Azure...")
-    
-    speech_config = speechsdk.SpeechConfig(
-        subscription=os.getenv("AZURE_SPEECH_KEY"), 
-        region=os.getenv("AZURE_SPEECH_REGION")
-    )
-    
-    # 设置声音 (推荐 JennyNeural，非常自然的女声)
-    speech_config.speech_synthesis_voice_name='en-US-JennyNeural' 
-    
-    # 设置输出格式为 MP3
-    speech_config.set_speech_synthesis_output_format(speechsdk.SpeechSynthesisOutputFormat.Audio16Khz32KBitRateMonoMp3)
-
-    # 设置输出文件
-    audio_config = speechsdk.audio.AudioOutputConfig(filename=file_path)
-
-    # 创建合成器
-    synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=audio_config)
-
-    # 开始合成 (这里用 speak_text_async 避免阻塞太久，但为了简单我们等待结果)
-    result = synthesizer.speak_text_async(article.content).get()
-
-    if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
-        return {"audio_url": f"/static/audio/{filename}"}
-    elif result.reason == speechsdk.ResultReason.Canceled:
-        cancellation_details = result.cancellation_details
-        print(f"❌ Azure TTS Error: {cancellation_details.reason}")
-        if cancellation_details.reason == speechsdk.CancellationReason.Error:
-            print(f"Error details: {cancellation_details.error_details}")
-        raise HTTPException(status_code=500, detail="TTS generation failed")
+@router.get("/reading/{article_id}/audio")
+async def get_article_audio(article_id: int, response: Response, db: Session = Depends(get_db)):
+    """
+    文章朗读：已经合成好直接返回 audio_url；否则提交 (或加入) 合成任务，
+    返回 202 + 任务状态，前端隔一会儿再请求同一个地址即可。
+    """
+    # 1. 查文章 (同步查库放到线程里；提交任务要用 create_task，必须留在事件循环上)
+    def load_content():
+        row = db.query(Article.content).filter(Article.id == article_id).first()
+        return row.content if row else None
 
-@router.post("/reading/{article_id}/quiz", response_model=List[QuizItem])
-def generate_quiz(article_id: int, db: Session = Depends(get_db), user_id: str = Depends(get_current_user_id)):
-    # === ✅ 一行代码搞定鉴权与扣费 ===
-    check_and_consume_quota(user_id, db, quota_type="reading")
-    # 1. 获取等级
-    user_stats = db.query(UserStats).filter(UserStats.user_id == user_id).first()
-    level_tag = user_stats.current_level if user_stats else "zk"
-    level_prompt = LEVEL_CONFIG[level_tag]["prompt"] # 获取 "IELTS candidate..."
-    # 1. 查出文章
-    article = db.query(Article).filter(Article.id == article_id).first()
-    if not article:
+    content = await asyncio.to_thread(load_content)
+    if content is None:
         raise HTTPException(status_code=404, detail="Article not found")
 
-    # 2. 调用 DeepSeek
-    print(f"🤖 AI正在为文章 {article.title} 出题...") # 加个日志方便调试
-
-    prompt = f"""
-    Based on the text below, create 3 multiple-choice questions for a {level_prompt}.
-    Difficulty Level: {level_tag.upper()}.
-    Text:
-    {article.content}
-
-    You MUST return the result as a pure JSON list.
-    Strict format requirements:
-    1. Do not use Markdown formatting (no ```json or ```).
-    2. The root element must be a LIST [].
-    3. Each item must have: "question", "options" (list of 4 strings), "answer" (just A, B, C, or D), and "explanation".
-
-    Example:
-    [
-      {{
-        "question": "What is the main idea?",
-        "options": ["A. Idea 1", "B. Idea 2", "C. Idea 3", "D. Idea 4"],
-        "answer": "A",
-        "explanation": "Because..."
-      }}
-    ]
-    """
-
-    try:
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.1, # 降低随机性，保证格式稳定
-            response_format={"type": "json_object"} # 强制 JSON
-        )
-        content = response.choices[0].message.content
-        print(f"🤖 AI原始返回: {content}") # 打印出来看看，如果报错方便排查
+    # 2. 按内容哈希命名；同一篇文章 (同样的文字) 的并发请求共用一个任务
+    job = tts_jobs.submit_text(content)
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail="TTS generation failed")
+    if job.status != "done":
+        response.status_code = 202
+    return job.to_dict()
 
-        # === 增强型 JSON 清洗逻辑 ===
-        # 1. 有时候 AI 还是会返回 ```json，手动去掉
-        if "```" in content:
-            content = content.replace("```json", "").replace("```", "")
+@router.get("/tts/jobs/{job_id}")
+def get_tts_job(job_id: str):
+    job = tts_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
 
-        # 2. 尝试解析
-        data = json.loads(content)
+@router.post("/reading/{article_id}/quiz", response_model=List[QuizItem])
+async def generate_quiz(article_id: int, db: Session = Depends(get_db), user_id: str = Depends(get_current_user_id),
+                        ctx: UserContext = Depends(get_user_context)):
+    def prepare():
+        # 1. 获取等级
+        level_tag = ctx.level
+
+        # 2. 已经出过题就直接读库，不再调 AI，也不扣额度
+        stored = db.query(ArticleQuiz.items).filter(
+            ArticleQuiz.article_id == article_id,
+            ArticleQuiz.level == level_tag
+        ).first()
+        if stored:
+            return level_tag, stored.items, None
 
-        # 3. 兼容性处理：如果返回的是 {"quizzes": [...]} 或者是 {"questions": [...]}
-        if isinstance(data, dict):
-            for key in ["quizzes", "questions", "items"]:
-                if key in data and isinstance(data[key], list):
-                    return data[key]
-            # 如果是字典但没找到 key，可能结构不对，强行转 list 试试?
-            # 这里的 fallback 视情况而定，通常上面能解决
+        # 3. 查出文章
+        article = db.query(Article).filter(Article.id == article_id).first()
+        if not article:
+            raise HTTPException(status_code=404, detail="Article not found")
 
-        # 4. 如果本身就是 list，直接返回
-        if isinstance(data, list):
-            return data
+        # === ✅ 一行代码搞定鉴权与扣费 (只有真正调 AI 时才扣) ===
+        check_and_consume_quota(ctx, quota_type="reading")
+        return level_tag, None, article.content
 
-        raise ValueError("AI returned unexpected JSON structure")
+    level_tag, stored_items, content = await asyncio.to_thread(prepare)
+    if stored_items is not None:
+        return stored_items
 
+    # 4. 调用 DeepSeek
+    log.debug("quiz_generating", article_id=article_id, level=level_tag)
+    try:
+        return await create_article_quiz(db, article_id, content, level_tag)
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"❌ AI Error Details: {e}") # 这一行非常重要，看终端报错
+        log.exception("quiz_generate_failed", article_id=article_id, error=str(e))
         raise HTTPException(status_code=500, detail=f"AI generation failed: {str(e)}")
 
 # 1. 批量保存错题 (在测验结算时调用)
 @router.post("/mistakes/batch_add")
 def add_mistakes(mistakes: List[MistakeCreate], db: Session = Depends(get_db), user_id: str = Depends(get_current_user_id)):
-    for m in mistakes:
-        # 简单查重：防止同一道题重复存 (可选)
-        exists = db.query(QuizMistake).filter(
-            QuizMistake.user_id == user_id, 
-            QuizMistake.question == m.question
-        ).first()
-        
-        if not exists:
-            new_mistake = QuizMistake(
-                user_id=user_id,
-                question=m.question,
-                options=m.options,
-                correct_answer=m.correct_answer,
-                user_answer=m.user_answer,
-                explanation=m.explanation,
-                from_article_title=m.from_article_title
-            )
-            db.add(new_mistake)
-    
-    db.commit()
-    return {"status": "ok", "saved_count": len(mistakes)}
+    # 一条批量 INSERT，已经存过的同一道题按 (user_id, question_hash) 唯一索引跳过
+    saved_count = save_mistakes(db, user_id, mistakes)
+    return {"status": "ok", "saved_count": saved_count}
 
-# 2. 获取所有错题
-@router.get("/mistakes/list", response_model=List[MistakeDTO])
-def get_mistakes(db: Session = Depends(get_db), user_id: str = Depends(get_current_user_id)):
-    return db.query(QuizMistake).filter(QuizMistake.user_id == user_id).order_by(QuizMistake.id.desc()).all()
+# 2. 获取错题 (按时间倒序分页，下一页带上 before_id=next_cursor)
+@router.get("/mistakes/list", response_model=MistakePage)
+def get_mistakes(page: PageParams = Depends(), db: Session = Depends(get_read_db), user_id: str = Depends(get_current_user_id)):
+    query = db.query(QuizMistake).filter(QuizMistake.user_id == user_id)
+    return keyset_page(query, QuizMistake.id, page)
 
 # 3. 移除错题 (已掌握)
 @router.delete("/mistakes/{mistake_id}")
@@ -653,21 +586,13 @@ def delete_mistake(mistake_id: int, db: Session = Depends(get_db)):
     return {"status": "deleted"}
 
 # 1. 提交作文并获取 AI 批改
-@router.post("/writing/evaluate", response_model=WritingDTO)
-def evaluate_writing(data: WritingSubmit, db: Session = Depends(get_db), user_id: str = Depends(get_current_user_id)):
-    # === ✅ 一行代码搞定鉴权与扣费 ===
-    check_and_consume_quota(user_id, db, quota_type="writing")
-    # 1. 获取等级
-    user_stats = db.query(UserStats).filter(UserStats.user_id == user_id).first()
-    level_tag = user_stats.current_level if user_stats else "zk"
+def build_writing_prompt(level_tag: str, topic: str, content: str):
     level_prompt = LEVEL_CONFIG[level_tag]["prompt"] # 获取 "IELTS candidate..."
-
-    print(f"🤖 正在批改作文: {data.topic}")
-    prompt = f"""
+    return f"""
     Act as an English teacher. Evaluate the {level_prompt} essay.
     Difficulty Level: {level_tag.upper()}.
-    Topic: {data.topic}
-    Student Content: {data.content}
+    Topic: {topic}
+    Student Content: {content}
     
     Return strict JSON (no markdown code blocks):
     {{
@@ -679,82 +604,133 @@ def evaluate_writing(data: WritingSubmit, db: Session = Depends(get_db), user_id
         "better_version": "A rewritten native-like version..."
     }}
     """
+
+def save_writing(db: Session, user_id: str, data: WritingSubmit, feedback: dict):
+    writing = UserWriting(
+        user_id=user_id,
+        topic=data.topic,
+        original_content=data.content,
+        ai_feedback=feedback
+    )
+    db.add(writing)
+    db.commit()
+    db.refresh(writing)
+    return writing
+
+@router.post("/writing/evaluate", response_model=WritingDTO)
+async def evaluate_writing(data: WritingSubmit, db: Session = Depends(get_db), user_id: str = Depends(get_current_user_id),
+                           ctx: UserContext = Depends(get_user_context)):
+    # === 获取等级，之后等 AI 期间不占数据库连接 ===
+    level_tag = await asyncio.to_thread(load_level, ctx)
+
+    log.debug("writing_evaluating", topic=data.topic)
+    prompt = build_writing_prompt(level_tag, data.topic, data.content)
     
     try:
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[{"role": "user", "content": prompt}],
+        # === ✅ 鉴权与扣费：同一篇作文已经批改过 (缓存命中) 不再扣 ===
+        content = await complete_charged(
+            ctx, "writing", "writing", prompt,
             response_format={"type": "json_object"},
-            temperature=0.1, # 降低随机性
-            timeout=60 # 给 DeepSeek SDK 更多时间
+            temperature=0.1 # 降低随机性 (超时见 LLM_WRITING_TIMEOUT)
         )
-        content = response.choices[0].message.content
-        print(f"📝 AI原始返回: {content}") # 打印出来方便调试
+        log.debug("writing_raw_response", content=content) # LOG_LEVEL=DEBUG 时看 AI 原始返回
 
         # === 增强型 JSON 清洗 ===
         if "```" in content:
             content = content.replace("```json", "").replace("```", "")
         
-        feedback = json.loads(content)
+        # 和流式接口一样，按 schema 校验后再存库
+        feedback = WritingFeedback(**json.loads(content)).model_dump()
         
         # === 存入数据库 ===
-        writing = UserWriting(
-            user_id=user_id,
-            topic=data.topic,
-            original_content=data.content,
-            ai_feedback=feedback
-        )
-        db.add(writing)
-        db.commit()
-        db.refresh(writing)
-        
-        return writing
+        return await asyncio.to_thread(save_writing, db, user_id, data, feedback)
 
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"❌ AI Error: {e}") # 这一行能让你看到具体报错
+        log.exception("writing_evaluate_failed", error=str(e))
         raise HTTPException(status_code=500, detail=f"AI evaluation failed: {str(e)}")
 
+# 1.1 流式批改：边生成边推 SSE (score、comment、每条 correction、better_version 依次到达)
+@router.post("/writing/evaluate/stream")
+def evaluate_writing_stream(data: WritingSubmit, db: Session = Depends(get_db), user_id: str = Depends(get_current_user_id),
+                            ctx: UserContext = Depends(get_user_context)):
+    check_and_consume_quota(ctx, quota_type="writing")
+    level_tag = ctx.level
+    prompt = build_writing_prompt(level_tag, data.topic, data.content)
+    release_db(db) # 流可能持续几十秒，别一直占着连接
+
+    def on_complete(feedback):
+        # 完整结果按 schema 校验后再存库
+        feedback = WritingFeedback(**feedback).model_dump()
+        session = SessionLocal()
+        try:
+            writing = save_writing(session, user_id, data, feedback)
+            return WritingDTO.model_validate(writing).model_dump(mode="json")
+        finally:
+            session.close()
+
+    log.debug("writing_evaluating", topic=data.topic, stream=True)
+    return sse_response(stream_json_events(
+        "writing", prompt, on_complete,
+        item_keys=["corrections"], text_keys=["comment", "better_version"],
+        response_format={"type": "json_object"}, temperature=0.1
+    ))
+
 # 2. 获取写作历史
-@router.get("/writing/history", response_model=List[WritingDTO])
-def get_writing_history(db: Session = Depends(get_db), user_id: str = Depends(get_current_user_id)):
-    return db.query(UserWriting).filter(UserWriting.user_id == user_id).order_by(UserWriting.id.desc()).all()
+# 列表只查摘要列：分数从 JSON 里取，正文截一小段，不把整个 ai_feedback 拉出来
+WRITING_EXCERPT_CHARS = 120
+
+@router.get("/writing/history", response_model=WritingHistoryPage)
+def get_writing_history(page: PageParams = Depends(), db: Session = Depends(get_read_db), user_id: str = Depends(get_current_user_id)):
+    query = db.query(
+        UserWriting.id,
+        UserWriting.topic,
+        UserWriting.ai_feedback["score"].as_string().label("score"), # 按文本取，转整数交给 WritingSummaryDTO
+        func.substr(UserWriting.original_content, 1, WRITING_EXCERPT_CHARS).label("excerpt"),
+        UserWriting.created_at,
+    ).filter(UserWriting.user_id == user_id)
+    return keyset_page(query, UserWriting.id, page)
+
+@router.get("/writing/{writing_id:int}", response_model=WritingDTO)
+def get_writing_detail(writing_id: int, db: Session = Depends(get_read_db), user_id: str = Depends(get_current_user_id)):
+    writing = db.query(UserWriting).filter(UserWriting.id == writing_id, UserWriting.user_id == user_id).first()
+    if not writing:
+        raise HTTPException(status_code=404, detail="Writing not found")
+    return writing
 
 # 3. 随机生成一个题目 (可选小功能)
 @router.get("/writing/topic")
-def get_random_topic(db: Session = Depends(get_db), user_id: str = Depends(get_current_user_id)):
-    # 1. 获取等级
-    user_stats = db.query(UserStats).filter(UserStats.user_id == user_id).first()
-    level_tag = user_stats.current_level if user_stats else "zk"
+async def get_random_topic(db: Session = Depends(get_db), user_id: str = Depends(get_current_user_id),
+                           ctx: UserContext = Depends(get_user_context)):
+    # 1. 获取等级 (缓存没命中时要查库，放到线程里；等 AI 返回期间不占数据库连接)
+    level_tag = await asyncio.to_thread(load_level, ctx)
     level_prompt = LEVEL_CONFIG[level_tag]["prompt"] # 获取 "IELTS candidate..."
     # 原来是写死的 list，现在改成调用 AI
-    prompt = """
+    prompt = f"""
     Generate ONE creative and interesting English writing topic suitable for a {level_prompt}. 
     Difficulty Level: {level_tag.upper()}.
     Examples: "If I could fly", "My favorite season", "A day without phone".
     Return ONLY the topic string, no quotes, no extra words.
     """
     try:
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7 # 稍微高一点，保证创意
-        )
-        topic = response.choices[0].message.content.strip().replace('"', '')
+        content = await llm.complete("topic", prompt, temperature=0.7) # 稍微高一点，保证创意
+        topic = content.strip().replace('"', '')
         return {"topic": topic}
-    except:
+    except HTTPException:
+        raise # 限流 503 / 超时 504 交给前端处理
+    except Exception:
         # 兜底方案
         return {"topic": "My Best Friend"}
 
 # 2. 语法分析接口
 @router.post("/grammar/analyze")
-def analyze_grammar(req: GrammarRequest, db: Session = Depends(get_db), user_id: str = Depends(get_current_user_id)):
-    # === ✅ 一行代码搞定鉴权与扣费 ===
-    check_and_consume_quota(user_id, db, quota_type="writing")
-    # 1. 获取等级
-    user_stats = db.query(UserStats).filter(UserStats.user_id == user_id).first()
-    level_tag = user_stats.current_level if user_stats else "zk"
+async def analyze_grammar(req: GrammarRequest, db: Session = Depends(get_db), user_id: str = Depends(get_current_user_id),
+                          ctx: UserContext = Depends(get_user_context)):
+    # === 获取等级，之后等 AI 期间不占数据库连接 ===
+    level_tag = await asyncio.to_thread(load_level, ctx)
     level_prompt = LEVEL_CONFIG[level_tag]["prompt"] # 获取 "IELTS candidate..."
-    print(f"🤖 正在分析长难句: {req.sentence}")
+    log.debug("grammar_analyzing", sentence=req.sentence)
 
     prompt = f"""
     You are an expert English grammar teacher. Analyze the syntax of the following sentence for a {level_prompt}.
@@ -777,13 +753,12 @@ def analyze_grammar(req: GrammarRequest, db: Session = Depends(get_db), user_id:
     """
 
     try:
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[{"role": "user", "content": prompt}],
+        # === ✅ 鉴权与扣费：同一个句子已经分析过 (缓存命中) 不再扣 ===
+        content = await complete_charged(
+            ctx, "writing", "grammar", prompt,
             response_format={"type": "json_object"},
             temperature=0.1
         )
-        content = response.choices[0].message.content
 
         # 清洗 Markdown
         if "```" in content:
@@ -793,48 +768,68 @@ def analyze_grammar(req: GrammarRequest, db: Session = Depends(get_db), user_id:
         result_json = json.loads(content)
     
         # 存库
-        record = UserGrammarAnalysis(
-            user_id=user_id,
-            sentence=req.sentence,
-            analysis_result=result_json
-        )
-        db.add(record)
-        db.commit()
+        def save():
+            db.add(UserGrammarAnalysis(
+                user_id=user_id,
+                sentence=req.sentence,
+                analysis_result=result_json
+            ))
+            db.commit()
 
+        await asyncio.to_thread(save)
         return result_json
 
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Grammar AI Error: {e}")
+        log.exception("grammar_analyze_failed", error=str(e))
         raise HTTPException(status_code=500, detail="Analysis failed")
 
-# 2. 新增历史记录接口
-@router.get("/grammar/history")
-def get_grammar_history(db: Session = Depends(get_db), user_id: str = Depends(get_current_user_id)):
-    return db.query(UserGrammarAnalysis).filter(
-        UserGrammarAnalysis.user_id == user_id
-    ).order_by(UserGrammarAnalysis.id.desc()).all()
+# 2. 历史记录接口 (分页，列表只带原句和译文，完整分析查 /grammar/{id})
+@router.get("/grammar/history", response_model=GrammarHistoryPage)
+def get_grammar_history(page: PageParams = Depends(), db: Session = Depends(get_read_db), user_id: str = Depends(get_current_user_id)):
+    query = db.query(
+        UserGrammarAnalysis.id,
+        UserGrammarAnalysis.sentence,
+        UserGrammarAnalysis.analysis_result["translation"].as_string().label("translation"),
+        UserGrammarAnalysis.created_at,
+    ).filter(UserGrammarAnalysis.user_id == user_id)
+    return keyset_page(query, UserGrammarAnalysis.id, page)
+
+@router.get("/grammar/{record_id:int}", response_model=GrammarDTO)
+def get_grammar_detail(record_id: int, db: Session = Depends(get_read_db), user_id: str = Depends(get_current_user_id)):
+    record = db.query(UserGrammarAnalysis).filter(
+        UserGrammarAnalysis.id == record_id, UserGrammarAnalysis.user_id == user_id
+    ).first()
+    if not record:
+        raise HTTPException(status_code=404, detail="Record not found")
+    return record
 
 @router.post("/user/update_target")
-def update_target(data: TargetUpdate, db: Session = Depends(get_db), user_id: str = Depends(get_current_user_id)):
-    user_stats = db.query(UserStats).filter(UserStats.user_id == user_id).first()
-    if not user_stats:
-        # 如果是新用户还没学过习，先创建记录
-        user_stats = UserStats(user_id=user_id, daily_target=data.target)
-        db.add(user_stats)
-    else:
-        user_stats.daily_target = data.target
+def update_target(data: TargetUpdate, db: Session = Depends(get_db), user_id: str = Depends(get_current_user_id),
+                  ctx: UserContext = Depends(get_user_context)):
+    # 如果是新用户还没学过习，先创建记录
+    user_stats = ctx.stats(create=True)
+    user_stats.daily_target = data.target
     
     db.commit()
+    ctx.invalidate()
     return {"status": "ok", "new_target": data.target}
 
 @router.get("/word/lookup")
-def lookup_word(spell: str, db: Session = Depends(get_db)):
-    # 忽略大小写查找
-    word = db.query(Word).filter(Word.spell == spell.lower()).first()
+async def lookup_word(spell: str, db: AsyncSession = Depends(get_async_read_db)):
+    # 优先查内存映射的词典：不碰数据库，变形词 (dolphins) 也能解析到原形
+    lexicon = get_lexicon()
+    if lexicon is not None:
+        entry, inflected = lexicon.lookup(spell)
+        if not entry:
+            return {"found": False, "spell": spell}
+        return {"found": True, **entry, "inflected": inflected}
+
+    # 词典文件还没生成，退回数据库查询 (忽略大小写查找)
+    word = (await db.execute(select(Word).where(Word.spell == spell.lower()))).scalars().first()
 
     if not word:
-        # 如果数据库没有，这可能是一个生僻词或者变形词(dolphins)
-        # 简单处理：返回空，或者可以接入 DeepSeek 实时查询（高级功能）
         return {"found": False, "spell": spell}
 
     return {
@@ -871,18 +866,16 @@ def bookmark_word(data: BookmarkRequest, db: Session = Depends(get_db), user_id:
     return {"message": "Added to vocabulary"}
 
 @router.post("/user/update_level")
-def update_level(data: LevelUpdate, db: Session = Depends(get_db), user_id: str = Depends(get_current_user_id)):
+def update_level(data: LevelUpdate, db: Session = Depends(get_db), user_id: str = Depends(get_current_user_id),
+                 ctx: UserContext = Depends(get_user_context)):
     if data.level not in LEVEL_CONFIG:
         raise HTTPException(status_code=400, detail="Invalid level")
         
-    user_stats = db.query(UserStats).filter(UserStats.user_id == user_id).first()
-    if not user_stats:
-        user_stats = UserStats(user_id=user_id, current_level=data.level)
-        db.add(user_stats)
-    else:
-        user_stats.current_level = data.level
+    user_stats = ctx.stats(create=True)
+    user_stats.current_level = data.level
     
     db.commit()
+    ctx.invalidate()
     return {"status": "ok", "current_level": data.level, "level_name": LEVEL_CONFIG[data.level]["name"]}
 
 @router.post("/user/feedback")
@@ -896,9 +889,34 @@ def submit_feedback(data: FeedbackCreate, db: Session = Depends(get_db), user_id
     db.commit()
     return {"status": "received"}
 
+def run_build_lexicon_task():
+    db = SessionLocal()
+    try:
+        result = build_lexicon(db)
+        log.info("lexicon_built", **result)
+    except Exception as e:
+        log.exception("lexicon_build_failed", error=str(e))
+    finally:
+        db.close()
+
+@router.get("/admin/build_lexicon")
+def trigger_build_lexicon(background_tasks: BackgroundTasks):
+    background_tasks.add_task(run_build_lexicon_task)
+    return {"message": "正在后台生成词典文件..."}
+
+# AI 调用的并发 / 排队情况，以及缓存命中率和节省的时间
+@router.get("/admin/llm_stats")
+def get_llm_stats():
+    return llm.stats()
+
+# 只读副本的健康状况
+@router.get("/admin/db_replicas")
+def get_db_replicas():
+    return {"replicas": replicas.stats()}
+
 @router.get("/admin/trigger_import")
-def trigger_import(background_tasks: BackgroundTasks):
-    # 使用后台任务运行，防止请求超时
-    background_tasks.add_task(run_import_task)
+def trigger_import(background_tasks: BackgroundTasks, offset: int = 0):
+    # 使用后台任务运行，防止请求超时；offset 用日志里最后一次的值可以断点续传
+    background_tasks.add_task(run_import_task, offset)
     return {"message": "正在后台导入数据，请查看 Render 日志..."}
 
@@ -0,0 +1,171 @@
+import os
+import json
+import asyncio
+
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal, dialect_insert, release_db
+from .levels import LEVEL_CONFIG
+from .logs import get_logger
+from .model import Article, ArticleQuiz
+from .schemas import QuizItem, ArticleDraft
+from .services.llm import llm
+from .study_queue import pick_learning_words, sample_level_words
+
+# 生成文章时是否默认顺带预生成测验 (接口也可以用 ?pregenerate_quiz= 单独指定)
+PREGENERATE_QUIZ = os.getenv("PREGENERATE_QUIZ", "0") == "1"
+
+# 每篇文章包含多少个目标单词
+ARTICLE_WORD_COUNT = 8
+
+log = get_logger("article")
+
+
+class EmptyVocabularyError(Exception):
+    pass
+
+
+def pick_article_words(db: Session, level_tag: str, count: int = ARTICLE_WORD_COUNT,
+                       user_id: str = None, seed: int = None):
+    """
+    选文章要用的词：给某个用户生成时挑他正在学的词 (快到期的复习词 + 接下来的新词)，
+    不够或者是文章池 (不针对用户) 就从等级里随机挑一段
+    """
+    words = pick_learning_words(db, user_id, level_tag, count, seed) if user_id else []
+    if len(words) < count:
+        picked = {w.id for w in words}
+        words.extend(w for w in sample_level_words(db, level_tag, count) if w.id not in picked)
+    return words[:count]
+
+
+def build_article_prompt(level_tag: str, word_list_str: str):
+    level_prompt = LEVEL_CONFIG[level_tag]["prompt"] # 获取 "IELTS candidate..."
+    return f"""
+    Write a short English article for a {level_prompt}.
+    Difficulty Level: {level_tag.upper()}.
+    It MUST include these words: {word_list_str}.
+
+    Return strict JSON:
+    {{
+        "title": "Title Here",
+        "content": "Story content...",
+        "translation": "Chinese translation..."
+    }}
+    """
+
+
+async def generate_article(db: Session, level_tag: str, words=None, pooled: bool = False):
+    """
+    选词 -> 调 DeepSeek 写文章 -> 存库，返回 Article。
+    pooled=True 表示放进文章池，等学生点 "生成文章" 时再领走。
+    同步 Session 的读写都放到线程里，事件循环只等 AI。
+    """
+    def prepare():
+        picked = words or pick_article_words(db, level_tag)
+        if not picked:
+            raise EmptyVocabularyError(level_tag)
+        # 选词时可能 commit 过 (新词游标)，对象已过期，拼写 / id 也在线程里读
+        spells, ids = [w.spell for w in picked], [w.id for w in picked]
+        release_db(db) # 等 AI 返回期间不占数据库连接
+        return spells, ids
+
+    spells, word_ids = await asyncio.to_thread(prepare)
+    word_list_str = ", ".join(spells)
+    log.info("article_generating", level=level_tag, words=word_list_str, pooled=pooled)
+
+    prompt = build_article_prompt(level_tag, word_list_str)
+    content = await llm.complete("article", prompt, response_format={"type": "json_object"})
+    return await asyncio.to_thread(save_article, db, level_tag, word_ids, json.loads(content), pooled)
+
+
+def save_article(db: Session, level_tag: str, word_ids, data: dict, pooled: bool = False):
+    """AI 返回的文章校验后存库 (普通生成和流式生成共用)"""
+    draft = ArticleDraft(**data)
+    article = Article(
+        title=draft.title,
+        content=draft.content,
+        translation=draft.translation or '', # 兼容有的AI没返回翻译
+        difficulty=level_tag,
+        vocab_list=word_ids,
+        is_pooled=pooled
+    )
+    db.add(article)
+    db.commit()
+    db.refresh(article)
+    return article
+
+
+async def create_article_quiz(db: Session, article_id: int, article_content: str, level_tag: str):
+    """调 AI 给文章出题并存库，返回题目列表 (接口和预生成共用)"""
+    level_prompt = LEVEL_CONFIG[level_tag]["prompt"] # 获取 "IELTS candidate..."
+    prompt = f"""
+    Based on the text below, create 3 multiple-choice questions for a {level_prompt}.
+    Difficulty Level: {level_tag.upper()}.
+    Text:
+    {article_content}
+
+    You MUST return the result as a pure JSON list.
+    Strict format requirements:
+    1. Do not use Markdown formatting (no ```json or ```).
+    2. The root element must be a LIST [].
+    3. Each item must have: "question", "options" (list of 4 strings), "answer" (just A, B, C, or D), and "explanation".
+
+    Example:
+    [
+      {{
+        "question": "What is the main idea?",
+        "options": ["A. Idea 1", "B. Idea 2", "C. Idea 3", "D. Idea 4"],
+        "answer": "A",
+        "explanation": "Because..."
+      }}
+    ]
+    """
+
+    await asyncio.to_thread(release_db, db) # 等 AI 返回期间不占数据库连接
+    content = await llm.complete(
+        "quiz", prompt,
+        temperature=0.1, # 降低随机性，保证格式稳定
+        response_format={"type": "json_object"} # 强制 JSON
+    )
+    log.debug("quiz_raw_response", article_id=article_id, content=content) # LOG_LEVEL=DEBUG 时看 AI 原始返回，报错方便排查
+
+    # === 增强型 JSON 清洗逻辑 ===
+    # 1. 有时候 AI 还是会返回 ```json，手动去掉
+    if "```" in content:
+        content = content.replace("```json", "").replace("```", "")
+
+    # 2. 尝试解析
+    data = json.loads(content)
+
+    # 3. 兼容性处理：如果返回的是 {"quizzes": [...]} 或者是 {"questions": [...]}
+    if isinstance(data, dict):
+        for key in ["quizzes", "questions", "items"]:
+            if key in data and isinstance(data[key], list):
+                data = data[key]
+                break
+
+    # 4. 到这里必须是 list
+    if not isinstance(data, list):
+        raise ValueError("AI returned unexpected JSON structure")
+
+    # 5. 校验格式后存库，同一篇文章同一等级只留第一份
+    items = [QuizItem(**item).model_dump() for item in data]
+    await asyncio.to_thread(save_quiz, db, article_id, level_tag, items)
+    return items
+
+
+def save_quiz(db: Session, article_id: int, level_tag: str, items):
+    stmt = dialect_insert(db, ArticleQuiz).values(article_id=article_id, level=level_tag, items=items)
+    db.execute(stmt.on_conflict_do_nothing(index_elements=["article_id", "level"]))
+    db.commit()
+
+
+async def pregenerate_article_quiz(article_id: int, article_content: str, level_tag: str):
+    db = SessionLocal()
+    try:
+        await create_article_quiz(db, article_id, article_content, level_tag)
+        log.info("quiz_pregenerated", article_id=article_id)
+    except Exception as e:
+        log.error("quiz_pregenerate_failed", article_id=article_id, error=str(e))
+    finally:
+        db.close()
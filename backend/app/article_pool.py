@@ -0,0 +1,153 @@
+import os
+import asyncio
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal
+from .levels import LEVEL_CONFIG
+from .logs import get_logger
+from .model import Article, WordLevel
+from .article_gen import generate_article, pregenerate_article_quiz, PREGENERATE_QUIZ
+
+# 文章池配置 (环境变量覆盖)：
+#   ARTICLE_POOL_WATERMARK   每个等级至少备好几篇没人领的文章
+#   ARTICLE_POOL_CONCURRENCY 补货时最多同时生成几篇
+#   ARTICLE_POOL_INTERVAL    后台巡检间隔 (秒)，有文章被领走时会提前唤醒
+#   ARTICLE_POOL_ENABLED     1 开启后台补货。默认关闭：每个 uvicorn worker 都会跑一份，
+#                            多 worker 部署时只给其中一个进程 (或单独一个进程) 设成 1
+POOL_WATERMARK = int(os.getenv("ARTICLE_POOL_WATERMARK", "3"))
+POOL_CONCURRENCY = int(os.getenv("ARTICLE_POOL_CONCURRENCY", "2"))
+POOL_INTERVAL = float(os.getenv("ARTICLE_POOL_INTERVAL", "60"))
+POOL_ENABLED = os.getenv("ARTICLE_POOL_ENABLED", "0") == "1"
+
+# 领取时一次看几篇候选，被别人抢走就试下一篇
+CLAIM_CANDIDATES = 5
+
+log = get_logger("article_pool")
+
+_wakeup = None
+_worker_loop = None
+_refill_lock = None
+
+
+def claim_pooled_article(db: Session, level_tag: str, user_id: str):
+    """
+    从池子里领一篇文章，没有就返回 None。
+    UPDATE ... WHERE claimed_by IS NULL 保证并发时一篇文章只会被一个人领走。
+    """
+    candidates = db.query(Article.id).filter(
+        Article.difficulty == level_tag,
+        Article.is_pooled.is_(True),
+        Article.claimed_by.is_(None)
+    ).order_by(Article.id).limit(CLAIM_CANDIDATES).all()
+
+    for (article_id,) in candidates:
+        claimed = db.query(Article).filter(
+            Article.id == article_id,
+            Article.claimed_by.is_(None)
+        ).update({"claimed_by": user_id}, synchronize_session=False)
+        db.commit()
+        if claimed:
+            return db.get(Article, article_id)
+    return None
+
+
+def pool_deficits(db: Session, levels=None):
+    """每个等级还差几篇才到水位线：{level: 缺口}"""
+    levels = levels or list(LEVEL_CONFIG)
+    available = dict(
+        db.query(Article.difficulty, func.count(Article.id)).filter(
+            Article.difficulty.in_(levels),
+            Article.is_pooled.is_(True),
+            Article.claimed_by.is_(None)
+        ).group_by(Article.difficulty).all()
+    )
+    deficits = {}
+    for level in levels:
+        missing = POOL_WATERMARK - available.get(level, 0)
+        # 词库里还没有这个等级的词 (没导入)，生成不了，跳过
+        if missing > 0 and db.query(WordLevel.word_id).filter(WordLevel.level == level).first():
+            deficits[level] = missing
+    return deficits
+
+
+def _load_deficits(levels=None):
+    db = SessionLocal()
+    try:
+        return pool_deficits(db, levels)
+    finally:
+        db.close()
+
+
+async def _generate_one(level_tag: str, semaphore: asyncio.Semaphore):
+    async with semaphore:
+        db = SessionLocal()
+        try:
+            article = await generate_article(db, level_tag, pooled=True)
+            log.info("pool_article_added", level=level_tag, article_id=article.id, title=article.title)
+            if PREGENERATE_QUIZ:
+                await pregenerate_article_quiz(article.id, article.content, level_tag)
+            return 1
+        except Exception as e:
+            log.error("pool_refill_failed", level=level_tag, error=str(e))
+            return 0
+        finally:
+            await asyncio.to_thread(db.close) # 出错时 close 要回滚，也是一次数据库往返
+
+
+async def refill_pool(levels=None):
+    """把各等级补到水位线，返回这次生成了几篇。同一时间只跑一轮。"""
+    global _refill_lock
+    if _refill_lock is None:
+        _refill_lock = asyncio.Lock()
+
+    async with _refill_lock:
+        # 同步查库放到线程里，别卡住同一个事件循环上的接口
+        deficits = await asyncio.to_thread(_load_deficits, levels)
+        if not deficits:
+            return 0
+
+        semaphore = asyncio.Semaphore(POOL_CONCURRENCY)
+        jobs = [
+            _generate_one(level, semaphore)
+            for level, missing in deficits.items()
+            for _ in range(missing)
+        ]
+        return sum(await asyncio.gather(*jobs))
+
+
+def request_refill():
+    """有文章被领走了，叫醒后台 worker 立刻补货 (线程池里的同步接口也能调)"""
+    if _wakeup is None:
+        return
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is _worker_loop:
+        _wakeup.set()
+    else:
+        # asyncio.Event 不是线程安全的，从别的线程叫醒要交给 worker 所在的循环去做
+        _worker_loop.call_soon_threadsafe(_wakeup.set)
+
+
+async def run_pool_worker():
+    """后台常驻任务：定时 (或被 request_refill 唤醒时) 把文章池补满"""
+    global _wakeup, _worker_loop
+    _worker_loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    log.info("pool_worker_started", watermark=POOL_WATERMARK, concurrency=POOL_CONCURRENCY)
+    while True:
+        try:
+            await refill_pool()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.exception("pool_check_failed", error=str(e))
+
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=POOL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
@@ -0,0 +1,161 @@
+import os
+import asyncio
+from collections import OrderedDict
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import FileResponse
+from starlette.convertors import Convertor, register_url_convertor
+
+from .services.tts import AUDIO_DIR
+
+# 文章音频的下载路由 (挂在 /static/audio 前面，旧的 article_{id}.mp3 仍由 StaticFiles 处理)：
+# - 文件名是内容哈希，内容永远不变 -> ETag 就是哈希，Cache-Control: immutable 缓存一年
+# - 支持 Range (拖进度条只下需要的那段) 和 If-None-Match (304)
+# - 小文件放进进程内 LRU，热门文章不用每次读盘
+# - 设置 AUDIO_ACCEL_REDIRECT (例如 /protected-audio/) 时交给 nginx 用 sendfile 发文件，不占 API worker
+
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+HOT_CACHE_BYTES = int(float(os.getenv("AUDIO_HOT_CACHE_MB", "64")) * 1024 * 1024)
+HOT_FILE_MAX_BYTES = int(float(os.getenv("AUDIO_HOT_FILE_MB", "4")) * 1024 * 1024)
+ACCEL_REDIRECT = os.getenv("AUDIO_ACCEL_REDIRECT")
+
+
+class AudioDigestConvertor(Convertor):
+    regex = "[0-9a-f]{32}"
+
+    def convert(self, value: str) -> str:
+        return value
+
+    def to_string(self, value: str) -> str:
+        return value
+
+
+register_url_convertor("audiodigest", AudioDigestConvertor())
+
+
+class HotAudioCache:
+    """按总字节数限制的 LRU：文件名 -> 文件内容"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items = OrderedDict()
+
+    def get(self, name: str):
+        data = self._items.get(name)
+        if data is not None:
+            self._items.move_to_end(name)
+        return data
+
+    def put(self, name: str, data: bytes):
+        if name in self._items or len(data) > self.max_bytes:
+            return
+        self._items[name] = data
+        self.size += len(data)
+        while self.size > self.max_bytes:
+            _, old = self._items.popitem(last=False)
+            self.size -= len(old)
+
+
+hot_audio = HotAudioCache(HOT_CACHE_BYTES)
+
+router = APIRouter()
+
+
+def parse_range(header: str, size: int):
+    """
+    解析单个 bytes 区间，返回 (start, end) 闭区间；
+    没有 / 不认识的格式 / 多段区间返回 None (按整个文件返回)，越界抛 ValueError (416)
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start, sep, end = header[6:].strip().partition("-")
+    if not sep:
+        return None
+    suffix = not start # bytes=-500：最后 500 字节
+    try:
+        if suffix:
+            length = int(end)
+        else:
+            start = int(start)
+            end = int(end) if end else size - 1
+    except ValueError:
+        return None
+    if suffix:
+        # bytes=-0 (要 0 个字节) 或者文件是空的，都没法满足
+        if length <= 0 or size == 0:
+            raise ValueError("Range not satisfiable")
+        return max(0, size - length), size - 1
+    if start >= size or start > end:
+        raise ValueError("Range not satisfiable")
+    return start, min(end, size - 1)
+
+
+def _read(path: str):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _accepts_gzip(request: Request):
+    return "gzip" in request.headers.get("accept-encoding", "")
+
+
+@router.api_route("/static/audio/{digest:audiodigest}.mp3", methods=["GET", "HEAD"])
+async def get_audio_file(digest: str, request: Request):
+    name = f"{digest}.mp3"
+    path = os.path.join(AUDIO_DIR, name)
+    etag = f'"{digest}"'
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Accept-Ranges": "bytes"}
+
+    # 1. 浏览器已经有了 (原文件或 .gz 副本)
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in if_none_match or f'"{digest}-gz"' in if_none_match:
+        return Response(status_code=304, headers=headers)
+
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Audio not found")
+
+    range_header = request.headers.get("range")
+    if request.headers.get("if-range") not in (None, etag):
+        range_header = None
+
+    # 2. 预压缩副本 (只在整文件下载时用，Range 针对的是原始字节)
+    gz_path = path + ".gz"
+    if os.path.exists(gz_path):
+        headers["Vary"] = "Accept-Encoding"
+        if not range_header and _accepts_gzip(request):
+            headers.update({"Content-Encoding": "gzip", "ETag": f'"{digest}-gz"'})
+            return FileResponse(gz_path, media_type="audio/mpeg", headers=headers)
+
+    # 3. 交给 nginx 发 (X-Accel-Redirect 自带 Range 支持)
+    if ACCEL_REDIRECT:
+        headers["X-Accel-Redirect"] = ACCEL_REDIRECT.rstrip("/") + "/" + name
+        return Response(media_type="audio/mpeg", headers=headers)
+
+    # 4. 热文件直接从内存返回
+    data = hot_audio.get(name)
+    if data is None:
+        if os.path.getsize(path) > HOT_FILE_MAX_BYTES:
+            # 大文件走 FileResponse，它自己处理 Range
+            return FileResponse(path, media_type="audio/mpeg", headers=headers)
+        data = await asyncio.to_thread(_read, path)
+        hot_audio.put(name, data)
+
+    size = len(data)
+    try:
+        byte_range = parse_range(range_header, size)
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    body = b"" if request.method == "HEAD" else data
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return Response(body, media_type="audio/mpeg", headers=headers)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    if request.method != "HEAD":
+        body = data[start:end + 1]
+    headers["Content-Length"] = str(end - start + 1)
+    return Response(body, status_code=206, media_type="audio/mpeg", headers=headers)
@@ -0,0 +1,108 @@
+from sqlalchemy import func, inspect
+from sqlalchemy.orm import Session
+
+from .database import dialect_insert
+from .levels import LEVEL_CONFIG
+from .model import WordLevel, UserWordProgress, UserStats, UserLevelStats
+
+# 仪表盘的已学词数不再每次 COUNT(*)：
+# - 进度从 "未学/收藏" 变成 is_learned = 1 时，UserStats.total_learned_count 和每个等级的 UserLevelStats 各加上
+# - 计数都用 "列 + n" 在数据库里累加，并发提交不会互相覆盖
+# - 极少数情况 (同一个词并发提交、手工改库) 会有偏差，reconcile_learned_counts 定期按真实数据校正
+
+
+def _levels_of(db: Session, word_ids):
+    """word_id -> 所属等级列表 (只算 LEVEL_CONFIG 里的等级)"""
+    levels = {}
+    for wid, level in db.query(WordLevel.word_id, WordLevel.level).filter(
+        WordLevel.word_id.in_(word_ids),
+        WordLevel.level.in_(list(LEVEL_CONFIG))
+    ).all():
+        levels.setdefault(wid, []).append(level)
+    return levels
+
+
+def record_learned(db: Session, user_stats: UserStats, word_ids):
+    """word_ids 这些词刚变成已学：累加总数和各等级计数，随调用方的事务一起提交"""
+    word_ids = list(word_ids)
+    if not word_ids:
+        return
+
+    if inspect(user_stats).pending:
+        # 这一行还没 INSERT，直接填值
+        user_stats.total_learned_count = (user_stats.total_learned_count or 0) + len(word_ids)
+    else:
+        user_stats.total_learned_count = func.coalesce(UserStats.total_learned_count, 0) + len(word_ids)
+
+    per_level = {}
+    for levels in _levels_of(db, word_ids).values():
+        for level in levels:
+            per_level[level] = per_level.get(level, 0) + 1
+    if not per_level:
+        return
+
+    stmt = dialect_insert(db, UserLevelStats)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "level"],
+        set_={"learned_count": func.coalesce(UserLevelStats.learned_count, 0) + stmt.excluded.learned_count}
+    )
+    db.execute(stmt, [
+        {"user_id": user_stats.user_id, "level": level, "learned_count": n}
+        for level, n in per_level.items()
+    ])
+
+
+def _actual_counts(db: Session, user_ids=None):
+    """从进度表现算：user_id -> (已学总数, {等级: 已学数})"""
+    totals = db.query(UserWordProgress.user_id, func.count(UserWordProgress.id)).filter(
+        UserWordProgress.is_learned == 1
+    )
+    by_level = db.query(UserWordProgress.user_id, WordLevel.level, func.count(UserWordProgress.id)).join(
+        WordLevel, WordLevel.word_id == UserWordProgress.word_id
+    ).filter(UserWordProgress.is_learned == 1, WordLevel.level.in_(list(LEVEL_CONFIG)))
+    if user_ids is not None:
+        totals = totals.filter(UserWordProgress.user_id.in_(user_ids))
+        by_level = by_level.filter(UserWordProgress.user_id.in_(user_ids))
+
+    actual = {user_id: (n, {}) for user_id, n in totals.group_by(UserWordProgress.user_id).all()}
+    for user_id, level, n in by_level.group_by(UserWordProgress.user_id, WordLevel.level).all():
+        actual[user_id][1][level] = n
+    return actual
+
+
+def reconcile_learned_counts(db: Session, user_ids=None):
+    """
+    按进度表重算计数，只改对不上的行。user_ids=None 时对账所有用户。
+    返回被校正的用户数。
+    """
+    actual = _actual_counts(db, user_ids)
+    fixed = set()
+
+    stats_query = db.query(UserStats)
+    level_query = db.query(UserLevelStats)
+    if user_ids is not None:
+        stats_query = stats_query.filter(UserStats.user_id.in_(user_ids))
+        level_query = level_query.filter(UserLevelStats.user_id.in_(user_ids))
+
+    for stats in stats_query.all():
+        total = actual.get(stats.user_id, (0, {}))[0]
+        if (stats.total_learned_count or 0) != total:
+            stats.total_learned_count = total
+            fixed.add(stats.user_id)
+
+    stored = set()
+    for row in level_query.all():
+        stored.add((row.user_id, row.level))
+        learned = actual.get(row.user_id, (0, {}))[1].get(row.level, 0)
+        if (row.learned_count or 0) != learned:
+            row.learned_count = learned
+            fixed.add(row.user_id)
+
+    for user_id, (_, by_level) in actual.items():
+        for level, learned in by_level.items():
+            if (user_id, level) not in stored:
+                db.add(UserLevelStats(user_id=user_id, level=level, learned_count=learned))
+                fixed.add(user_id)
+
+    db.commit()
+    return len(fixed)
@@ -1,34 +1,260 @@
 import os
+import time
+import itertools
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError, InterfaceError
+from sqlalchemy.engine import make_url
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 
+from .logs import get_logger
+
 load_dotenv()
 
+log = get_logger("database")
+
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
 
 # 如果没有 URL (本地测试时)，给个默认值防止报错
 if not SQLALCHEMY_DATABASE_URL:
     SQLALCHEMY_DATABASE_URL = "sqlite:///./sql_app.db"
 
-# === 修改重点在这里 ===
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    # 1. 开启“预检测”，每次从池子里拿连接前先 ping 一下，防止拿到断掉的连接
-    pool_pre_ping=True, 
-    # 2. 连接回收时间，设为 1 小时，防止连接太久被防火墙切断
-    pool_recycle=3600,
-    # 3. 传递给底层驱动的参数
-    connect_args={
-        "connect_timeout": 60, # 握手超时时间设为 60秒 (默认是10秒)
-        "keepalives": 1,       # 开启 TCP 心跳保活
-        "keepalives_idle": 30,
-        "keepalives_interval": 10,
-        "keepalives_count": 5
+# 连接池按部署调：每个 worker 最多 POOL_SIZE + MAX_OVERFLOW 个连接，同步、异步引擎各一份
+# (Supabase 之类有连接数上限的库，worker 数 * 2 * (POOL_SIZE + MAX_OVERFLOW) 别超过上限)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))     # 等空闲连接最多等几秒
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))     # 连接用满 1 小时就换，防止被防火墙切断
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "60")) # 握手超时 (默认是10秒，云端唤醒慢)
+# 连的是 pgbouncer 事务模式 (比如 Supabase 的 6543 端口) 时设为 1：asyncpg 的预编译语句缓存在这种模式下会出错
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "0") == "1"
+
+# 同步驱动 -> 对应的异步驱动
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def _connect_args(url):
+    """按驱动给参数：psycopg2 的 keepalives 之类传给别的驱动会直接报错"""
+    driver = url.get_driver_name()
+    if driver == "psycopg2":
+        return {
+            "connect_timeout": DB_CONNECT_TIMEOUT,
+            "keepalives": 1,       # 开启 TCP 心跳保活
+            "keepalives_idle": 30,
+            "keepalives_interval": 10,
+            "keepalives_count": 5
+        }
+    if driver == "asyncpg":
+        args = {
+            "timeout": DB_CONNECT_TIMEOUT,
+            # asyncpg 没有客户端 keepalive 参数，让服务端发心跳
+            "server_settings": {"tcp_keepalives_idle": "30", "tcp_keepalives_interval": "10", "tcp_keepalives_count": "5"},
+        }
+        if DB_PGBOUNCER:
+            args["statement_cache_size"] = 0
+        return args
+    if driver == "pysqlite":
+        return {"check_same_thread": False} # FastAPI 的同步接口跑在线程池里
+    return {}
+
+
+def _engine_kwargs(url):
+    kwargs = {
+        # 开启“预检测”，每次从池子里拿连接前先 ping 一下，防止拿到断掉的连接
+        "pool_pre_ping": True,
+        "connect_args": _connect_args(url),
     }
-)
+    if url.get_backend_name() != "sqlite":
+        kwargs.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+        )
+    return kwargs
+
+
+def async_database_url(url: str, override: bool = True):
+    """ASYNC_DATABASE_URL 优先 (override=False 时不看，副本用)；否则把 URL 的驱动换成异步驱动"""
+    if override and os.getenv("ASYNC_DATABASE_URL"):
+        return make_url(os.getenv("ASYNC_DATABASE_URL"))
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise NotImplementedError(f"No async driver configured for {backend}")
+    url = url.set(drivername=ASYNC_DRIVERS[backend])
+    if backend == "postgresql":
+        # psycopg2 的 sslmode=require 在 asyncpg 里叫 ssl=require
+        query = dict(url.query)
+        if "sslmode" in query:
+            query["ssl"] = query.pop("sslmode")
+        if DB_PGBOUNCER:
+            query["prepared_statement_cache_size"] = "0"
+        url = url.set(query=query)
+    return url
+
+
+_sync_url = make_url(SQLALCHEMY_DATABASE_URL)
+engine = create_engine(_sync_url, **_engine_kwargs(_sync_url))
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 异步引擎第一次用到时才创建：脚本只用同步引擎，不需要装 asyncpg
+_async_engine = None
+_async_sessionmaker = None
+
+
+def get_async_engine():
+    global _async_engine, _async_sessionmaker
+    if _async_engine is None:
+        url = async_database_url(SQLALCHEMY_DATABASE_URL)
+        _async_engine = create_async_engine(url, **_engine_kwargs(url))
+        # commit 之后返回给前端的对象还要读字段，别让它们过期 (过期了会在事件循环里触发同步加载)
+        _async_sessionmaker = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+    return _async_engine
+
+
+def AsyncSessionLocal():
+    get_async_engine()
+    return _async_sessionmaker()
+
+
+async def dispose_async_engine():
+    global _async_engine, _async_sessionmaker
+    await replicas.dispose_async()
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = _async_sessionmaker = None
+
+# === 只读副本 ===
+# DATABASE_REPLICA_URLS 逗号分隔，只读接口 (仪表盘、文章列表/详情、历史记录、查词) 轮流读这些库：
+# - 拿连接失败的副本标记下线 REPLICA_RETRY_SECONDS 秒，期间跳过；全都不可用时读主库
+# - 读己之写：用户刚写过 (READ_YOUR_WRITES_SECONDS 秒内) 或请求带 X-Read-Primary: 1 时读主库，
+#   避免副本延迟导致刚提交的结果 "看不见"
+# 本地测试：两个 SQLite 文件 (DATABASE_URL=sqlite:///./primary.db DATABASE_REPLICA_URLS=sqlite:///./replica.db)
+# 或两个 Postgres 实例都可以，副本地址写错 / 停掉副本可以看到自动回退到主库
+REPLICA_URLS = [u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+RECENT_WRITERS_SIZE = 10000
+
+
+class ReplicaSet:
+    """一组只读副本：轮询 + 失败的暂时下线"""
+
+    def __init__(self, urls):
+        self.urls = [make_url(u) for u in urls]
+        self.engines = [create_engine(u, **_engine_kwargs(u)) for u in self.urls]
+        self._async_engines = [None] * len(self.urls)
+        self._down_until = [0.0] * len(self.urls)
+        self._counter = itertools.count()
+
+    def candidates(self):
+        """这次请求依次尝试的副本下标：从轮询位置开始，跳过下线中的"""
+        if not self.urls:
+            return []
+        start = next(self._counter)
+        now = time.monotonic()
+        order = [(start + i) % len(self.urls) for i in range(len(self.urls))]
+        return [i for i in order if self._down_until[i] <= now]
+
+    def mark_down(self, index: int, error: Exception):
+        self._down_until[index] = time.monotonic() + REPLICA_RETRY_SECONDS
+        log.warning("replica_unavailable", replica=self.urls[index].render_as_string(),
+                    retry_seconds=REPLICA_RETRY_SECONDS, error=str(error))
+
+    def async_engine(self, index: int):
+        if self._async_engines[index] is None:
+            url = async_database_url(self.urls[index].render_as_string(hide_password=False), override=False)
+            self._async_engines[index] = create_async_engine(url, **_engine_kwargs(url))
+        return self._async_engines[index]
+
+    async def dispose_async(self):
+        for i, eng in enumerate(self._async_engines):
+            if eng is not None:
+                await eng.dispose()
+                self._async_engines[i] = None
+
+    def stats(self):
+        now = time.monotonic()
+        return [
+            {"url": url.render_as_string(), "healthy": self._down_until[i] <= now}
+            for i, url in enumerate(self.urls)
+        ]
+
+
+replicas = ReplicaSet(REPLICA_URLS)
+
+# user_id -> 最近一次写请求的时间 (本进程内)；多个 worker 时靠前端带 X-Read-Primary 兜底
+_recent_writes = {}
+
+
+def note_write(user_id: str):
+    if len(_recent_writes) >= RECENT_WRITERS_SIZE:
+        _recent_writes.clear()
+    _recent_writes[user_id] = time.monotonic()
+
+
+def wrote_recently(user_id: str):
+    written = _recent_writes.get(user_id)
+    return written is not None and time.monotonic() - written < READ_YOUR_WRITES_SECONDS
+
+
+def open_read_session(primary: bool = False):
+    """只读 Session：按轮询挑一个能连上的副本，全都不行 (或 primary=True) 就用主库"""
+    for index in ([] if primary else replicas.candidates()):
+        db = SessionLocal(bind=replicas.engines[index])
+        try:
+            db.connection() # 先拿连接，连不上马上换下一个
+            return db
+        except (OperationalError, InterfaceError) as e:
+            db.close()
+            replicas.mark_down(index, e)
+    return SessionLocal()
+
+
+async def open_async_read_session(primary: bool = False):
+    """open_read_session 的异步版本"""
+    for index in ([] if primary else replicas.candidates()):
+        get_async_engine()
+        db = _async_sessionmaker(bind=replicas.async_engine(index))
+        try:
+            await db.connection()
+            return db
+        except (OperationalError, InterfaceError, OSError) as e:
+            await db.close()
+            replicas.mark_down(index, e)
+    return AsyncSessionLocal()
+
+
+def all_engines():
+    """已经创建的引擎 (监控用)：名字 -> 同步 Engine，异步引擎给它底下的 sync_engine"""
+    found = {"primary": engine}
+    if _async_engine is not None:
+        found["primary_async"] = _async_engine.sync_engine
+    for i, eng in enumerate(replicas.engines):
+        found[f"replica{i}"] = eng
+        if replicas._async_engines[i] is not None:
+            found[f"replica{i}_async"] = replicas._async_engines[i].sync_engine
+    return found
+
 Base = declarative_base()
+
+def dialect_insert(db, table):
+    """返回当前数据库方言的 insert()，带 on_conflict_do_nothing / on_conflict_do_update"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(table)
+    if dialect == "sqlite":
+        return sqlite.insert(table)
+    raise NotImplementedError(f"Upsert not supported on {dialect}")
+
+def release_db(db):
+    """调 AI 前先结束当前事务，把连接还给连接池，别让几十秒的生成一直占着连接 / 锁"""
+    db.commit()
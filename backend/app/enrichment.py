@@ -0,0 +1,192 @@
+import os
+import json
+import time
+import asyncio
+
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal, release_db
+from .levels import LEVEL_CONFIG
+from .logs import get_logger
+from .model import Word
+from .services.llm import llm
+from .word_levels import in_level
+
+# 批量生成例句 (Word.ai_sentence)：
+# - 一个请求塞 BATCH_WORDS 个词，返回结构化 JSON
+# - CONCURRENCY 个请求并发，令牌桶限制每分钟请求数 (RPM)
+# - 每批结果一条 bulk UPDATE 写回；按 id 顺序推进断点，崩了从断点继续
+# - 没拿到例句的词 (整批重试 MAX_ATTEMPTS 次都失败 / AI 漏掉) 记下 id，和断点一起存，下次先补它们
+BATCH_WORDS = 20
+CONCURRENCY = 4
+RPM = int(os.getenv("ENRICH_RPM", "60"))
+MAX_ATTEMPTS = 3
+
+# DeepSeek 价格 (美元 / 百万 token)，用来估算每个词的成本
+PRICE_INPUT = float(os.getenv("DEEPSEEK_PRICE_INPUT", "0.28"))
+PRICE_OUTPUT = float(os.getenv("DEEPSEEK_PRICE_OUTPUT", "0.42"))
+
+DEFAULT_AUDIENCE = "Middle School Student (Grade 8)"
+
+log = get_logger("enrichment")
+
+
+class TokenBucket:
+    """令牌桶：每分钟补 rate 个令牌，最多攒 burst 个"""
+
+    def __init__(self, rate_per_minute: float, burst: int = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst or max(1, int(rate_per_minute // 10))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: float = 1):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+
+def build_sentence_prompt(spells, level_tag: str = None):
+    audience = LEVEL_CONFIG[level_tag]["prompt"] if level_tag in LEVEL_CONFIG else DEFAULT_AUDIENCE
+    return f"""
+    You are an English teacher. For EACH word below, write:
+    1. One simple, easy-to-understand English example sentence suitable for a {audience}.
+    2. The Chinese translation of that sentence.
+    Words: {json.dumps(spells, ensure_ascii=False)}
+
+    Return strict JSON (no markdown), one item per word, keep the word exactly as given:
+    {{"items": [{{"word": "apple", "en": "I eat an apple every day.", "cn": "我每天吃一个苹果。"}}]}}
+    """
+
+
+def parse_sentences(content: str):
+    """AI 返回 -> {小写单词: {"en", "cn"}}，缺字段的条目丢掉"""
+    if "```" in content:
+        content = content.replace("```json", "").replace("```", "")
+    data = json.loads(content)
+    items = data.get("items", []) if isinstance(data, dict) else data
+    result = {}
+    for item in items or []:
+        if isinstance(item, dict) and item.get("word") and item.get("en") and item.get("cn"):
+            result[str(item["word"]).strip().lower()] = {"en": item["en"], "cn": item["cn"]}
+    return result
+
+
+def _pending_batches(db: Session, after_id: int, level_tag: str, limit: int, batch_words: int, retry_ids=()):
+    """按 id 顺序取还没有例句的词 (断点之后的 + 上次没补上的)，切成 [(最后一个 id, [(id, spell), ...]), ...]"""
+    after = Word.id > after_id
+    if retry_ids:
+        after = or_(after, Word.id.in_(retry_ids))
+    query = db.query(Word.id, Word.spell).filter(Word.ai_sentence.is_(None), after)
+    if level_tag:
+        query = query.filter(in_level(level_tag))
+    rows = query.order_by(Word.id).limit(limit).all() if limit else query.order_by(Word.id).all()
+    return [
+        (rows[i:i + batch_words][-1][0], rows[i:i + batch_words])
+        for i in range(0, len(rows), batch_words)
+    ]
+
+
+def _save_sentences(rows):
+    db = SessionLocal()
+    try:
+        db.execute(update(Word), rows) # 按主键批量 UPDATE
+        db.commit()
+    finally:
+        db.close()
+
+
+async def enrich_words(db: Session, level_tag: str = None, limit: int = None, after_id: int = 0,
+                       batch_words: int = BATCH_WORDS, concurrency: int = CONCURRENCY, rpm: int = RPM,
+                       retry_ids=(), on_batch=None):
+    """
+    给没有例句的词批量生成例句。
+    - after_id: 断点，只处理 id 更大的词
+    - retry_ids: 上次没补上的词 (断点之前的)，这次排在最前面重试
+    - on_batch(stats)：每完成一批回调一次，stats["last_id"] 之前 (含) 的词除了 stats["failed_ids"] 都处理过了，
+      两个一起存成断点
+    返回统计 dict：words / failed / failed_ids / words_per_min / cost_usd / cost_per_word ...
+    """
+    batches = _pending_batches(db, after_id, level_tag, limit, batch_words, retry_ids)
+    release_db(db) # 跑完要好几分钟，别一直占着连接
+
+    # 还要重试的词：这次取到的等批次跑完再看结果；被 limit 截掉没轮到的原样留到下次
+    # (没取到、也不在截断之后的，说明已经有例句了，丢掉)
+    fetched = [word_id for _, words in batches for word_id, _ in words]
+    outstanding = set(retry_ids) & set(fetched)
+    failed_ids = set()
+    if limit and len(fetched) == limit:
+        failed_ids = {word_id for word_id in retry_ids if word_id > fetched[-1]}
+
+    usage_before = dict(llm.usage["enrich"])
+    bucket = TokenBucket(rpm)
+    semaphore = asyncio.Semaphore(concurrency)
+    t0 = time.time()
+    stats = {"batches": len(batches), "words": 0, "failed": 0, "last_id": after_id,
+             "failed_ids": sorted(outstanding | failed_ids),
+             "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0,
+             "words_per_min": 0.0, "cost_per_word": 0.0, "elapsed": 0.0}
+
+    # 并发完成的顺序是乱的，断点只推进到 "前面所有批次都完成" 的位置
+    finished = [False] * len(batches)
+    next_unfinished = 0
+
+    def report(index):
+        nonlocal next_unfinished
+        finished[index] = True
+        while next_unfinished < len(batches) and finished[next_unfinished]:
+            # 重试的词在断点之前，断点不能往回退
+            stats["last_id"] = max(stats["last_id"], batches[next_unfinished][0])
+            next_unfinished += 1
+        stats["failed_ids"] = sorted(outstanding | failed_ids)
+
+        usage = llm.usage["enrich"]
+        stats["prompt_tokens"] = usage["prompt_tokens"] - usage_before["prompt_tokens"]
+        stats["completion_tokens"] = usage["completion_tokens"] - usage_before["completion_tokens"]
+        stats["cost_usd"] = (stats["prompt_tokens"] * PRICE_INPUT + stats["completion_tokens"] * PRICE_OUTPUT) / 1e6
+        stats["elapsed"] = time.time() - t0
+        stats["words_per_min"] = stats["words"] / stats["elapsed"] * 60 if stats["elapsed"] else 0.0
+        stats["cost_per_word"] = stats["cost_usd"] / stats["words"] if stats["words"] else 0.0
+        if on_batch:
+            on_batch(dict(stats))
+
+    async def run_batch(index, words):
+        spells = [spell for _, spell in words]
+        async with semaphore:
+            sentences = {}
+            for attempt in range(MAX_ATTEMPTS):
+                await bucket.acquire()
+                try:
+                    content = await llm.complete(
+                        "enrich", build_sentence_prompt(spells, level_tag),
+                        temperature=1.0, response_format={"type": "json_object"}, cache=False
+                    )
+                    sentences = parse_sentences(content)
+                    break
+                except Exception as e:
+                    log.warning("enrich_batch_failed", batch=index, attempt=attempt + 1, error=str(e))
+                    await asyncio.sleep(2 ** attempt)
+
+        rows = [
+            {"id": word_id, "ai_sentence": sentences[spell.lower()]}
+            for word_id, spell in words if spell.lower() in sentences
+        ]
+        if rows:
+            await asyncio.to_thread(_save_sentences, rows)
+        stats["words"] += len(rows)
+        stats["failed"] += len(words) - len(rows)
+        outstanding.difference_update(word_id for word_id, _ in words)
+        failed_ids.update(word_id for word_id, spell in words if spell.lower() not in sentences)
+        report(index)
+
+    await asyncio.gather(*[run_batch(i, words) for i, (_, words) in enumerate(batches)])
+    stats["elapsed"] = time.time() - t0
+    return stats
@@ -0,0 +1,101 @@
+import re
+import hashlib
+from collections import OrderedDict
+
+from sqlalchemy.orm import Session
+
+from .lexicon import get_lexicon
+from .model import Word, UserWordProgress
+
+# 缓存多少篇文章的词表
+CACHE_SIZE = 256
+
+# article_id -> (content_hash, lexicon 版本, tokens, entries)
+_cache = OrderedDict()
+
+_NON_LETTER = re.compile(r"[^a-zA-Z]")
+
+
+def tokenize(content: str):
+    """和阅读页保持一致：按空白切开，去掉非字母字符，转小写去重"""
+    tokens = []
+    seen = set()
+    for chunk in (content or "").split():
+        token = _NON_LETTER.sub("", chunk).lower()
+        if token and token not in seen:
+            seen.add(token)
+            tokens.append(token)
+    return tokens
+
+
+def _resolve(db: Session, tokens):
+    """
+    一次解析所有 token，返回 (token -> 词条下标, 词条列表)。
+    多个变形指向同一个原形时只存一份词条。
+    """
+    entries = []
+    by_id = {}
+    token_map = {}
+
+    def add(token, entry):
+        idx = by_id.get(entry["id"])
+        if idx is None:
+            idx = by_id[entry["id"]] = len(entries)
+            entries.append(entry)
+        token_map[token] = idx
+
+    lexicon = get_lexicon()
+    if lexicon is not None:
+        for token in tokens:
+            entry, _ = lexicon.lookup(token)
+            if entry:
+                add(token, entry)
+    else:
+        # 词典文件还没生成：一条 IN 查询，变形词解析不了
+        for w in db.query(Word).filter(Word.spell.in_(tokens)).all():
+            add(w.spell, {
+                "id": w.id,
+                "spell": w.spell,
+                "phonetic": w.phonetic,
+                "translation": w.translation,
+                "definition": w.definition,
+            })
+    return token_map, entries
+
+
+def get_article_glossary(db: Session, article_id: int, content: str, user_id: str):
+    """
+    文章词表：{"tokens": {token: 词条下标}, "entries": [词条 + status]}
+    status: "new" 没学过 / "saved" 在生词本里 / "learning" 学习中
+    词表按文章缓存，文章内容或词典文件变了自动失效；用户状态每次单独查。
+    """
+    content_hash = hashlib.sha1((content or "").encode("utf-8")).hexdigest()
+    lexicon = get_lexicon()
+    version = lexicon.mtime if lexicon is not None else None
+
+    cached = _cache.get(article_id)
+    if cached and cached[0] == content_hash and cached[1] == version:
+        _cache.move_to_end(article_id)
+        token_map, entries = cached[2], cached[3]
+    else:
+        token_map, entries = _resolve(db, tokenize(content))
+        _cache[article_id] = (content_hash, version, token_map, entries)
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+    # 用户状态：一条 IN 查询，走 (user_id, word_id) 唯一索引
+    status = {}
+    if entries:
+        status = {
+            wid: ("learning" if is_learned else "saved")
+            for wid, is_learned in db.query(UserWordProgress.word_id, UserWordProgress.is_learned).filter(
+                UserWordProgress.user_id == user_id,
+                UserWordProgress.word_id.in_([e["id"] for e in entries])
+            ).all()
+        }
+
+    return {
+        "article_id": article_id,
+        "tokens": token_map,
+        "entries": [{**e, "status": status.get(e["id"], "new")} for e in entries],
+    }
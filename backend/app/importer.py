@@ -0,0 +1,151 @@
+import csv
+import io
+import time
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from .database import dialect_insert
+from .lexicon import build_lexicon
+from .model import Word
+from .study_queue import extend_level_orders
+from .word_levels import write_word_levels, levels_from_tag
+
+# CSV 列 -> Word 字段
+COLUMNS = {
+    "word": "spell",
+    "phonetic": "phonetic",
+    "definition": "definition",
+    "translation": "translation",
+    "exchange": "exchange",
+    "tag": "tag",
+}
+FIELDS = list(COLUMNS.values())
+
+CHUNK_SIZE = 5000
+
+
+def iter_csv_records(csv_path: str, start_offset: int = 0):
+    """
+    流式读取 ECDICT CSV，逐行 yield (这一行结束处的字节偏移, 行 dict)。
+    偏移量可以原样传回 start_offset 断点续传；表头总是从文件开头读。
+    """
+    with open(csv_path, "rb") as f:
+        header = next(csv.reader([f.readline().decode("utf-8-sig")]))
+        if start_offset > f.tell():
+            f.seek(start_offset)
+
+        buf = b""
+        for line in iter(f.readline, b""):
+            buf += line
+            # 引号没配对说明字段里有换行，接着读下一行
+            if buf.count(b'"') % 2:
+                continue
+            row = next(csv.reader([buf.decode("utf-8")]), None)
+            buf = b""
+            if row:
+                yield f.tell(), dict(zip(header, row))
+
+
+def _copy_chunk(db: Session, rows):
+    """Postgres：COPY 进临时表，再 INSERT ... ON CONFLICT DO NOTHING 合并进 words"""
+    cols = ", ".join(FIELDS)
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for r in rows:
+        writer.writerow([r[c] for c in FIELDS])
+    buf.seek(0)
+
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.execute(
+            f"CREATE TEMP TABLE IF NOT EXISTS words_import_stage ({', '.join(c + ' TEXT' for c in FIELDS)}) "
+            "ON COMMIT DELETE ROWS"
+        )
+        cursor.copy_expert(f"COPY words_import_stage ({cols}) FROM STDIN WITH (FORMAT csv)", buf)
+        cursor.execute(
+            f"INSERT INTO words ({cols}) SELECT {cols} FROM words_import_stage ON CONFLICT (spell) DO NOTHING"
+        )
+        return cursor.rowcount
+    finally:
+        cursor.close()
+
+
+def _executemany_chunk(db: Session, rows):
+    """SQLite 等：一条 INSERT 走 executemany，冲突的拼写直接跳过"""
+    try:
+        stmt = dialect_insert(db, Word.__table__).on_conflict_do_nothing(index_elements=["spell"])
+    except NotImplementedError:
+        stmt = insert(Word.__table__) # 已经按预加载的拼写集合去过重了
+    result = db.connection().execute(stmt, rows)
+    return result.rowcount if result.rowcount is not None and result.rowcount >= 0 else len(rows)
+
+
+def _write_levels(db: Session, rows):
+    """刚写进去的这批词，按 tag 拆出等级写进 word_levels (和词在同一个事务里)"""
+    tags = {r["spell"]: r["tag"] for r in rows}
+    ids = db.query(Word.id, Word.spell).filter(Word.spell.in_(list(tags))).all()
+    write_word_levels(db, [(wid, tags[spell]) for wid, spell in ids])
+
+
+def _write_chunk(db: Session, rows):
+    dialect = db.get_bind().dialect
+    if dialect.name == "postgresql" and dialect.driver == "psycopg2":
+        inserted = _copy_chunk(db, rows)
+    else:
+        inserted = _executemany_chunk(db, rows)
+    _write_levels(db, rows)
+    db.commit()
+    return inserted
+
+
+def import_ecdict(db: Session, csv_path: str, tags=None, start_offset: int = 0,
+                  chunk_size: int = CHUNK_SIZE, on_chunk=None):
+    """
+    导入 ECDICT：
+    - tags: 只导入 tag 里包含其中任一标签的词；None 表示全量
+    - 已有拼写一次性预加载到内存集合里去重，不再逐行 SELECT
+    - 每 chunk_size 行写一次 (Postgres 走 COPY，其他走 executemany) 并提交
+    - on_chunk(stats)：每提交一批回调一次，stats["offset"] 可用来断点续传
+    返回统计 dict
+    """
+    t0 = time.time()
+    existing = {spell for (spell,) in db.query(Word.spell).yield_per(10000)}
+
+    stats = {"scanned": 0, "inserted": 0, "offset": start_offset, "rows_per_sec": 0.0, "elapsed": 0.0}
+    chunk = []
+
+    def flush(offset):
+        if chunk:
+            stats["inserted"] += _write_chunk(db, chunk)
+            chunk.clear()
+        stats["offset"] = offset
+        stats["elapsed"] = time.time() - t0
+        stats["rows_per_sec"] = stats["scanned"] / stats["elapsed"] if stats["elapsed"] else 0.0
+        if on_chunk:
+            on_chunk(dict(stats))
+
+    offset = start_offset
+    try:
+        for offset, row in iter_csv_records(csv_path, start_offset):
+            stats["scanned"] += 1
+            spell = row.get("word")
+            if not spell or spell in existing:
+                continue
+            if tags and not levels_from_tag(row.get("tag")) & set(tags):
+                continue
+            existing.add(spell)
+            chunk.append({field: row.get(col, "") for col, field in COLUMNS.items()})
+            if len(chunk) >= chunk_size:
+                flush(offset)
+        flush(offset)
+    except Exception:
+        db.rollback()
+        raise
+    return stats
+
+
+def refresh_after_import(db: Session):
+    """导入新词后，补上各等级的新词顺序并重建词典文件"""
+    extend_level_orders(db)
+    return build_lexicon(db)
@@ -0,0 +1,178 @@
+import json
+
+_WHITESPACE = " \t\r\n"
+
+
+class JSONFieldStream:
+    """
+    增量解析 AI 流式返回的 JSON 对象 (根节点必须是 {...})，边收边吐事件：
+      {"event": "field", "key": k, "value": v}            顶层字段解析完成
+      {"event": "item", "key": k, "index": i, "value": v} item_keys 里的数组每完成一个元素
+      {"event": "delta", "key": k, "text": t}             text_keys 里的字符串字段新到的文字
+    AI 偶尔包的 ```json 前缀会被跳过；最后用 result() 拿完整对象。
+    """
+
+    def __init__(self, item_keys=(), text_keys=()):
+        self.item_keys = set(item_keys)
+        self.text_keys = set(text_keys)
+        self.buf = ""
+        self.pos = 0
+        self.stack = []       # 还没闭合的 { [
+        self.in_str = False
+        self.escape = False
+        self.started = False  # 已经遇到根节点的 {
+        self.done = False     # 根节点已经闭合
+
+        self.expect = "key"   # 顶层：key / colon / value / comma
+        self.key_start = None
+        self.key = None
+        self.value_start = None
+        self.item_start = None
+        self.item_index = 0
+        self.delta_sent = 0
+
+        self.fields = {}
+
+    def feed(self, chunk: str):
+        """喂一段文本，返回这段文本里完成的事件列表"""
+        self.buf += chunk
+        events = []
+        buf = self.buf
+        for i in range(self.pos, len(buf)):
+            if self.done:
+                break
+            self._step(buf[i], i, events)
+        self.pos = len(buf)
+        self._emit_delta(events)
+        return events
+
+    def result(self):
+        """流结束后解析整个对象 (没闭合或格式不对会抛 ValueError)"""
+        if not self.done:
+            raise ValueError("AI response ended before the JSON object was complete")
+        return dict(self.fields)
+
+    # --- 内部 ---
+
+    def _step(self, c, i, events):
+        if not self.started:
+            if c == "{":
+                self.started = True
+                self.stack.append(c)
+            return
+
+        if self.in_str:
+            if self.escape:
+                self.escape = False
+            elif c == "\\":
+                self.escape = True
+            elif c == '"':
+                self.in_str = False
+                self._string_closed(i, events)
+            return
+
+        depth = len(self.stack)
+        if c in _WHITESPACE:
+            return
+
+        # 顶层的 key / 冒号 / 逗号
+        if depth == 1 and self.expect != "value":
+            if c == '"' and self.expect == "key":
+                self.in_str = True
+                self.key_start = i
+            elif c == ":" and self.expect == "colon":
+                self.expect = "value"
+            elif c == ",":
+                self.expect = "key"
+            elif c == "}":
+                self.stack.pop()
+                self.done = True
+            return
+
+        # 顶层的值开始
+        if depth == 1 and self.value_start is None:
+            self.value_start = i
+            self.item_index = 0
+            self.delta_sent = 0
+
+        # 数组元素开始 (只跟踪 item_keys 里的数组)
+        if depth == 2 and self._tracking_items() and self.item_start is None and c not in ",]":
+            self.item_start = i
+
+        if c == '"':
+            self.in_str = True
+        elif c in "{[":
+            self.stack.append(c)
+        elif c in "}]":
+            if depth == 2 and self._tracking_items() and self.item_start is not None:
+                # 标量元素以 ] 结尾，例如 [1, 2]
+                self._emit_item(self.buf[self.item_start:i], events)
+            self.stack.pop()
+            depth = len(self.stack)
+            if depth == 1:
+                self._emit_field(self.buf[self.value_start:i + 1], events)
+            elif depth == 2 and self._tracking_items() and self.item_start is not None:
+                self._emit_item(self.buf[self.item_start:i + 1], events)
+            elif depth == 0:
+                # 顶层标量值后面直接跟 }
+                self._emit_field(self.buf[self.value_start:i], events)
+                self.done = True
+        elif c == ",":
+            if depth == 1:
+                self._emit_field(self.buf[self.value_start:i], events)
+                self.expect = "key"
+            elif depth == 2 and self._tracking_items() and self.item_start is not None:
+                self._emit_item(self.buf[self.item_start:i], events)
+
+    def _tracking_items(self):
+        return (self.key in self.item_keys and self.value_start is not None
+                and self.buf[self.value_start] == "[" and self.stack[1:2] == ["["])
+
+    def _string_closed(self, i, events):
+        depth = len(self.stack)
+        if depth == 1 and self.expect == "key":
+            self.key = json.loads(self.buf[self.key_start:i + 1])
+            self.expect = "colon"
+        elif depth == 1 and self.value_start is not None:
+            self._emit_field(self.buf[self.value_start:i + 1], events)
+        elif depth == 2 and self._tracking_items() and self.item_start is not None:
+            self._emit_item(self.buf[self.item_start:i + 1], events)
+
+    def _emit_field(self, raw, events):
+        if self.value_start is None:
+            return
+        value = json.loads(raw)
+        if self.key in self.text_keys and isinstance(value, str) and len(value) > self.delta_sent:
+            events.append({"event": "delta", "key": self.key, "text": value[self.delta_sent:]})
+        self.fields[self.key] = value
+        events.append({"event": "field", "key": self.key, "value": value})
+        self.value_start = None
+        self.item_start = None
+        self.expect = "comma"
+
+    def _emit_item(self, raw, events):
+        if not raw.strip():
+            self.item_start = None
+            return
+        events.append({"event": "item", "key": self.key, "index": self.item_index, "value": json.loads(raw)})
+        self.item_index += 1
+        self.item_start = None
+
+    def _emit_delta(self, events):
+        # 正在收的顶层字符串字段：把已经到的部分先吐出去
+        if not (self.in_str and len(self.stack) == 1 and self.value_start is not None
+                and self.key in self.text_keys):
+            return
+        raw = self.buf[self.value_start + 1:]
+        # 末尾可能是被截断的转义序列 (\ 或 \u12)，往回退到能解析为止
+        for cut in range(len(raw), max(len(raw) - 6, -1), -1):
+            try:
+                text = json.loads('"' + raw[:cut] + '"')
+                break
+            except ValueError:
+                continue
+        else:
+            return
+        if len(text) > self.delta_sent:
+            events.append({"event": "delta", "key": self.key, "text": text[self.delta_sent:]})
+            self.delta_sent = len(text)
@@ -0,0 +1,10 @@
+# 等级配置：数据库Tag -> AI Prompt 描述
+LEVEL_CONFIG = {
+    "zk": {"name": "中考", "prompt": "Middle School Student (approx. 1500 vocabulary)", "total": 1600},
+    "gk": {"name": "高考", "prompt": "High School Student (approx. 3500 vocabulary)", "total": 3500},
+    "cet4": {"name": "CET-4", "prompt": "College Student (CET-4 level)", "total": 4500},
+    "cet6": {"name": "CET-6", "prompt": "College Student (CET-6 level)", "total": 6000},
+    "ky": {"name": "考研", "prompt": "Postgraduate Entrance Exam candidate", "total": 5500},
+    "ielts": {"name": "雅思", "prompt": "IELTS candidate (Band 7.0 target)", "total": 8000},
+    "toefl": {"name": "托福", "prompt": "TOEFL candidate (Score 100+ target)", "total": 10000},
+}
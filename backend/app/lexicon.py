@@ -0,0 +1,220 @@
+import os
+import sys
+import json
+import mmap
+import struct
+import time
+from array import array
+
+from sqlalchemy.orm import Session
+
+from .logs import get_logger
+from .model import Word
+
+# 词典文件放在静态目录之外，避免被 /static 挂载暴露。
+# 默认 backend/data/lexicon.bin，按本文件定位，和从哪个目录启动无关
+LEXICON_PATH = os.getenv("LEXICON_PATH", os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "lexicon.bin"))
+
+log = get_logger("lexicon")
+
+# 文件格式 (整数都是小端 uint32，换到大端机器上也能读)：
+#   header        MAGIC | n_keys | n_entries | keys_len | entries_len
+#   key_offsets   n_keys + 1 个，keys_blob 里第 i 个 key 的起止
+#   key_targets   n_keys 个，key 对应的词条下标；最高位为 1 表示是变形词 (lemma map)
+#   entry_offsets n_entries + 1 个，entries_blob 里第 i 个词条的起止
+#   keys_blob     按字节序排好的小写拼写 (utf-8)
+#   entries_blob  每个词条一段 JSON (id / spell / phonetic / translation / definition)
+MAGIC = b"WTLEX001"
+HEADER = struct.Struct("<8sIIII")
+INFLECTION_BIT = 0x80000000
+
+# ECDICT exchange 字段里代表"变形"的类型：过去式/过去分词/现在分词/三单/比较级/最高级/复数
+# (0: 和 1: 是反过来的"原形"信息，这里用不到)
+INFLECTION_TYPES = {"p", "d", "i", "3", "r", "t", "s"}
+
+# 数组在文件里是小端；大端机器上读写时换一下字节序
+NATIVE_LITTLE_ENDIAN = sys.byteorder == "little"
+
+# 检查文件是否被重建的最短间隔 (秒)
+RELOAD_CHECK_INTERVAL = 10
+
+
+def parse_exchange(exchange: str):
+    """"p:went/d:gone/i:going/3:goes" -> ["went", "gone", "going", "goes"]"""
+    forms = []
+    for part in (exchange or "").split("/"):
+        kind, _, form = part.partition(":")
+        if kind in INFLECTION_TYPES and form:
+            forms.append(form)
+    return forms
+
+
+def _uint32_bytes(values: array):
+    if not NATIVE_LITTLE_ENDIAN:
+        values = array("I", values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _uint32_view(buf: memoryview):
+    """小端机器上直接 cast，不拷贝；大端机器上拷一份换字节序"""
+    if NATIVE_LITTLE_ENDIAN:
+        return buf.cast("I")
+    values = array("I")
+    values.frombytes(buf)
+    values.byteswap()
+    return values
+
+
+def build_lexicon(db: Session, path: str = LEXICON_PATH):
+    """从 Word 表 + exchange 生成词典文件，先写临时文件再原子替换，正在用旧文件的 worker 不受影响"""
+    entries = []     # 编码好的词条 JSON
+    headwords = {}   # 小写拼写 -> 词条下标
+    forms = {}       # 小写变形词 -> 词条下标
+
+    rows = db.query(
+        Word.id, Word.spell, Word.phonetic, Word.translation, Word.definition, Word.exchange
+    ).order_by(Word.id).yield_per(5000)
+
+    for row in rows:
+        if not row.spell:
+            continue
+        key = row.spell.lower()
+        # 大小写不同的同一拼写 (Polish / polish)，优先保留本来就是小写的那个
+        if key in headwords and row.spell != key:
+            continue
+        idx = len(entries)
+        entries.append(json.dumps({
+            "id": row.id,
+            "spell": row.spell,
+            "phonetic": row.phonetic,
+            "translation": row.translation,
+            "definition": row.definition,
+        }, ensure_ascii=False).encode("utf-8"))
+        headwords[key] = idx
+        for form in parse_exchange(row.exchange):
+            forms.setdefault(form.lower(), idx)
+
+    # 原形优先：一个拼写既是原形又是别的词的变形时，按原形查
+    keys = {k.encode("utf-8"): v for k, v in forms.items() if k not in headwords}
+    keys = {k: v | INFLECTION_BIT for k, v in keys.items()}
+    keys.update({k.encode("utf-8"): v for k, v in headwords.items()})
+    sorted_keys = sorted(keys)
+
+    key_offsets, key_targets, pos = array("I", [0]), array("I"), 0
+    for k in sorted_keys:
+        pos += len(k)
+        key_offsets.append(pos)
+        key_targets.append(keys[k])
+    entry_offsets, pos = array("I", [0]), 0
+    for e in entries:
+        pos += len(e)
+        entry_offsets.append(pos)
+
+    keys_blob = b"".join(sorted_keys)
+    entries_blob = b"".join(entries)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(sorted_keys), len(entries), len(keys_blob), len(entries_blob)))
+        f.write(_uint32_bytes(key_offsets))
+        f.write(_uint32_bytes(key_targets))
+        f.write(_uint32_bytes(entry_offsets))
+        f.write(keys_blob)
+        f.write(entries_blob)
+    os.replace(tmp_path, path)
+    return {"entries": len(entries), "keys": len(sorted_keys)}
+
+
+class Lexicon:
+    """只读映射词典文件。所有 worker 映射同一个文件，内存里只有一份 (操作系统页缓存)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self.mtime = os.fstat(f.fileno()).st_mtime
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, n_keys, n_entries, keys_len, entries_len = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a lexicon file")
+
+        view = memoryview(self._mm)
+        pos = HEADER.size
+        def take(nbytes):
+            nonlocal pos
+            part = view[pos:pos + nbytes]
+            pos += nbytes
+            return part
+
+        self._key_offsets = _uint32_view(take(4 * (n_keys + 1)))
+        self._key_targets = _uint32_view(take(4 * n_keys))
+        self._entry_offsets = _uint32_view(take(4 * (n_entries + 1)))
+        self._keys = take(keys_len)
+        self._entries = take(entries_len)
+        self.n_keys = n_keys
+        self.n_entries = n_entries
+
+    def _key(self, i):
+        return self._keys[self._key_offsets[i]:self._key_offsets[i + 1]].tobytes()
+
+    def _find(self, key: bytes):
+        lo, hi = 0, self.n_keys
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.n_keys and self._key(lo) == key:
+            return self._key_targets[lo]
+        return None
+
+    def entry(self, idx: int):
+        raw = self._entries[self._entry_offsets[idx]:self._entry_offsets[idx + 1]]
+        return json.loads(raw.tobytes())
+
+    def lookup(self, spell: str):
+        """
+        查词 (忽略大小写)，变形词 (dolphins / went) 会解析到原形词条。
+        返回 (词条 dict, 是否经由变形解析)；查不到返回 (None, False)
+        """
+        target = self._find(spell.strip().lower().encode("utf-8"))
+        if target is None:
+            return None, False
+        return self.entry(target & ~INFLECTION_BIT), bool(target & INFLECTION_BIT)
+
+    def __len__(self):
+        return self.n_entries
+
+
+_lexicon = None
+_last_check = 0.0
+
+
+def get_lexicon():
+    """
+    当前进程的词典实例，文件被重建后自动换成新文件。
+    文件不存在时返回 None，调用方应退回到数据库查询。
+    """
+    global _lexicon, _last_check
+    now = time.monotonic()
+    if _lexicon is not None and now - _last_check < RELOAD_CHECK_INTERVAL:
+        return _lexicon
+    _last_check = now
+
+    try:
+        mtime = os.stat(LEXICON_PATH).st_mtime
+    except FileNotFoundError:
+        _lexicon = None
+        return None
+
+    if _lexicon is None or _lexicon.mtime != mtime:
+        try:
+            _lexicon = Lexicon(LEXICON_PATH)
+        except (OSError, ValueError) as e:
+            log.error("lexicon_load_failed", path=LEXICON_PATH, error=str(e))
+            _lexicon = None
+    return _lexicon
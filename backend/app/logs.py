@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import random
+import logging
+from datetime import datetime, timezone
+
+# 结构化日志：每行一个 JSON ({"ts", "level", "logger", "event", ...字段})，方便按字段检索 / 聚合
+#   LOG_LEVEL        默认 INFO，要看 AI 原始返回之类的调试内容设成 DEBUG
+#   LOG_FORMAT       json (默认) / text (本地开发看着舒服)
+#   LOG_SAMPLE_RATE  INFO 及以下的日志按比例采样 (0~1)，WARNING 以上永远保留；
+#                    单条日志也可以传 sample=0.01 单独指定 (比如每个请求一行的访问日志)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1"))
+
+ROOT = "wordtech"
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        # 字段和固定的键重名 (比如 level=文章等级) 时加个下划线，别把日志级别盖掉
+        for key, value in getattr(record, "fields", {}).items():
+            data[key + "_" if key in data else key] = value
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        fields = " ".join(f"{k}={v}" for k, v in getattr(record, "fields", {}).items())
+        line = f"{self.formatTime(record)} {record.levelname:<7} {record.name} {record.getMessage()} {fields}".rstrip()
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class SampleFilter(logging.Filter):
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = getattr(record, "sample", None)
+        rate = LOG_SAMPLE_RATE if rate is None else rate
+        return rate >= 1 or random.random() < rate
+
+
+def _configure():
+    root = logging.getLogger(ROOT)
+    if root.handlers:
+        return
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(TextFormatter() if LOG_FORMAT == "text" else JSONFormatter())
+    handler.addFilter(SampleFilter())
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+    root.propagate = False # 别和 uvicorn 的根 logger 重复输出
+
+
+class EventLogger:
+    """log.info("tts_job_done", job_id=..., seconds=...)：事件名 + 任意字段"""
+
+    def __init__(self, name: str):
+        _configure()
+        self.logger = logging.getLogger(f"{ROOT}.{name}")
+
+    # 位置参数只能按位置传，字段里有 level / event 之类的名字也不会冲突
+    def _log(self, levelno, event, /, exc_info=None, sample=None, **fields):
+        if self.logger.isEnabledFor(levelno):
+            self.logger.log(levelno, event, exc_info=exc_info, extra={"fields": fields, "sample": sample})
+
+    def debug(self, event, /, **fields):
+        self._log(logging.DEBUG, event, **fields)
+
+    def info(self, event, /, **fields):
+        self._log(logging.INFO, event, **fields)
+
+    def warning(self, event, /, **fields):
+        self._log(logging.WARNING, event, **fields)
+
+    def error(self, event, /, **fields):
+        self._log(logging.ERROR, event, **fields)
+
+    def exception(self, event, /, **fields):
+        self._log(logging.ERROR, event, exc_info=True, **fields)
+
+
+def get_logger(name: str):
+    return EventLogger(name)
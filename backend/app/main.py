@@ -1,14 +1,38 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from contextlib import asynccontextmanager
+import asyncio
 import os
 from .api import router
+from .audio import router as audio_router
+from .article_pool import run_pool_worker, POOL_ENABLED
+from .database import dispose_async_engine, note_write
+from .metrics import MetricsMiddleware, render_metrics
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 后台补文章池
+    worker = asyncio.create_task(run_pool_worker()) if POOL_ENABLED else None
+    yield
+    if worker:
+        worker.cancel()
+        try:
+            await worker
+        except asyncio.CancelledError:
+            pass
+    await dispose_async_engine()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # 确保目录存在
 os.makedirs("static/audio", exist_ok=True)
 
+# 文章音频 (内容哈希文件名)：Range / ETag / 长期缓存，必须在 /static 挂载之前注册
+app.include_router(audio_router)
+
 # 挂载静态目录，这样访问 /static/audio/xxx.mp3 就能拿到文件
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -21,8 +45,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 记下谁刚写过数据，接下来几秒他的只读请求走主库 (读己之写)
+@app.middleware("http")
+async def remember_writes(request: Request, call_next):
+    response = await call_next(request)
+    user_id = request.headers.get("x-user-id")
+    if user_id and request.method not in ("GET", "HEAD", "OPTIONS"):
+        note_write(user_id)
+    return response
+
+# 最外层：每个路由的耗时 / 进行中请求数 + 采样访问日志 (最后注册的中间件在最外面)
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(router, prefix="/api")
 
 @app.get("/")
 def read_root():
     return {"message": "WordTech API is running!"}
+
+# Prometheus 抓取地址
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
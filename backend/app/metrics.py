@@ -0,0 +1,204 @@
+import os
+import time
+from contextvars import ContextVar
+
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest, multiprocess,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.routing import Match
+
+from .logs import get_logger
+
+# Prometheus 指标，GET /metrics 抓取：
+#   wordtech_http_*  每个路由 (按路由模板，不按具体 id) 的耗时直方图、请求数、进行中的请求数
+#   wordtech_db_*    SQL 耗时直方图 (按语句类型)、各连接池的连接占用
+#   wordtech_llm_*   DeepSeek 调用耗时、首 token 耗时、错误数、token 数、限流排队、缓存命中
+#   wordtech_tts_*   TTS 分段合成耗时、任务耗时、错误数、字符数
+# 多个 uvicorn worker 时设置 PROMETHEUS_MULTIPROC_DIR (每次启动前清空)，/metrics 汇总所有 worker；
+# 连接池 / 限流这类现场状态只报告处理这次抓取的那个 worker
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+AI_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 90, 180)
+
+# 超过这么多毫秒的请求一定记一条 warning 日志；其余请求按 LOG_REQUEST_SAMPLE_RATE 采样记录
+SLOW_REQUEST_MS = float(os.getenv("LOG_SLOW_REQUEST_MS", "1000"))
+REQUEST_LOG_SAMPLE_RATE = float(os.getenv("LOG_REQUEST_SAMPLE_RATE", "0.01"))
+
+HTTP_REQUESTS = Counter("wordtech_http_requests_total", "HTTP requests", ["method", "route", "status"])
+HTTP_LATENCY = Histogram("wordtech_http_request_duration_seconds", "HTTP request time until the last body byte",
+                         ["method", "route"], buckets=LATENCY_BUCKETS)
+HTTP_IN_FLIGHT = Gauge("wordtech_http_requests_in_flight", "HTTP requests being processed",
+                       ["method", "route"], multiprocess_mode="livesum")
+
+DB_QUERY_LATENCY = Histogram("wordtech_db_query_duration_seconds", "SQL statement execution time",
+                             ["operation"], buckets=DB_BUCKETS)
+DB_QUERY_ERRORS = Counter("wordtech_db_query_errors_total", "SQL statements that raised", ["operation"])
+
+LLM_LATENCY = Histogram("wordtech_llm_request_duration_seconds", "DeepSeek call time (whole stream for mode=stream)",
+                        ["endpoint", "mode"], buckets=AI_BUCKETS)
+LLM_FIRST_TOKEN = Histogram("wordtech_llm_first_token_seconds", "Time to the first streamed token",
+                            ["endpoint"], buckets=AI_BUCKETS)
+LLM_ERRORS = Counter("wordtech_llm_errors_total", "Failed DeepSeek calls", ["endpoint", "reason"])
+LLM_TOKENS = Counter("wordtech_llm_tokens_total", "Tokens reported by DeepSeek", ["endpoint", "kind"])
+
+TTS_SEGMENT_LATENCY = Histogram("wordtech_tts_segment_duration_seconds", "Synthesis time of one segment",
+                                ["backend"], buckets=AI_BUCKETS)
+TTS_JOB_LATENCY = Histogram("wordtech_tts_job_duration_seconds", "Synthesis time of a whole article",
+                            ["backend", "status"], buckets=AI_BUCKETS)
+TTS_ERRORS = Counter("wordtech_tts_errors_total", "Failed segment syntheses", ["backend"])
+TTS_CHARACTERS = Counter("wordtech_tts_characters_total", "Characters sent to the TTS backend", ["backend"])
+
+log = get_logger("http")
+
+# 当前请求的 [SQL 条数, SQL 总耗时]，访问日志里用来看时间花在数据库还是别处
+_request_db = ContextVar("request_db", default=None)
+
+
+# ================= 数据库 =================
+
+def _operation(statement: str):
+    word = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return word if word in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH") else "OTHER"
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    DB_QUERY_LATENCY.labels(_operation(statement)).observe(elapsed)
+    current = _request_db.get()
+    if current is not None:
+        current[0] += 1
+        current[1] += elapsed
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    starts = context.connection.info.get("query_start") if context.connection is not None else None
+    if starts:
+        starts.pop()
+    DB_QUERY_ERRORS.labels(_operation(context.statement or "")).inc()
+
+
+class RuntimeCollector:
+    """抓取时现读的状态：连接池占用、LLM 限流排队、LLM 缓存命中"""
+
+    def describe(self):
+        # 注册时不调用 collect()：那时 llm / database 模块可能还没导入完
+        return []
+
+    def collect(self):
+        from .database import all_engines
+        from .services.llm import llm
+        from .services.llm_cache import llm_cache
+
+        pool_size = GaugeMetricFamily("wordtech_db_pool_size", "Configured pool size", labels=["pool"])
+        pool_connections = GaugeMetricFamily("wordtech_db_pool_connections", "Pool connections by state",
+                                             labels=["pool", "state"])
+        for name, eng in all_engines().items():
+            pool = eng.pool
+            if not hasattr(pool, "checkedout"): # SQLite 内存库之类的简单连接池没有这些统计
+                continue
+            pool_size.add_metric([name], pool.size())
+            pool_connections.add_metric([name, "checked_out"], pool.checkedout())
+            pool_connections.add_metric([name, "idle"], pool.checkedin())
+            pool_connections.add_metric([name, "overflow"], max(pool.overflow(), 0))
+        yield pool_size
+        yield pool_connections
+
+        limiter_state = GaugeMetricFamily("wordtech_llm_limiter_requests", "Requests holding / waiting for an LLM slot",
+                                          labels=["endpoint", "state"])
+        limiter_rejected = CounterMetricFamily("wordtech_llm_limiter_rejected", "Requests rejected with 503",
+                                               labels=["endpoint"])
+        for name, limiter in llm.limiters.items():
+            limiter_state.add_metric([name, "in_flight"], limiter.in_flight)
+            limiter_state.add_metric([name, "waiting"], limiter.waiting)
+            limiter_rejected.add_metric([name], limiter.rejected)
+        yield limiter_state
+        yield limiter_rejected
+
+        cache_lookups = CounterMetricFamily("wordtech_llm_cache_lookups", "LLM cache lookups by result",
+                                            labels=["endpoint", "result"])
+        for name, counters in llm_cache.counters.items():
+            for result in ("hits", "db_hits", "misses", "coalesced"):
+                cache_lookups.add_metric([name, result], counters[result])
+        yield cache_lookups
+
+
+_runtime = RuntimeCollector()
+REGISTRY.register(_runtime)
+
+
+def render_metrics():
+    """/metrics 的响应体和 Content-Type"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(_runtime)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+# ================= HTTP =================
+
+def route_template(scope):
+    """按路由模板给请求归类 (/api/reading/{article_id})，具体 id 不进标签，免得指标无限增长"""
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match != Match.NONE:
+            return route.path
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    纯 ASGI 中间件 (不用 @app.middleware)：流式响应 (SSE) 要等最后一个字节发完才算结束。
+    同时给每个请求记一行采样的访问日志，慢请求一定记录。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        route = route_template(scope)
+        in_flight = HTTP_IN_FLIGHT.labels(method, route)
+        status = 500
+        db = [0, 0.0]
+        token = _request_db.set(db)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_flight.dec()
+            _request_db.reset(token)
+            HTTP_LATENCY.labels(method, route).observe(elapsed)
+            HTTP_REQUESTS.labels(method, route, str(status)).inc()
+
+            fields = dict(method=method, route=route, status=status, duration_ms=round(elapsed * 1000, 1),
+                          db_queries=db[0], db_ms=round(db[1] * 1000, 1))
+            if elapsed * 1000 >= SLOW_REQUEST_MS:
+                log.warning("slow_request", **fields)
+            else:
+                log.info("request", sample=REQUEST_LOG_SAMPLE_RATE, **fields)
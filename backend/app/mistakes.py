@@ -0,0 +1,74 @@
+import re
+import hashlib
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from .database import dialect_insert
+from .model import QuizMistake
+
+# 错题去重：按 "用户 + 题目哈希" 判重，(user_id, question_hash) 唯一索引兜底，
+# 查重就是一次索引探测，不用再拿整段题目文本去比较
+
+
+def question_hash(question: str):
+    # 空白差异不算不同的题
+    normalized = re.sub(r"\s+", " ", (question or "").strip())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:32]
+
+
+def save_mistakes(db: Session, user_id: str, mistakes):
+    """一条 INSERT ... ON CONFLICT DO NOTHING 批量写入，返回真正新增的条数 (重复的题不算)"""
+    rows = {}
+    for m in mistakes:
+        digest = question_hash(m.question)
+        rows.setdefault(digest, {
+            "user_id": user_id,
+            "question_hash": digest,
+            "question": m.question,
+            "options": m.options,
+            "correct_answer": m.correct_answer,
+            "user_answer": m.user_answer,
+            "explanation": m.explanation,
+            "from_article_title": m.from_article_title,
+        })
+    if not rows:
+        return 0
+
+    stmt = dialect_insert(db, QuizMistake).values(list(rows.values()))
+    stmt = stmt.on_conflict_do_nothing(index_elements=["user_id", "question_hash"]).returning(QuizMistake.id)
+    inserted = len(db.execute(stmt).all())
+    db.commit()
+    return inserted
+
+
+def backfill_question_hashes(db: Session, batch_size: int = 1000):
+    """
+    给老数据补 question_hash (加唯一索引之前跑)。
+    同一用户的重复错题只留最早的一条。返回 (补上的条数, 删掉的重复条数)。
+    """
+    seen = {
+        (user_id, digest)
+        for user_id, digest in db.query(QuizMistake.user_id, QuizMistake.question_hash).filter(
+            QuizMistake.question_hash.isnot(None)
+        ).all()
+    }
+    rows = db.query(QuizMistake.id, QuizMistake.user_id, QuizMistake.question).filter(
+        QuizMistake.question_hash.is_(None)
+    ).order_by(QuizMistake.id).all()
+
+    updates, duplicates = [], []
+    for mistake_id, user_id, question in rows:
+        digest = question_hash(question)
+        if (user_id, digest) in seen:
+            duplicates.append(mistake_id)
+        else:
+            seen.add((user_id, digest))
+            updates.append({"id": mistake_id, "question_hash": digest})
+
+    for i in range(0, len(duplicates), batch_size):
+        db.query(QuizMistake).filter(QuizMistake.id.in_(duplicates[i:i + batch_size])).delete(synchronize_session=False)
+    for i in range(0, len(updates), batch_size):
+        db.execute(update(QuizMistake), updates[i:i + batch_size]) # 按主键批量 UPDATE
+    db.commit()
+    return len(updates), len(duplicates)
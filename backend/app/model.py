@@ -1,8 +1,18 @@
-from sqlalchemy import Column, Integer, String, Text, JSON, DateTime, Float, ForeignKey, Date, Boolean
+from sqlalchemy import Column, Integer, String, Text, JSON, DateTime, Float, ForeignKey, Date, Boolean, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime, date
+import zlib
 from .database import Base
 
+
+def deck_seed_for(user_id: str):
+    """新词洗牌种子的默认值：由 user_id 算出来，老用户没存种子时按同样的方式算，结果一致"""
+    return zlib.crc32((user_id or "").encode("utf-8")) & 0x7FFFFFFF # 放得进 32 位有符号整数列
+
+
+def _default_deck_seed(context):
+    return deck_seed_for(context.get_current_parameters().get("user_id"))
+
 class Word(Base):
     __tablename__ = "words"
     id = Column(Integer, primary_key=True, index=True)
@@ -15,6 +25,17 @@ class Word(Base):
     ai_sentence = Column(JSON, nullable=True) 
     audio_url = Column(String, nullable=True)
 
+class WordLevel(Base):
+    """词属于哪些等级 (从 Word.tag 拆出来)，按等级筛词走主键 (level, word_id)"""
+    __tablename__ = "word_levels"
+    level = Column(String, primary_key=True)
+    word_id = Column(Integer, ForeignKey("words.id"), primary_key=True)
+
+    __table_args__ = (
+        # 反查一个词属于哪些等级
+        Index("ix_word_levels_word_id", "word_id"),
+    )
+
 class UserWordProgress(Base):
     __tablename__ = "user_word_progress"
     
@@ -32,6 +53,37 @@ class UserWordProgress(Base):
     
     word = relationship("Word")
 
+    __table_args__ = (
+        # 复习队列：user_id = ? AND next_review <= now ORDER BY next_review，走索引范围扫描
+        Index("ix_progress_user_next_review", "user_id", "next_review"),
+        # 每个用户每个词只有一条进度，批量提交靠它做 upsert；同时服务 user_id = ? AND word_id IN (...)
+        Index("uq_progress_user_word", "user_id", "word_id", unique=True),
+    )
+
+class LevelWordOrder(Base):
+    """每个等级预先打乱好的新词顺序，取新词时按 position 顺序读，不再 ORDER BY random()"""
+    __tablename__ = "level_word_order"
+    level = Column(String, primary_key=True)
+    position = Column(Integer, primary_key=True)
+    word_id = Column(Integer, ForeignKey("words.id"))
+
+class UserLevelCursor(Base):
+    """用户在自己这副新词牌 (study_queue.deck_position) 里的游标：position 之前的词都已经进了进度表"""
+    __tablename__ = "user_level_cursors"
+    user_id = Column(String, primary_key=True)
+    level = Column(String, primary_key=True)
+    position = Column(Integer, default=0)
+    # 开始这副牌时顺序表有多少个词，前 deck_size 张按用户自己的排列读，之后追加的词按顺序读；
+    # NULL 是老游标，整副牌都按共享顺序读
+    deck_size = Column(Integer, nullable=True)
+
+class UserLevelStats(Base):
+    """用户在每个等级已学会的词数：提交学习时增量维护，scripts/reconcile_counters.py 定期对账校正"""
+    __tablename__ = "user_level_stats"
+    user_id = Column(String, primary_key=True)
+    level = Column(String, primary_key=True)
+    learned_count = Column(Integer, default=0)
+
 class Article(Base):
     __tablename__ = "articles"
 
@@ -46,6 +98,27 @@ class Article(Base):
     # 译文 (可选)
     translation = Column(Text, nullable=True)
 
+    # 文章池：后台预先生成的文章 is_pooled=True，学生领走前 claimed_by 为空，不出现在列表里
+    is_pooled = Column(Boolean, default=False)
+    claimed_by = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index("ix_article_pool", "difficulty", "is_pooled", "claimed_by"),
+    )
+
+class ArticleQuiz(Base):
+    """文章的测验题：同一篇文章、同一等级只生成一次，之后直接读库"""
+    __tablename__ = "article_quizzes"
+    id = Column(Integer, primary_key=True)
+    article_id = Column(Integer, ForeignKey("articles.id"))
+    level = Column(String)
+    items = Column(JSON) # [{"question", "options", "answer", "explanation"}]
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("uq_article_quiz_level", "article_id", "level", unique=True),
+    )
+
 # backend/app/model.py
 
 class UserStats(Base):
@@ -54,7 +127,7 @@ class UserStats(Base):
     user_id = Column(String, index=True) # 去掉 default=1
     streak_days = Column(Integer, default=0)
     last_study_date = Column(DateTime, nullable=True) # 上次打卡日期
-    total_learned_count = Column(Integer, default=0)
+    total_learned_count = Column(Integer, default=0) # is_learned = 1 的进度条数，增量维护
     daily_progress = Column(Integer, default=0)
     daily_target = Column(Integer, default=15)
     current_level = Column(String, default="zk")
@@ -64,12 +137,19 @@ class UserStats(Base):
     is_pro = Column(Boolean, default=False)
     pro_until = Column(DateTime, nullable=True)
     stripe_customer_id = Column(String, nullable=True)
+    deck_seed = Column(Integer, default=_default_deck_seed) # 新词洗牌种子，决定每个用户的新词顺序
+
+    __table_args__ = (
+        # 每个用户只有一行，额度扣减 / 新用户插入都靠它 (ON CONFLICT)
+        Index("uq_user_stats_user_id", "user_id", unique=True),
+    )
 
 class QuizMistake(Base):
     __tablename__ = "quiz_mistakes"
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(String, index=True) # 去掉 default=1
     question = Column(Text)
+    question_hash = Column(String) # 题目规范化后的 sha256 前 32 位，用来去重
     options = Column(JSON)
     correct_answer = Column(String)
     user_answer = Column(String)
@@ -77,6 +157,13 @@ class QuizMistake(Base):
     from_article_title = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # 错题本按 id 倒序翻页
+        Index("ix_quiz_mistakes_user_id_id", "user_id", "id"),
+        # 同一用户同一道题只存一次，批量写入靠它 ON CONFLICT DO NOTHING
+        Index("uq_quiz_mistakes_user_question", "user_id", "question_hash", unique=True),
+    )
+
 # ... 现有 imports
 class UserWriting(Base):
     __tablename__ = "user_writings"
@@ -87,6 +174,10 @@ class UserWriting(Base):
     ai_feedback = Column(JSON)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        Index("ix_user_writings_user_id_id", "user_id", "id"),
+    )
+
 class UserGrammarAnalysis(Base):
     __tablename__ = "user_grammar_analyses"
     id = Column(Integer, primary_key=True)
@@ -95,6 +186,10 @@ class UserGrammarAnalysis(Base):
     analysis_result = Column(JSON)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        Index("ix_user_grammar_analyses_user_id_id", "user_id", "id"),
+    )
+
 class UserFeedback(Base):
     __tablename__ = "user_feedback"
     id = Column(Integer, primary_key=True)
@@ -112,3 +207,13 @@ class RedemptionCode(Base): # 注意：这里如果用了SQLAlchemy，应该是
     used_by_user_id = Column(String, nullable=True)
     used_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+
+class LLMCacheEntry(Base):
+    """AI 返回结果缓存，key 是 (model, prompt, temperature, response_format) 的哈希"""
+    __tablename__ = "llm_cache"
+    key = Column(String(64), primary_key=True)
+    endpoint = Column(String)
+    response = Column(Text)
+    latency_ms = Column(Float) # 当初调用上游花了多久，命中时记为节省的时间
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, index=True)
@@ -0,0 +1,28 @@
+from fastapi import Query
+
+# 历史列表按 id 倒序翻页 (keyset)：下一页只要带上一页最后一条的 id，
+# 走 (user_id, id) 联合索引，翻到多深都是一次索引范围扫描，不用 OFFSET
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class PageParams:
+    """?before_id=...&limit=... ，before_id 不传就是第一页"""
+
+    def __init__(self, before_id: int = Query(None, ge=1),
+                 limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
+        self.before_id = before_id
+        self.limit = limit
+
+
+def keyset_page(query, id_column, page: PageParams):
+    """
+    query 已经按用户过滤好；多取一条判断有没有下一页。
+    返回 {"items": [...], "next_cursor": 下一页的 before_id 或 None}
+    """
+    if page.before_id is not None:
+        query = query.filter(id_column < page.before_id)
+    rows = query.order_by(id_column.desc()).limit(page.limit + 1).all()
+    has_more = len(rows) > page.limit
+    rows = rows[:page.limit]
+    return {"items": rows, "next_cursor": rows[-1].id if has_more else None}
@@ -0,0 +1,106 @@
+from datetime import date, datetime
+
+from sqlalchemy import update, case, func, or_, and_
+from sqlalchemy.orm import Session
+
+from .database import dialect_insert
+from .model import UserStats
+
+# 免费用户每天的 AI 额度
+QUOTA_LIMITS = {
+    "reading": 3,
+    "writing": 1,  # 写作和语法共用这个昂贵的额度
+}
+
+
+def _consume_stmt(user_id: str, quota_type: str, today: date, now: datetime):
+    """
+    一条条件 UPDATE 完成 "跨天清零 + 检查额度 + 计数 + 1"：
+    - 跨天 (last_ai_date 不是今天)：本项记 1，其他项清零
+    - 同一天：只有没超额才 + 1，超额时 WHERE 不成立，一行都不更新
+    - 会员未过期：直接放行 (计数照记，不影响)
+    数据库按行加锁串行执行，并发请求不会多放进来。
+    """
+    limit = QUOTA_LIMITS.get(quota_type, 1)
+    same_day = UserStats.last_ai_date == today
+    used = getattr(UserStats, f"usage_{quota_type}")
+
+    values = {"last_ai_date": today}
+    for name in QUOTA_LIMITS:
+        column = getattr(UserStats, f"usage_{name}")
+        if name == quota_type:
+            values[column.key] = case((same_day, func.coalesce(column, 0) + 1), else_=1)
+        else:
+            values[column.key] = case((same_day, func.coalesce(column, 0)), else_=0)
+
+    return (
+        update(UserStats)
+        .where(
+            UserStats.user_id == user_id,
+            or_(
+                UserStats.last_ai_date.is_(None),
+                UserStats.last_ai_date != today,
+                func.coalesce(used, 0) < limit,
+                and_(UserStats.is_pro.is_(True), UserStats.pro_until > now),
+            ),
+        )
+        .values(**values)
+        .returning(used)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def consume_quota(db: Session, user_id: str, quota_type: str = "reading"):
+    """
+    扣一次额度，成功返回扣完后的用量，超额返回 None。
+    新用户先插入一行 (user_id 唯一，并发插入只会成功一个) 再扣。
+    """
+    today = date.today()
+    now = datetime.utcnow()
+    for _ in range(2):
+        row = db.execute(_consume_stmt(user_id, quota_type, today, now)).first()
+        if row is not None:
+            db.commit()
+            return row[0]
+
+        exists = db.query(UserStats.id).filter(UserStats.user_id == user_id).first()
+        if exists:
+            db.commit()
+            return None
+        # 还没有这一行：插入一行空的 (别人同时插入了也没关系)，再扣一次
+        stmt = dialect_insert(db, UserStats).values(
+            user_id=user_id, streak_days=0, daily_progress=0, total_learned_count=0,
+            usage_reading=0, usage_writing=0, last_ai_date=today, is_pro=False
+        )
+        db.execute(stmt.on_conflict_do_nothing(index_elements=["user_id"]))
+        db.commit()
+    return None
+
+
+def merge_duplicate_user_stats(db: Session):
+    """
+    加 user_id 唯一索引之前跑：以前 "查不到就插入" 并发时会给同一个用户插出多行 UserStats。
+    留 id 最小的那行 (以前的 .first() 读写的都是它，等级 / 目标 / 洗牌种子以它为准)，
+    其余行的计数 / 日期取较大值、会员状态取有效的合并进来，然后删掉。返回删掉的行数。
+    """
+    user_ids = [user_id for (user_id,) in db.query(UserStats.user_id).group_by(
+        UserStats.user_id
+    ).having(func.count(UserStats.id) > 1).all()]
+
+    def latest(*values):
+        values = [v for v in values if v is not None]
+        return max(values) if values else None
+
+    removed = 0
+    for user_id in user_ids:
+        keep, *others = db.query(UserStats).filter(UserStats.user_id == user_id).order_by(UserStats.id).all()
+        for other in others:
+            for field in ("streak_days", "daily_progress", "total_learned_count", "usage_reading", "usage_writing",
+                          "last_study_date", "last_ai_date", "pro_until"):
+                setattr(keep, field, latest(getattr(keep, field), getattr(other, field)))
+            keep.is_pro = bool(keep.is_pro or other.is_pro)
+            keep.stripe_customer_id = keep.stripe_customer_id or other.stripe_customer_id
+            db.delete(other)
+            removed += 1
+    db.commit()
+    return removed
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 from typing import Optional, Dict, List
 from datetime import datetime
 
@@ -18,6 +18,15 @@ class StudySubmit(BaseModel):
     word_id: int
     quality: int # 0-5
 
+# 批量提交里的一张卡片
+class StudyResult(BaseModel):
+    word_id: int
+    quality: int # 0-5
+    reviewed_at: Optional[datetime] = None # 卡片的复习时间，不传就按提交时间算
+
+class StudyBatchSubmit(BaseModel):
+    results: List[StudyResult] # 按复习先后顺序
+
 class ArticleDTO(BaseModel):
     id: int
     title: str
@@ -25,6 +34,12 @@ class ArticleDTO(BaseModel):
     translation: Optional[str]
     vocab_list: List[int] # 包含的单词ID
 
+# AI 生成文章返回的 JSON
+class ArticleDraft(BaseModel):
+    title: str
+    content: str
+    translation: Optional[str] = None
+
 class QuizItem(BaseModel):
     question: str
     options: List[str]
@@ -52,6 +67,18 @@ class WritingSubmit(BaseModel):
     topic: str
     content: str
 
+# AI 批改作文返回的 JSON
+class WritingCorrection(BaseModel):
+    original: str
+    correction: str
+    reason: str
+
+class WritingFeedback(BaseModel):
+    score: int
+    comment: str
+    corrections: List[WritingCorrection] = []
+    better_version: str
+
 # 写作记录返回
 class WritingDTO(BaseModel): # 不要继承 WritingSubmit 了，重新定义，避免混淆
     id: int
@@ -64,6 +91,59 @@ class WritingDTO(BaseModel): # 不要继承 WritingSubmit 了，重新定义，
     class Config:
         from_attributes = True
 
+# 写作历史列表：只带分数和开头一小段，完整批改点进去再查 /writing/{id}
+class WritingSummaryDTO(BaseModel):
+    id: int
+    topic: Optional[str] = None
+    score: Optional[int] = None
+    excerpt: Optional[str] = None
+    created_at: datetime
+
+    @field_validator("score", mode="before")
+    @classmethod
+    def parse_score(cls, value):
+        # 老数据里 AI 给的分数没校验过 ("85/100" 之类)，解析不了就当没有，别让整页历史报错
+        try:
+            return int(float(value)) if value is not None else None
+        except (TypeError, ValueError):
+            return None
+
+    class Config:
+        from_attributes = True
+
+# 语法分析记录
+class GrammarDTO(BaseModel):
+    id: int
+    sentence: str
+    analysis_result: Dict
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+# 语法历史列表：不带整段分析结果，只带译文
+class GrammarSummaryDTO(BaseModel):
+    id: int
+    sentence: str
+    translation: Optional[str] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+# 分页返回：next_cursor 作为下一页的 before_id，None 表示没有更多了
+class MistakePage(BaseModel):
+    items: List[MistakeDTO]
+    next_cursor: Optional[int] = None
+
+class WritingHistoryPage(BaseModel):
+    items: List[WritingSummaryDTO]
+    next_cursor: Optional[int] = None
+
+class GrammarHistoryPage(BaseModel):
+    items: List[GrammarSummaryDTO]
+    next_cursor: Optional[int] = None
+
 class FeedbackCreate(BaseModel):
     content: str
     contact_email: str = None
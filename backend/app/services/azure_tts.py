@@ -1,10 +1,27 @@
 import azure.cognitiveservices.speech as speechsdk
 import os
 
-def generate_audio_file(text, filename):
-    speech_config = speechsdk.SpeechConfig(subscription="YourKey", region="YourRegion")
-    speech_config.speech_synthesis_voice_name='en-US-JennyNeural' # 效果很好的女声
-    
+from ..logs import get_logger
+
+# TTS 后端接口：generate_audio_file(text, filename, voice) -> bool
+# 把 text 合成成 MP3 (16kHz 32kbps 单声道) 写到 filename，成功返回 True
+# 另外要有 VOICE / AUDIO_FORMAT 两个常量，参与音频文件名的内容哈希
+# 换后端只要再写一个同样签名的模块，见 services/tts.py 里的 TTS_BACKENDS
+
+AUDIO_FORMAT = 'audio-16khz-32kbitrate-mono-mp3' # 参与音频文件的内容哈希
+VOICE = 'en-US-JennyNeural' # 效果很好的女声
+
+log = get_logger("tts.azure")
+
+def generate_audio_file(text, filename, voice=VOICE):
+    speech_config = speechsdk.SpeechConfig(
+        subscription=os.getenv("AZURE_SPEECH_KEY"),
+        region=os.getenv("AZURE_SPEECH_REGION")
+    )
+    speech_config.speech_synthesis_voice_name = voice
+    # 所有分段格式一致，拼接后才是一个完整的 MP3
+    speech_config.set_speech_synthesis_output_format(speechsdk.SpeechSynthesisOutputFormat.Audio16Khz32KBitRateMonoMp3)
+
     # 直接输出到文件
     file_config = speechsdk.audio.AudioOutputConfig(filename=filename)
     synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=file_config)
@@ -13,4 +30,10 @@ def generate_audio_file(text, filename):
     
     if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
         return True
+    if result.reason == speechsdk.ResultReason.Canceled:
+        cancellation_details = result.cancellation_details
+        details = None
+        if cancellation_details.reason == speechsdk.CancellationReason.Error:
+            details = cancellation_details.error_details
+        log.error("azure_tts_canceled", reason=str(cancellation_details.reason), details=details)
     return False
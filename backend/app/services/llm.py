@@ -0,0 +1,222 @@
+import os
+import time
+import asyncio
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from openai import AsyncOpenAI
+
+from .llm_cache import llm_cache, make_key
+from ..metrics import LLM_LATENCY, LLM_FIRST_TOKEN, LLM_ERRORS, LLM_TOKENS
+
+load_dotenv()
+
+MODEL = "deepseek-chat"
+
+# 每类接口单独限流，互不抢占：
+#   concurrency 同时最多几个请求在等 DeepSeek
+#   queue       最多几个请求排队等并发名额，再多直接 503，别把 worker 堆满
+#   timeout     单次调用超时 (秒)
+# 环境变量覆盖，例如 LLM_WRITING_CONCURRENCY=8 / LLM_WRITING_QUEUE=50 / LLM_WRITING_TIMEOUT=120
+ENDPOINT_CLASSES = {
+    "article": {"concurrency": 4, "queue": 20, "timeout": 90},
+    "quiz": {"concurrency": 4, "queue": 20, "timeout": 60},
+    "writing": {"concurrency": 4, "queue": 20, "timeout": 90},
+    "grammar": {"concurrency": 8, "queue": 40, "timeout": 45},
+    "topic": {"concurrency": 4, "queue": 20, "timeout": 20},
+    "enrich": {"concurrency": 16, "queue": 64, "timeout": 180}, # 批量生成例句 (脚本用，并发由调用方控制)
+}
+
+
+class EndpointLimiter:
+    def __init__(self, name: str, concurrency: int, queue: int, timeout: float):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = queue
+        self.timeout = timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    @asynccontextmanager
+    async def slot(self):
+        # 队列满了直接拒绝，让前端稍后重试
+        if self.in_flight >= self.concurrency and self.waiting >= self.max_queue:
+            self.rejected += 1
+            LLM_ERRORS.labels(self.name, "rejected").inc()
+            raise HTTPException(
+                status_code=503,
+                detail="AI service is busy, please try again in a moment",
+                headers={"Retry-After": "5"}
+            )
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self):
+        return {
+            "concurrency": self.concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+        }
+
+
+def _load_limiters():
+    limiters = {}
+    for name, cfg in ENDPOINT_CLASSES.items():
+        prefix = f"LLM_{name.upper()}_"
+        limiters[name] = EndpointLimiter(
+            name,
+            concurrency=int(os.getenv(prefix + "CONCURRENCY", cfg["concurrency"])),
+            queue=int(os.getenv(prefix + "QUEUE", cfg["queue"])),
+            timeout=float(os.getenv(prefix + "TIMEOUT", cfg["timeout"])),
+        )
+    return limiters
+
+
+async def _close_stream(response):
+    """关掉上游的流式响应 (断开 HTTP 连接，DeepSeek 就不再接着生成)"""
+    close = getattr(response, "close", None) or getattr(response, "aclose", None)
+    if close is not None:
+        await close()
+
+
+class LLMGateway:
+    """所有 DeepSeek 调用的统一入口：异步客户端 + 分类限流 + 超时"""
+
+    def __init__(self, client: AsyncOpenAI = None):
+        self._client = client
+        self.limiters = _load_limiters()
+        # 每类接口累计用了多少 token (算成本用)
+        self.usage = defaultdict(lambda: {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0})
+
+    @property
+    def client(self):
+        # 第一次用到时再创建，方便测试 / 压测时换成本地替身
+        if self._client is None:
+            self._client = AsyncOpenAI(
+                api_key=os.getenv("DEEPSEEK_API_KEY"),
+                base_url=os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com"),
+                max_retries=0, # 超时由这里统一控制，SDK 自己重试会把等待时间翻几倍
+            )
+        return self._client
+
+    def set_client(self, client):
+        self._client = client
+
+    async def complete(self, endpoint: str, prompt: str, temperature: float = None,
+                       response_format: dict = None, model: str = MODEL, cache: bool = True):
+        """
+        发一个单轮对话，返回模型输出的文本。
+        endpoint 在 llm_cache.CACHE_POLICIES 里有策略时先查缓存，相同请求并发时只调一次上游。
+        """
+        call = lambda: self._call(endpoint, prompt, temperature, response_format, model)
+        if not cache:
+            return await call()
+        key = make_key(model, prompt, temperature, response_format)
+        return await llm_cache.get_or_call(endpoint, key, call)
+
+    async def cached(self, endpoint: str, prompt: str, temperature: float = None,
+                     response_format: dict = None, model: str = MODEL):
+        """complete() 同样参数的缓存结果，没有返回 None (不调上游)"""
+        key = make_key(model, prompt, temperature, response_format)
+        return await llm_cache.lookup(endpoint, key)
+
+    async def _call(self, endpoint, prompt, temperature, response_format, model):
+        limiter = self.limiters[endpoint]
+        kwargs = {"model": model, "messages": [{"role": "user", "content": prompt}]}
+        if temperature is not None:
+            kwargs["temperature"] = temperature
+        if response_format is not None:
+            kwargs["response_format"] = response_format
+
+        async with limiter.slot():
+            t0 = time.perf_counter()
+            try:
+                response = await asyncio.wait_for(
+                    self.client.chat.completions.create(**kwargs),
+                    timeout=limiter.timeout
+                )
+            except asyncio.TimeoutError:
+                LLM_ERRORS.labels(endpoint, "timeout").inc()
+                raise HTTPException(status_code=504, detail="AI request timed out")
+            except Exception:
+                LLM_ERRORS.labels(endpoint, "error").inc()
+                raise
+            finally:
+                LLM_LATENCY.labels(endpoint, "complete").observe(time.perf_counter() - t0)
+
+        usage = self.usage[endpoint]
+        usage["calls"] += 1
+        if getattr(response, "usage", None):
+            usage["prompt_tokens"] += response.usage.prompt_tokens or 0
+            usage["completion_tokens"] += response.usage.completion_tokens or 0
+            LLM_TOKENS.labels(endpoint, "prompt").inc(response.usage.prompt_tokens or 0)
+            LLM_TOKENS.labels(endpoint, "completion").inc(response.usage.completion_tokens or 0)
+        return response.choices[0].message.content
+
+    async def stream(self, endpoint: str, prompt: str, temperature: float = None,
+                     response_format: dict = None, model: str = MODEL):
+        """
+        流式调用，逐段 yield 模型输出的文本 (不走缓存)。
+        整个流期间都占着这类接口的并发名额；超时按整段输出计算。
+        """
+        limiter = self.limiters[endpoint]
+        kwargs = {"model": model, "messages": [{"role": "user", "content": prompt}], "stream": True}
+        if temperature is not None:
+            kwargs["temperature"] = temperature
+        if response_format is not None:
+            kwargs["response_format"] = response_format
+
+        async with limiter.slot():
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + limiter.timeout
+            t0 = time.perf_counter()
+            first_token = True
+            response = None
+            try:
+                response = await asyncio.wait_for(self.client.chat.completions.create(**kwargs),
+                                                  timeout=limiter.timeout)
+                chunks = response.__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout=deadline - loop.time())
+                    except StopAsyncIteration:
+                        break
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        if first_token:
+                            LLM_FIRST_TOKEN.labels(endpoint).observe(time.perf_counter() - t0)
+                            first_token = False
+                        yield chunk.choices[0].delta.content
+            except asyncio.TimeoutError:
+                LLM_ERRORS.labels(endpoint, "timeout").inc()
+                raise HTTPException(status_code=504, detail="AI request timed out")
+            except Exception:
+                LLM_ERRORS.labels(endpoint, "error").inc()
+                raise
+            finally:
+                LLM_LATENCY.labels(endpoint, "stream").observe(time.perf_counter() - t0)
+                if response is not None:
+                    await _close_stream(response)
+
+    def stats(self):
+        return {
+            "limits": {name: limiter.stats() for name, limiter in self.limiters.items()},
+            "cache": llm_cache.stats(),
+            "usage": dict(self.usage),
+        }
+
+
+llm = LLMGateway()
@@ -0,0 +1,210 @@
+import json
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta
+
+from ..database import SessionLocal
+from ..logs import get_logger
+from ..model import LLMCacheEntry
+
+# 每类接口的缓存策略：
+#   ttl     过期时间 (秒)
+#   size    进程内 LRU 最多存多少条
+#   persist 是否写到数据库，多个 worker / 重启后共用
+# 不在这里的接口 (article、quiz、topic) 不走缓存；topic 本来就要每次换一个，缓存了同等级的人全拿到同一题
+CACHE_POLICIES = {
+    "grammar": {"ttl": 30 * 86400, "size": 2000, "persist": True},  # 全班粘贴同一个句子
+    "writing": {"ttl": 86400, "size": 500, "persist": True},        # 同一篇作文重复提交
+}
+
+# 每写入这么多条，顺手清一次数据库里过期的缓存
+PURGE_EVERY = 500
+
+log = get_logger("llm_cache")
+
+
+def make_key(model: str, prompt: str, temperature, response_format):
+    raw = json.dumps([model, prompt, temperature, response_format], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LeaderCancelled(Exception):
+    """发起上游调用的那个请求被取消了 (客户端断开)：合并进来等结果的请求重新查一遍 / 自己去调"""
+
+
+class LLMCache:
+    """进程内 LRU + 数据库两级缓存，相同的请求同时到达时只调用一次上游 (single-flight)"""
+
+    def __init__(self):
+        self._lru = defaultdict(OrderedDict) # endpoint -> key -> (response, latency_ms, expires_ts)
+        self._inflight = {}                  # key -> Future
+        self._writes = 0
+        self.counters = defaultdict(lambda: {
+            "hits": 0, "db_hits": 0, "misses": 0, "coalesced": 0, "saved_ms": 0.0
+        })
+
+    def _memory_get(self, endpoint, key):
+        lru = self._lru[endpoint]
+        item = lru.get(key)
+        if item is None:
+            return None
+        if item[2] < time.time():
+            del lru[key]
+            return None
+        lru.move_to_end(key)
+        return item
+
+    def _memory_put(self, endpoint, key, response, latency_ms, expires_ts):
+        lru = self._lru[endpoint]
+        lru[key] = (response, latency_ms, expires_ts)
+        lru.move_to_end(key)
+        while len(lru) > CACHE_POLICIES[endpoint]["size"]:
+            lru.popitem(last=False)
+
+    def _db_get(self, key):
+        db = SessionLocal()
+        try:
+            row = db.get(LLMCacheEntry, key)
+            if row and row.expires_at > datetime.utcnow():
+                return row.response, row.latency_ms or 0.0, row.expires_at
+            return None
+        finally:
+            db.close()
+
+    def _memory_hit(self, endpoint, key):
+        item = self._memory_get(endpoint, key)
+        if item is None:
+            return None
+        counters = self.counters[endpoint]
+        counters["hits"] += 1
+        counters["saved_ms"] += item[1]
+        return item[0]
+
+    async def _db_hit(self, endpoint, key):
+        try:
+            row = await asyncio.to_thread(self._db_get, key)
+        except Exception as e:
+            # 数据库那层读不了就当没命中，照常调上游
+            log.warning("llm_cache_read_failed", endpoint=endpoint, error=str(e))
+            return None
+        if row is None:
+            return None
+        response, latency_ms, expires_at = row
+        counters = self.counters[endpoint]
+        counters["db_hits"] += 1
+        counters["saved_ms"] += latency_ms
+        self._memory_put(endpoint, key, response, latency_ms,
+                         time.time() + (expires_at - datetime.utcnow()).total_seconds())
+        return response
+
+    def _db_put(self, endpoint, key, response, latency_ms, ttl):
+        db = SessionLocal()
+        try:
+            db.merge(LLMCacheEntry(
+                key=key,
+                endpoint=endpoint,
+                response=response,
+                latency_ms=latency_ms,
+                created_at=datetime.utcnow(),
+                expires_at=datetime.utcnow() + timedelta(seconds=ttl),
+            ))
+            db.commit()
+        finally:
+            db.close()
+
+    def purge_expired(self):
+        db = SessionLocal()
+        try:
+            deleted = db.query(LLMCacheEntry).filter(LLMCacheEntry.expires_at < datetime.utcnow()).delete()
+            db.commit()
+            return deleted
+        finally:
+            db.close()
+
+    async def lookup(self, endpoint: str, key: str):
+        """只查缓存 (内存 -> 数据库)，没有返回 None，不调上游。扣额度之前先看看有没有现成的结果"""
+        policy = CACHE_POLICIES.get(endpoint)
+        if policy is None:
+            return None
+        response = self._memory_hit(endpoint, key)
+        if response is None and policy["persist"]:
+            response = await self._db_hit(endpoint, key)
+        return response
+
+    async def get_or_call(self, endpoint: str, key: str, call):
+        """
+        命中缓存直接返回；否则调用 call() (返回文本的协程函数) 并写入缓存。
+        同一个 key 正在调用上游时，后来的请求等同一个结果，不会重复调用。
+        """
+        policy = CACHE_POLICIES.get(endpoint)
+        if policy is None:
+            return await call()
+        counters = self.counters[endpoint]
+
+        response = self._memory_hit(endpoint, key)
+        if response is not None:
+            return response
+
+        while (pending := self._inflight.get(key)) is not None:
+            counters["coalesced"] += 1
+            try:
+                return await asyncio.shield(pending)
+            except LeaderCancelled:
+                # 别人的取消不该传到这个请求上：结果到了就拿缓存，没到就轮到自己调
+                counters["coalesced"] -= 1
+                response = self._memory_hit(endpoint, key)
+                if response is not None:
+                    return response
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            if policy["persist"]:
+                response = await self._db_hit(endpoint, key)
+                if response is not None:
+                    future.set_result(response)
+                    return response
+
+            t0 = time.perf_counter()
+            response = await call()
+            latency_ms = (time.perf_counter() - t0) * 1000
+            counters["misses"] += 1
+
+            self._memory_put(endpoint, key, response, latency_ms, time.time() + policy["ttl"])
+            future.set_result(response)
+
+            if policy["persist"]:
+                try:
+                    await asyncio.to_thread(self._db_put, endpoint, key, response, latency_ms, policy["ttl"])
+                    self._writes += 1
+                    if self._writes % PURGE_EVERY == 0:
+                        await asyncio.to_thread(self.purge_expired)
+                except Exception as e:
+                    # 缓存写不进去不影响这次请求
+                    log.warning("llm_cache_write_failed", endpoint=endpoint, error=str(e))
+            return response
+        except BaseException as e:
+            if not future.done():
+                # 取消只属于发起调用的这个请求，等着的请求拿到 LeaderCancelled 后重试
+                future.set_exception(LeaderCancelled() if isinstance(e, asyncio.CancelledError) else e)
+                future.exception() # 没人在等时也别报 "exception was never retrieved"
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self):
+        result = {}
+        for endpoint, c in self.counters.items():
+            lookups = c["hits"] + c["db_hits"] + c["misses"] + c["coalesced"]
+            result[endpoint] = {
+                **c,
+                "saved_ms": round(c["saved_ms"]),
+                "hit_rate": round((lookups - c["misses"]) / lookups, 3) if lookups else 0.0,
+                "memory_entries": len(self._lru[endpoint]),
+            }
+        return result
+
+
+llm_cache = LLMCache()
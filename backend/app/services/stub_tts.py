@@ -0,0 +1,22 @@
+import os
+import time
+
+# 本地替身后端 (TTS_BACKEND=stub)：不联网，按文字长度生成静音 MP3，方便离线测试 / 压测
+# TTS_STUB_DELAY 模拟每个字符的合成耗时 (秒)，默认 0.002 ≈ 500 字 1 秒
+
+AUDIO_FORMAT = 'audio-16khz-32kbitrate-mono-mp3' # 参与音频文件的内容哈希
+VOICE = 'stub'
+
+# 一帧 MPEG-2 Layer III，16kHz 32kbps 单声道 (和 Azure 输出格式一致)，576 个采样 = 36ms
+_FRAME = b"\xff\xf3\x48\xc0" + b"\x00" * 140
+_FRAME_SECONDS = 576 / 16000
+
+# 按正常语速算，每秒大约读 15 个字符
+CHARS_PER_SECOND = 15
+
+def generate_audio_file(text, filename, voice=VOICE):
+    time.sleep(len(text) * float(os.getenv("TTS_STUB_DELAY", "0.002")))
+    frames = max(1, int(len(text) / CHARS_PER_SECOND / _FRAME_SECONDS))
+    with open(filename, "wb") as f:
+        f.write(_FRAME * frames)
+    return True
@@ -0,0 +1,244 @@
+import os
+import re
+import gzip
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import asyncio
+import importlib
+from collections import OrderedDict
+
+from ..logs import get_logger
+from ..metrics import TTS_SEGMENT_LATENCY, TTS_JOB_LATENCY, TTS_ERRORS, TTS_CHARACTERS
+
+# TTS 任务系统：
+# - 同一篇文章同时被多人请求时只合成一次，后来的请求加入同一个任务
+# - 长文章按段落拆开并行合成，再按顺序拼成一个 MP3，写完后原子地换到最终路径
+# - 合成后端可插拔：TTS_BACKEND=azure (默认) / stub (本地静音替身，离线测试用)
+# - 文件名是 (文字, 声音, 格式) 的内容哈希：内容不变 URL 不变，可以永久缓存；改了文章自然换新文件
+
+TTS_BACKENDS = {
+    "azure": ".azure_tts",
+    "stub": ".stub_tts",
+}
+
+AUDIO_DIR = "static/audio"
+
+# 全局同时最多合成几段 (Azure 免费档并发很低，按账号调)
+TTS_CONCURRENCY = int(os.getenv("TTS_CONCURRENCY", "4"))
+
+# 单段最长字符数：段落太长就按句子再切
+MAX_SEGMENT_CHARS = int(os.getenv("TTS_MAX_SEGMENT_CHARS", "1500"))
+
+# AUDIO_SIDECARS=1 时顺带写一份 .gz 预压缩副本 (MP3 本身压不了多少，省不到 10% 就不留)
+AUDIO_SIDECARS = os.getenv("AUDIO_SIDECARS", "0") == "1"
+SIDECAR_MIN_SAVING = 0.1
+
+# 合成失败后多少秒内再请求直接返回失败，不立刻重试 (免得前端轮询把后端打爆)
+FAILURE_COOLDOWN = 30
+
+# 内存里最多记多少个任务 (完成的任务状态留着给轮询用)
+MAX_JOBS = 500
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+log = get_logger("tts")
+
+
+def get_backend(name: str = None):
+    name = name or os.getenv("TTS_BACKEND", "azure")
+    if name not in TTS_BACKENDS:
+        raise ValueError(f"Unknown TTS backend: {name}")
+    return importlib.import_module(TTS_BACKENDS[name], __package__)
+
+
+def audio_digest(text: str, voice: str, audio_format: str):
+    raw = json.dumps([text, voice, audio_format], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def write_sidecars(path: str):
+    """给音频文件写 .gz 副本，压缩收益太小就不写"""
+    with open(path, "rb") as f:
+        data = f.read()
+    packed = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(packed) > len(data) * (1 - SIDECAR_MIN_SAVING):
+        return False
+    tmp_path = f"{path}.gz.{uuid.uuid4().hex}"
+    with open(tmp_path, "wb") as f:
+        f.write(packed)
+    os.replace(tmp_path, path + ".gz")
+    return True
+
+
+def split_segments(text: str, max_chars: int = MAX_SEGMENT_CHARS):
+    """按段落拆分；超长段落按句子切到 max_chars 以内"""
+    segments = []
+    for paragraph in (text or "").splitlines():
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            segments.append(paragraph)
+            continue
+        current = ""
+        for sentence in _SENTENCE_END.split(paragraph):
+            if current and len(current) + len(sentence) + 1 > max_chars:
+                segments.append(current)
+                current = sentence
+            else:
+                current = f"{current} {sentence}".strip()
+        if current:
+            segments.append(current)
+    return segments
+
+
+class TTSJob:
+    def __init__(self, job_id: str, text: str, output_path: str, audio_url: str):
+        self.id = job_id
+        self.text = text
+        self.output_path = output_path
+        self.audio_url = audio_url
+        self.status = "queued" # queued / running / done / failed
+        self.segments_total = 0
+        self.segments_done = 0
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.task = None
+
+    def to_dict(self):
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "progress": {"done": self.segments_done, "total": self.segments_total},
+        }
+        if self.status == "done":
+            data["audio_url"] = self.audio_url
+        if self.error:
+            data["error"] = self.error
+        return data
+
+
+class TTSJobManager:
+    def __init__(self, backend=None):
+        self._backend = backend
+        self._jobs = OrderedDict() # job_id -> TTSJob
+        self._semaphore = None
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = get_backend()
+        return self._backend
+
+    def set_backend(self, backend):
+        self._backend = backend
+
+    @property
+    def backend_name(self):
+        return self.backend.__name__.rsplit(".", 1)[-1]
+
+    def get(self, job_id: str):
+        return self._jobs.get(job_id)
+
+    def submit_text(self, text: str):
+        """按内容哈希提交：同样的文字 (同一个声音、格式) 只合成一次，job_id 就是哈希"""
+        backend = self.backend
+        digest = audio_digest(text, backend.VOICE, backend.AUDIO_FORMAT)
+        return self.submit(digest, text, f"{digest}.mp3")
+
+    def submit(self, job_id: str, text: str, filename: str):
+        """
+        提交合成任务，返回 TTSJob。
+        文件已经存在 -> 直接是 done；同一个 job_id 正在跑 -> 返回同一个任务；
+        刚失败过 -> 冷却期内返回那个失败的任务。
+        """
+        output_path = os.path.join(AUDIO_DIR, filename)
+        audio_url = f"/static/audio/{filename}"
+
+        job = self._jobs.get(job_id)
+        if job and job.status in ("queued", "running"):
+            return job
+        if job and job.status == "failed" and time.time() - job.finished_at < FAILURE_COOLDOWN:
+            return job
+
+        job = TTSJob(job_id, text, output_path, audio_url)
+        if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+            job.status = "done"
+            return job
+
+        self._jobs[job_id] = job
+        self._jobs.move_to_end(job_id)
+        self._prune()
+        job.task = asyncio.create_task(self._run(job))
+        return job
+
+    def _prune(self):
+        while len(self._jobs) > MAX_JOBS:
+            oldest_id, oldest = next(iter(self._jobs.items()))
+            if oldest.status in ("queued", "running"):
+                break
+            self._jobs.pop(oldest_id)
+
+    async def _synthesize(self, job: TTSJob, text: str, path: str):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(TTS_CONCURRENCY)
+        backend = self.backend_name
+        TTS_CHARACTERS.labels(backend).inc(len(text))
+        async with self._semaphore:
+            t0 = time.perf_counter()
+            try:
+                ok = await asyncio.to_thread(self.backend.generate_audio_file, text, path)
+            finally:
+                TTS_SEGMENT_LATENCY.labels(backend).observe(time.perf_counter() - t0)
+        if not ok or not os.path.exists(path):
+            TTS_ERRORS.labels(backend).inc()
+            raise RuntimeError("TTS backend returned no audio")
+        job.segments_done += 1
+
+    async def _run(self, job: TTSJob):
+        segments = split_segments(job.text)
+        job.segments_total = len(segments)
+        job.status = "running"
+        os.makedirs(AUDIO_DIR, exist_ok=True)
+        work_dir = os.path.join(AUDIO_DIR, f".tts-{uuid.uuid4().hex}")
+        os.makedirs(work_dir)
+        t0 = time.time()
+        try:
+            if not segments:
+                raise ValueError("Nothing to synthesize")
+            log.info("tts_job_started", job_id=job.id, segments=len(segments), backend=self.backend_name)
+            parts = [os.path.join(work_dir, f"{i:04d}.mp3") for i in range(len(segments))]
+            results = await asyncio.gather(*[
+                self._synthesize(job, text, path) for text, path in zip(segments, parts)
+            ], return_exceptions=True)
+            errors = [r for r in results if isinstance(r, BaseException)]
+            if errors:
+                raise errors[0]
+
+            # 按顺序拼接，写完再原子替换，别人永远读不到写了一半的文件
+            tmp_path = os.path.join(work_dir, "full.mp3")
+            with open(tmp_path, "wb") as out:
+                for path in parts:
+                    with open(path, "rb") as f:
+                        shutil.copyfileobj(f, out)
+            os.replace(tmp_path, job.output_path)
+            if AUDIO_SIDECARS:
+                write_sidecars(job.output_path)
+
+            job.status = "done"
+            log.info("tts_job_done", job_id=job.id, seconds=round(time.time() - t0, 2))
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            log.error("tts_job_failed", job_id=job.id, error=str(e))
+        finally:
+            job.finished_at = time.time()
+            TTS_JOB_LATENCY.labels(self.backend_name, job.status).observe(job.finished_at - t0)
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+tts_jobs = TTSJobManager()
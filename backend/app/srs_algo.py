@@ -1,13 +1,21 @@
 from datetime import datetime, timedelta
 
-def calculate_review(quality: int, prev_easiness: float, prev_interval: int, prev_reps: int):
+import numpy as np
+
+# 间隔上限 (天)：答对次数多了间隔按 EF 指数增长，不封顶会算出几万年后的日期 (datetime 直接溢出)
+MAX_INTERVAL = 36500
+
+def calculate_review(quality: int, prev_easiness: float, prev_interval: int, prev_reps: int, now: datetime = None):
     """
     quality: 0(忘记) ~ 5(完全认识)
+    now: 复习发生的时间，默认当前时间 (批量提交时传卡片自己的复习时间)
     返回: (new_easiness, new_interval, new_reps, next_review_date)
     """
+    now = now or datetime.utcnow()
+
     # 1. 如果忘记 (quality < 3)，重置进度
     if quality < 3:
-        return max(1.3, prev_easiness), 1, 0, datetime.utcnow() + timedelta(days=1)
+        return max(1.3, prev_easiness), 1, 0, now + timedelta(days=1)
 
     # 2. 计算新的难度系数 (Easiness Factor)
     # 公式：EF' = EF + (0.1 - (5-q) * (0.08 + (5-q)*0.02))
@@ -20,9 +28,46 @@ def calculate_review(quality: int, prev_easiness: float, prev_interval: int, pre
     elif prev_reps == 1:
         new_interval = 6
     else:
-        new_interval = int(prev_interval * new_easiness)
+        new_interval = min(int(prev_interval * new_easiness), MAX_INTERVAL)
 
     # 4. 计算下次复习日期
-    next_date = datetime.utcnow() + timedelta(days=new_interval)
+    next_date = now + timedelta(days=new_interval)
 
     return new_easiness, new_interval, prev_reps + 1, next_date
+
+
+def calculate_review_batch(quality, easiness, interval, reps, now):
+    """
+    calculate_review 的向量化版本，用于回填排期 / 整表 what-if 分析。
+    quality, easiness, interval, reps: 等长数组
+    now: 复习时间，datetime 或 datetime64 数组 (每条一个)，必须显式传入
+    返回: (new_easiness, new_interval, new_reps, next_review) 四个数组，next_review 为 datetime64[us]
+    结果和逐条调用 calculate_review 完全一致 (间隔同样封顶 MAX_INTERVAL 天)。
+    """
+    q = np.asarray(quality, dtype=np.int64)
+    ef = np.asarray(easiness, dtype=np.float64)
+    iv = np.asarray(interval, dtype=np.int64)
+    rp = np.asarray(reps, dtype=np.int64)
+    now = np.asarray(now, dtype="datetime64[us]")
+
+    # 1. 忘记 (quality < 3)：EF 不变 (但不低于 1.3)，间隔 1 天，连续次数清零
+    forgot = q < 3
+
+    # 2. 新的难度系数，公式和顺序与标量版本一致，保证浮点结果逐位相同
+    d = 5 - q
+    passed_ef = np.maximum(1.3, ef + (0.1 - d * (0.08 + d * 0.02)))
+
+    # 3. 新的间隔：第 1 次 1 天，第 2 次 6 天，之后 int(prev_interval * EF)，最多 MAX_INTERVAL 天
+    passed_iv = np.where(
+        rp == 0, 1,
+        np.where(rp == 1, 6, np.minimum(np.trunc(iv * passed_ef), MAX_INTERVAL).astype(np.int64))
+    )
+
+    new_ef = np.where(forgot, np.maximum(1.3, ef), passed_ef)
+    new_iv = np.where(forgot, 1, passed_iv)
+    new_rp = np.where(forgot, 0, rp + 1)
+
+    # 4. 下次复习日期
+    next_review = now + new_iv.astype("timedelta64[D]")
+
+    return new_ef, new_iv, new_rp, next_review
@@ -0,0 +1,52 @@
+import json
+import asyncio
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from .json_stream import JSONFieldStream
+from .logs import get_logger
+from .services.llm import llm
+
+log = get_logger("stream")
+
+
+def sse(event: str, data) -> str:
+    """一条 Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+def sse_response(events):
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}, # 别让 nginx 攒着不发
+    )
+
+
+async def stream_json_events(endpoint: str, prompt: str, on_complete, item_keys=(), text_keys=(), **kwargs):
+    """
+    流式调用 AI，把输出转成 SSE：
+      token  原始文本片段
+      field / item / delta  增量 JSON 解析结果 (见 JSONFieldStream)
+      done   完整对象通过 on_complete(obj) 校验存库后，带上它的返回值
+      error  任何一步失败 (响应头已经发出去了，状态码放在 data 里)
+    on_complete 是同步函数 (会开 Session 存库)，放到线程里跑，别卡住事件循环。
+    """
+    parser = JSONFieldStream(item_keys=item_keys, text_keys=text_keys)
+    # 客户端断开 / 超时时这个生成器会被关掉，要显式关掉上游的流：
+    # 否则 AI 还在接着生成 (白花 token)，限流名额也要等垃圾回收才还回去
+    upstream = llm.stream(endpoint, prompt, **kwargs)
+    try:
+        async for text in upstream:
+            yield sse("token", {"text": text})
+            for event in parser.feed(text):
+                yield sse(event.pop("event"), event)
+        yield sse("done", await asyncio.to_thread(on_complete, parser.result()))
+    except HTTPException as e:
+        yield sse("error", {"status": e.status_code, "detail": e.detail})
+    except Exception as e:
+        log.exception("ai_stream_failed", endpoint=endpoint, error=str(e))
+        yield sse("error", {"status": 500, "detail": f"AI {endpoint} failed: {str(e)}"})
+    finally:
+        await upstream.aclose()
@@ -0,0 +1,224 @@
+import math
+import random
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .model import Word, UserWordProgress, LevelWordOrder, UserLevelCursor, deck_seed_for
+from .levels import LEVEL_CONFIG
+from .word_levels import in_level
+
+REVIEW_LIMIT = 20   # 一次最多拿多少个复习词
+QUEUE_SIZE = 10     # 复习词不够这个数时用新词补齐
+SCAN_BATCH = 40     # 每轮按顺序读多少个候选新词
+SCAN_ROUNDS = 3     # 最多读几轮，保证一次取队列的开销有上限
+
+# 已经确认建好顺序表的等级，避免每次请求都去探测
+_built_levels = set()
+
+
+def build_level_order(db: Session, level: str):
+    """
+    把该等级还没排进顺序表、且已有 AI 例句的词打乱后追加到末尾。
+    首次调用相当于建表；导入新词或补完例句后再调用一次即可，已有顺序不变。
+    返回追加的数量。
+    """
+    ordered = db.query(LevelWordOrder.word_id).filter(LevelWordOrder.level == level)
+    word_ids = [wid for (wid,) in db.query(Word.id).filter(
+        in_level(level),
+        Word.ai_sentence.isnot(None), # 只出有 AI 例句的词
+        Word.id.notin_(ordered)
+    ).all()]
+    if not word_ids:
+        return 0
+
+    random.shuffle(word_ids)
+    last = db.query(LevelWordOrder.position).filter(
+        LevelWordOrder.level == level
+    ).order_by(LevelWordOrder.position.desc()).first()
+    start = last[0] + 1 if last else 0
+
+    try:
+        # bulk_insert_mappings 当场就执行 INSERT，冲突在这里就会抛出来，不用等 commit
+        db.bulk_insert_mappings(LevelWordOrder, [
+            {"level": level, "position": start + i, "word_id": wid}
+            for i, wid in enumerate(word_ids)
+        ])
+        db.commit()
+    except IntegrityError:
+        # 另一个 worker 同时在建，用它的结果就行
+        db.rollback()
+        return 0
+    return len(word_ids)
+
+
+def extend_level_orders(db: Session):
+    """
+    导入新词 / 补完例句后调用：每个等级都追加新词。
+    没建过顺序的等级也要建 (之前被请求过、但当时还没有带例句的词，顺序表是空的)
+    """
+    return {lv: build_level_order(db, lv) for lv in LEVEL_CONFIG}
+
+
+def ensure_level_order(db: Session, level: str):
+    if level in _built_levels:
+        return
+    exists = db.query(LevelWordOrder.position).filter(LevelWordOrder.level == level).first()
+    if not exists and not build_level_order(db, level):
+        # 一个词都没排进去 (还没有带例句的词，或者别的 worker 正在建)：先不记下，下次请求再探测
+        exists = db.query(LevelWordOrder.position).filter(LevelWordOrder.level == level).first()
+        if not exists:
+            return
+    _built_levels.add(level)
+
+
+def level_size(db: Session, level: str):
+    """顺序表里这个等级有多少个词 (position 从 0 连续编号)"""
+    last = db.query(LevelWordOrder.position).filter(
+        LevelWordOrder.level == level
+    ).order_by(LevelWordOrder.position.desc()).first()
+    return last[0] + 1 if last else 0
+
+
+def deck_permutation(seed: int, level: str, size: int):
+    """
+    用户自己的洗牌方式 (a, b)：第 k 张牌 = 顺序表第 (a * k + b) % size 个位置。
+    a 和 size 互质，所以 k 走完 0..size-1 正好把每个位置读一遍；同一个种子每次算出来都一样。
+    """
+    if size <= 1:
+        return 1, 0
+    rng = random.Random(f"{seed}:{level}")
+    a = rng.randrange(1, size)
+    while math.gcd(a, size) != 1:
+        a = rng.randrange(1, size)
+    return a, rng.randrange(size)
+
+
+def deck_position(k: int, deck_size: int, a: int, b: int):
+    # 开始这副牌之后才追加的词 (k >= deck_size) 按顺序接在后面
+    return (a * k + b) % deck_size if k < deck_size else k
+
+
+def draw_new_words(db: Session, user_id: str, level: str, limit: int, seed: int = None):
+    """
+    从用户游标处按用户自己的新词顺序取 limit 个没学过的新词。
+    每轮按主键读 SCAN_BATCH 个位置，最多 SCAN_ROUNDS 轮，不排序，开销和词库大小、用户历史长短无关。
+    """
+    if limit <= 0:
+        return []
+    ensure_level_order(db, level)
+
+    cursor = db.get(UserLevelCursor, (user_id, level))
+    start = cursor.position if cursor else 0
+    if cursor and cursor.deck_size is not None:
+        deck_size = cursor.deck_size
+    elif cursor and start > 0:
+        deck_size = 0 # 老游标已经按共享顺序读了一段，接着按共享顺序读，不重复也不漏
+    else:
+        deck_size = level_size(db, level) # 还没开始：用现在的词数开一副新牌
+    a, b = deck_permutation(deck_seed_for(user_id) if seed is None else seed, level, deck_size)
+
+    picked = []
+    k = start
+    advance_to = start   # 游标只跳过"连续已学过"的前缀，发出去还没提交的词下次还会出
+    contiguous = True
+    exhausted = False
+
+    for _ in range(SCAN_ROUNDS):
+        positions = [deck_position(i, deck_size, a, b) for i in range(k, k + SCAN_BATCH)]
+        words = dict(db.query(LevelWordOrder.position, Word).join(
+            Word, Word.id == LevelWordOrder.word_id
+        ).filter(
+            LevelWordOrder.level == level,
+            LevelWordOrder.position.in_(positions)
+        ).all())
+        if not words:
+            break
+
+        seen = {wid for (wid,) in db.query(UserWordProgress.word_id).filter(
+            UserWordProgress.user_id == user_id,
+            UserWordProgress.word_id.in_([w.id for w in words.values()])
+        ).all()}
+
+        for i, position in enumerate(positions, start=k):
+            word = words.get(position)
+            if word is None:
+                exhausted = True # 读到顺序表末尾了
+                break
+            if word.id in seen:
+                if contiguous:
+                    advance_to = i + 1
+                continue
+            contiguous = False
+            picked.append(word)
+            if len(picked) >= limit:
+                break
+
+        if exhausted or len(picked) >= limit:
+            break
+        k += SCAN_BATCH
+
+    if advance_to != start:
+        if cursor:
+            cursor.position = advance_to
+            cursor.deck_size = deck_size
+        else:
+            db.add(UserLevelCursor(user_id=user_id, level=level, position=advance_to, deck_size=deck_size))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+
+    return picked
+
+
+def sample_level_words(db: Session, level: str, count: int):
+    """
+    从等级里随便挑 count 个词 (文章池用，不针对某个用户)：
+    顺序表本来就是打乱的，随机起点往后读一段就行，不用 ORDER BY random()
+    """
+    ensure_level_order(db, level)
+    size = level_size(db, level)
+    if size == 0:
+        return db.query(Word).filter(in_level(level)).limit(count).all() # 还没有词有例句
+    start = random.randrange(size)
+    positions = [(start + i) % size for i in range(min(count, size))]
+    return db.query(Word).join(
+        LevelWordOrder, LevelWordOrder.word_id == Word.id
+    ).filter(
+        LevelWordOrder.level == level,
+        LevelWordOrder.position.in_(positions)
+    ).all()
+
+
+def pick_learning_words(db: Session, user_id: str, level: str, count: int, seed: int = None):
+    """
+    用户正在学的词：先挑最快到期要复习的，不够再用他接下来要学的新词 (同一副牌，不推进游标)
+    """
+    words = db.query(Word).join(
+        UserWordProgress, UserWordProgress.word_id == Word.id
+    ).filter(
+        UserWordProgress.user_id == user_id,
+        in_level(level)
+    ).order_by(UserWordProgress.next_review).limit(count).all()
+    if len(words) < count:
+        words.extend(draw_new_words(db, user_id, level, count - len(words), seed))
+    return words
+
+
+def fetch_study_queue(db: Session, user_id: str, level: str, now: datetime = None, seed: int = None):
+    """复习词 (按到期先后) + 新词补齐，返回 Word 列表"""
+    now = now or datetime.utcnow()
+
+    review_list = db.query(Word).join(
+        UserWordProgress, UserWordProgress.word_id == Word.id
+    ).filter(
+        UserWordProgress.user_id == user_id,
+        UserWordProgress.next_review <= now
+    ).order_by(UserWordProgress.next_review).limit(REVIEW_LIMIT).all()
+
+    if len(review_list) < QUEUE_SIZE:
+        review_list.extend(draw_new_words(db, user_id, level, QUEUE_SIZE - len(review_list), seed))
+
+    return review_list
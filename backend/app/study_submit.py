@@ -0,0 +1,155 @@
+from datetime import datetime, date, timedelta, timezone
+
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+
+from .database import dialect_insert
+from .model import UserWordProgress, UserStats
+from .srs_algo import calculate_review
+from .counters import record_learned
+
+
+def record_study_checkin(user_stats: UserStats, count: int = 1):
+    """
+    打卡逻辑：今天第一次学习时处理连续天数，之后每张卡片累加今日进度。
+    count 张卡片一次处理，结果和逐张调用一样。
+    """
+    today = date.today()
+    last_date = user_stats.last_study_date.date() if user_stats.last_study_date else None
+
+    if last_date == today:
+        # 今天已经学过了，累加今日进度
+        user_stats.daily_progress = (user_stats.daily_progress or 0) + count
+    elif last_date == today - timedelta(days=1):
+        # 昨天打卡了，连续天数+1
+        user_stats.streak_days = (user_stats.streak_days or 0) + 1
+        user_stats.daily_progress = count
+        user_stats.last_study_date = datetime.utcnow()
+    else:
+        # 断签了（或者是第一次），Streak重置为1
+        user_stats.streak_days = 1
+        user_stats.daily_progress = count
+        user_stats.last_study_date = datetime.utcnow()
+
+
+def merge_duplicate_progress(db: Session, batch_size: int = 1000):
+    """
+    加 (user_id, word_id) 唯一索引之前跑：以前逐张提交的接口并发时会插出同一个词的多条进度。
+    每组只留最近一次复习的那条 (next_review - interval 就是上次复习的时间)，其余删掉；
+    任何一条学过 (is_learned) 就算学过。返回删掉的条数。
+    """
+    keys = set(db.query(UserWordProgress.user_id, UserWordProgress.word_id).group_by(
+        UserWordProgress.user_id, UserWordProgress.word_id
+    ).having(func.count(UserWordProgress.id) > 1).all())
+    if not keys:
+        return 0
+
+    groups = {}
+    user_ids = sorted({user_id for user_id, _ in keys})
+    for i in range(0, len(user_ids), batch_size):
+        rows = db.query(
+            UserWordProgress.id, UserWordProgress.user_id, UserWordProgress.word_id,
+            UserWordProgress.is_learned, UserWordProgress.interval, UserWordProgress.next_review
+        ).filter(UserWordProgress.user_id.in_(user_ids[i:i + batch_size])).all()
+        for row in rows:
+            if (row.user_id, row.word_id) in keys:
+                groups.setdefault((row.user_id, row.word_id), []).append(row)
+
+    def reviewed_at(row):
+        if row.next_review is None:
+            return datetime.min
+        return row.next_review - timedelta(days=row.interval or 0)
+
+    updates, duplicates = [], []
+    for rows in groups.values():
+        keep = max(rows, key=lambda r: (reviewed_at(r), r.id))
+        updates.append({"id": keep.id, "is_learned": max(r.is_learned or 0 for r in rows)})
+        duplicates.extend(r.id for r in rows if r.id != keep.id)
+
+    for i in range(0, len(duplicates), batch_size):
+        db.query(UserWordProgress).filter(
+            UserWordProgress.id.in_(duplicates[i:i + batch_size])
+        ).delete(synchronize_session=False)
+    for i in range(0, len(updates), batch_size):
+        db.execute(update(UserWordProgress), updates[i:i + batch_size]) # 按主键批量 UPDATE
+    db.commit()
+    return len(duplicates)
+
+
+def _review_time(reviewed_at: datetime, now: datetime):
+    # 统一成 UTC 的 naive 时间 (和库里 next_review 一致)，不接受未来时间
+    if reviewed_at is None:
+        return now
+    if reviewed_at.tzinfo is not None:
+        reviewed_at = reviewed_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return min(reviewed_at, now)
+
+
+def apply_study_results(db: Session, user_id: str, results):
+    """
+    按顺序应用一批 (word_id, quality, reviewed_at)，一个事务内完成：
+    一次 SELECT 读出已有进度，内存里逐张跑 SM-2，一条 upsert 写回，UserStats 和已学计数只改一次。
+    返回 {word_id: next_review}
+    """
+    now = datetime.utcnow()
+    word_ids = {r.word_id for r in results}
+
+    # word_id -> (easiness, interval, repetitions)
+    states = {}
+    learned_before = set()
+    for row in db.query(
+        UserWordProgress.word_id, UserWordProgress.easiness,
+        UserWordProgress.interval, UserWordProgress.repetitions, UserWordProgress.is_learned
+    ).filter(
+        UserWordProgress.user_id == user_id,
+        UserWordProgress.word_id.in_(word_ids)
+    ).all():
+        states[row.word_id] = (row.easiness, row.interval, row.repetitions)
+        if row.is_learned == 1:
+            learned_before.add(row.word_id)
+
+    next_reviews = {}
+    for r in results:
+        ef, interval, reps = states.get(r.word_id, (2.5, 0, 0))
+        ef, interval, reps, next_date = calculate_review(
+            r.quality, ef, interval, reps, now=_review_time(r.reviewed_at, now)
+        )
+        states[r.word_id] = (ef, interval, reps)
+        next_reviews[r.word_id] = next_date
+
+    rows = [
+        {
+            "user_id": user_id,
+            "word_id": wid,
+            "is_learned": 1,
+            "easiness": states[wid][0],
+            "interval": states[wid][1],
+            "repetitions": states[wid][2],
+            "next_review": next_date,
+        }
+        for wid, next_date in next_reviews.items()
+    ]
+    stmt = dialect_insert(db, UserWordProgress)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "word_id"],
+        set_={
+            "is_learned": stmt.excluded.is_learned,
+            "easiness": stmt.excluded.easiness,
+            "interval": stmt.excluded.interval,
+            "repetitions": stmt.excluded.repetitions,
+            "next_review": stmt.excluded.next_review,
+        }
+    )
+    db.execute(stmt, rows)
+
+    # 打卡统计整批只更新一次
+    user_stats = db.query(UserStats).filter(UserStats.user_id == user_id).first()
+    if not user_stats:
+        user_stats = UserStats(user_id=user_id, streak_days=0, last_study_date=None, daily_progress=0, total_learned_count=0)
+        db.add(user_stats)
+    record_study_checkin(user_stats, len(results))
+    # 这批里第一次学的词计入已学总数
+    record_learned(db, user_stats, word_ids - learned_before)
+
+    db.commit()
+    return next_reviews
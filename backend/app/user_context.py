@@ -0,0 +1,103 @@
+import os
+import time
+from datetime import datetime, date
+
+from sqlalchemy.orm import Session
+
+from .model import UserStats, deck_seed_for
+
+# 很少变的字段 (等级、每日目标、会员状态) 跨请求缓存 USER_CONTEXT_TTL 秒
+# 改这些字段的接口 (update_level / update_target / redeem / webhook) 会主动失效缓存；
+# 多个 worker 时别的进程最多晚 TTL 秒看到新值
+PROFILE_TTL = float(os.getenv("USER_CONTEXT_TTL", "30"))
+PROFILE_CACHE_SIZE = 10000
+
+DEFAULT_LEVEL = "zk"
+DEFAULT_TARGET = 15
+
+# user_id -> (过期时间, {"level", "daily_target", "pro_until", "deck_seed"})
+_profiles = {}
+
+
+def invalidate_user(user_id: str):
+    _profiles.pop(user_id, None)
+
+
+def _profile_of(stats: UserStats):
+    if stats is None:
+        return {"level": DEFAULT_LEVEL, "daily_target": DEFAULT_TARGET, "pro_until": None, "deck_seed": None}
+    return {
+        "level": stats.current_level or DEFAULT_LEVEL,
+        "daily_target": stats.daily_target or DEFAULT_TARGET,
+        "pro_until": stats.pro_until if stats.is_pro else None,
+        "deck_seed": stats.deck_seed,
+    }
+
+
+class UserContext:
+    """
+    一个请求里的用户信息：UserStats 最多查一次，等级 / 目标 / 会员优先读跨请求缓存。
+    需要计数字段 (打卡、额度) 时用 stats()，同一个请求里拿到的是同一行。
+    """
+
+    def __init__(self, db: Session, user_id: str):
+        self.db = db
+        self.user_id = user_id
+        self._stats = None
+        self._loaded = False
+        self._profile = None
+
+    def stats(self, create: bool = False):
+        """本请求的 UserStats 行 (只查一次)；create=True 时不存在就新建 (随本请求的 commit 一起写入)"""
+        if not self._loaded:
+            self._stats = self.db.query(UserStats).filter(UserStats.user_id == self.user_id).first()
+            self._loaded = True
+            self._remember(self._stats)
+        if self._stats is None and create:
+            # 列默认值要到 INSERT 时才生效，计数字段这里先填好，调用方可以直接 += 1
+            self._stats = UserStats(
+                user_id=self.user_id, daily_target=DEFAULT_TARGET, current_level=DEFAULT_LEVEL,
+                streak_days=0, daily_progress=0, total_learned_count=0,
+                usage_reading=0, usage_writing=0, last_ai_date=date.today(), is_pro=False
+            )
+            self.db.add(self._stats)
+        return self._stats
+
+    def _remember(self, stats):
+        self._profile = _profile_of(stats)
+        if len(_profiles) >= PROFILE_CACHE_SIZE:
+            _profiles.clear()
+        _profiles[self.user_id] = (time.monotonic() + PROFILE_TTL, self._profile)
+
+    @property
+    def profile(self):
+        if self._profile is None:
+            cached = _profiles.get(self.user_id)
+            if cached and cached[0] > time.monotonic():
+                self._profile = cached[1]
+            else:
+                self.stats()
+        return self._profile
+
+    @property
+    def level(self):
+        return self.profile["level"]
+
+    @property
+    def daily_target(self):
+        return self.profile["daily_target"]
+
+    @property
+    def deck_seed(self):
+        seed = self.profile["deck_seed"]
+        return seed if seed is not None else deck_seed_for(self.user_id)
+
+    @property
+    def is_pro(self):
+        pro_until = self.profile["pro_until"]
+        return bool(pro_until and pro_until > datetime.utcnow())
+
+    def invalidate(self):
+        """改了等级 / 目标 / 会员后调用"""
+        self._profile = None
+        invalidate_user(self.user_id)
@@ -0,0 +1,52 @@
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .database import dialect_insert
+from .model import Word, WordLevel
+
+# 等级归属单独存一张表 (level, word_id)：
+# ECDICT 的 tag 是空格分隔的 "zk gk cet4"，LIKE '%zk%' 用不上索引还会误匹配子串，
+# 按等级筛词一律走 word_levels 的主键 (level 打头)
+
+BATCH_SIZE = 5000
+
+
+def levels_from_tag(tag: str):
+    return set((tag or "").split())
+
+
+def in_level(level: str):
+    """Word 属于 level 等级的过滤条件，用法: db.query(Word).filter(in_level("cet4"))"""
+    return Word.id.in_(select(WordLevel.word_id).where(WordLevel.level == level))
+
+
+def write_word_levels(db: Session, words):
+    """
+    words: [(word_id, tag), ...]，拆出等级写进 word_levels (已有的跳过)，不提交。
+    返回写入的行数。
+    """
+    rows = [
+        {"level": level, "word_id": word_id}
+        for word_id, tag in words
+        for level in levels_from_tag(tag)
+    ]
+    if not rows:
+        return 0
+    stmt = dialect_insert(db, WordLevel).on_conflict_do_nothing(index_elements=["level", "word_id"])
+    for i in range(0, len(rows), BATCH_SIZE):
+        db.execute(stmt, rows[i:i + BATCH_SIZE])
+    return len(rows)
+
+
+def backfill_word_levels(db: Session, batch_size: int = BATCH_SIZE):
+    """按 id 顺序扫一遍 words，把所有词的等级补进 word_levels (可重复执行)。返回处理的词数"""
+    last_id, total = 0, 0
+    while True:
+        words = db.query(Word.id, Word.tag).filter(Word.id > last_id).order_by(Word.id).limit(batch_size).all()
+        if not words:
+            break
+        write_word_levels(db, words)
+        db.commit()
+        last_id = words[-1][0]
+        total += len(words)
+    return total
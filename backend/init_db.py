@@ -1,7 +1,60 @@
-from app.database import engine, Base
-from app.model import Word
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
+from app.database import engine, Base, SessionLocal
+from app.mistakes import backfill_question_hashes
+from app.quota import merge_duplicate_user_stats
+from app.study_submit import merge_duplicate_progress
+from app.word_levels import backfill_word_levels
+from app.counters import reconcile_learned_counts
+from app.model import Word, WordLevel
 
 # 这行代码会在数据库里创建所有定义的表
 print("Creating tables...")
 Base.metadata.create_all(bind=engine)
+
+# create_all 不会改动已经存在的表，后来加的列在这里补上 (只加可为空 / 有默认值的列)
+inspector = inspect(engine)
+with engine.begin() as conn:
+    for table in Base.metadata.sorted_tables:
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+                print(f"  + {table.name}.{column.name}")
+
+# 老错题补上 question_hash 并去掉重复的，否则下面建不了唯一索引
+with SessionLocal() as db:
+    hashed, removed = backfill_question_hashes(db)
+    if hashed or removed:
+        print(f"  ~ quiz_mistakes.question_hash: {hashed} filled, {removed} duplicates removed")
+
+# 同一个词的重复进度合并成一条 (留最近一次复习的)，否则建不了 (user_id, word_id) 唯一索引
+with SessionLocal() as db:
+    removed = merge_duplicate_progress(db)
+    if removed:
+        print(f"  ~ user_word_progress: {removed} duplicates merged")
+
+# 同一个用户的多行 UserStats 合并成一行，否则建不了 user_id 唯一索引 (扣额度的 ON CONFLICT 靠它)
+with SessionLocal() as db:
+    removed = merge_duplicate_user_stats(db)
+    if removed:
+        print(f"  ~ user_stats: {removed} duplicate rows merged")
+
+# 等级归属表是后来加的：词库有词但表是空的，就从 Word.tag 回填一遍
+with SessionLocal() as db:
+    if db.query(WordLevel.word_id).first() is None and db.query(Word.id).first() is not None:
+        print(f"  ~ word_levels: backfilled from {backfill_word_levels(db)} words")
+
+# 仪表盘的已学计数 (总数 + 每个等级) 是增量维护的，老用户从没写过：按进度表回填一遍。
+# 要在 word_levels 回填之后，每个等级的数才算得出来
+with SessionLocal() as db:
+    fixed = reconcile_learned_counts(db)
+    if fixed:
+        print(f"  ~ learned counters: {fixed} users reconciled")
+
+# 后来加的索引也在这里补上
+for table in Base.metadata.sorted_tables:
+    for index in table.indexes:
+        index.create(bind=engine, checkfirst=True)
 print("Tables created successfully!")
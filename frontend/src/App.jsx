@@ -14,10 +14,15 @@ import TermsPage from './pages/legal/TermsPage';
 import PrivacyPage from './pages/legal/PrivacyPage';
 
 function AppContent() {
-  const { queue, fetchQueue, isLoading, isFinished } = useStudyStore();
+  const { queue, fetchQueue, flushResults, isLoading, isFinished } = useStudyStore();
   
   // 🟢 修复1: 默认视图改为 'dashboard'
   const [view, setView] = useState('dashboard'); 
+
+  // 离开背单词页面 (回主页 / 去阅读) 时把攒着还没提交的结果交掉
+  useEffect(() => {
+    if (view !== 'home') flushResults();
+  }, [view]);
   const [currentArticleId, setCurrentArticleId] = useState(null);
 
   // 注意：我们需要获取 Clerk 的 userId 并存起来
@@ -1,13 +1,18 @@
 import axios from 'axios';
 
 // 修改这里：优先读取环境变量，读不到才用本地地址
-const baseURL = import.meta.env.VITE_API_BASE_URL || 'http://127.0.0.1:8000/api';
+export const baseURL = import.meta.env.VITE_API_BASE_URL || 'http://127.0.0.1:8000/api';
 
 const client = axios.create({
   baseURL: baseURL,
   timeout: 60000, // 稍微改大点，防止云端唤醒慢
 });
 
+// 读己之写：刚提交过数据的几秒内，读请求让后端走主库，别读到还没同步的副本
+const READ_PRIMARY_MS = 5000;
+let lastWriteAt = 0;
+export const markWrite = () => { lastWriteAt = Date.now(); };
+
 // 请求拦截器：自动加上 User ID
 client.interceptors.request.use((config) => {
   const userId = localStorage.getItem("clerk_user_id");
@@ -15,12 +20,18 @@ client.interceptors.request.use((config) => {
     // 把 User ID 放在 Header 里传给后端
     config.headers['x-user-id'] = userId;
   }
+  if ((config.method || 'get') === 'get' && Date.now() - lastWriteAt < READ_PRIMARY_MS) {
+    config.headers['x-read-primary'] = '1';
+  }
   return config;
 });
 
 // 响应拦截器：处理一下数据解包，方便后续使用
 client.interceptors.response.use(
-  (response) => response.data,
+  (response) => {
+    if (response.config.method !== 'get') markWrite();
+    return response.data;
+  },
   (error) => {
     // 拦截 403 错误
     if (error.response && error.response.status === 403) {
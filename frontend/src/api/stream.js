@@ -0,0 +1,41 @@
+import { markWrite } from './client';
+
+// 读取后端的 SSE 流 (POST)，每收到一个事件回调 onEvent(event, data)
+const baseURL = import.meta.env.VITE_API_BASE_URL || 'http://127.0.0.1:8000/api';
+
+export async function postStream(path, body, onEvent) {
+  const headers = { 'Content-Type': 'application/json' };
+  const userId = localStorage.getItem("clerk_user_id");
+  if (userId) headers['x-user-id'] = userId;
+
+  const res = await fetch(baseURL + path, { method: 'POST', headers, body: JSON.stringify(body || {}) });
+  if (!res.ok) {
+    const err = await res.json().catch(() => ({}));
+    if (res.status === 403 && err.detail) alert("⚠️ " + err.detail);
+    throw new Error(err.detail || `HTTP ${res.status}`);
+  }
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    // 事件之间用空行分隔
+    let sep;
+    while ((sep = buffer.indexOf("\n\n")) >= 0) {
+      const block = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+      let event = "message", data = "";
+      for (const line of block.split("\n")) {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) data += line.slice(6);
+      }
+      const payload = data ? JSON.parse(data) : null;
+      if (event === "error") throw new Error(payload?.detail || "stream error");
+      if (event === "done") markWrite(); // 结果已经存库，接下来刷新列表要读主库
+      onEvent(event, payload);
+    }
+  }
+}
@@ -2,6 +2,10 @@ import React, { useEffect, useState } from 'react';
 import client from '../api/client';
 import QuizModal from '../components/QuizModal'; // <--- 1. 引入组件
 
+// 朗读音频合成的轮询：每秒一次，最多等两分钟
+const AUDIO_POLL_INTERVAL_MS = 1000;
+const AUDIO_POLL_MAX_ATTEMPTS = 120;
+
 const ArticleReader = ({ articleId, onBack }) => {
   // 1. 所有 Hooks 必须放在最上面
   const [article, setArticle] = useState(null);
@@ -13,10 +17,12 @@ const ArticleReader = ({ articleId, onBack }) => {
   const [isPlaying, setIsPlaying] = useState(false);
   const [audioPlayer, setAudioPlayer] = useState(null);
   const [loadingAudio, setLoadingAudio] = useState(false);
+  const [glossary, setGlossary] = useState(null); // 整篇文章的词表，点词直接查这里
 
-  // Hook 1: 加载文章
+  // Hook 1: 加载文章 + 词表
   useEffect(() => {
     client.get(`/reading/${articleId}`).then(setArticle);
+    client.get(`/reading/${articleId}/glossary`).then(setGlossary).catch(err => console.error(err));
     // 记得清理朗读
     return () => {
       window.speechSynthesis.cancel();
@@ -26,6 +32,12 @@ const ArticleReader = ({ articleId, onBack }) => {
   // Hook 2: 查单词 (即使 article 为 null，这个 hook 也必须存在，只是不执行内部逻辑)
   useEffect(() => {
     if (selectedWord) {
+      // 词表里有就直接用，不用再发请求
+      const idx = glossary?.tokens[selectedWord.toLowerCase()];
+      if (idx !== undefined) {
+        setWordDetail({ found: true, ...glossary.entries[idx] });
+        return;
+      }
       setWordDetail(null);
       client.get(`/word/lookup?spell=${selectedWord}`)
         .then(data => {
@@ -33,7 +45,7 @@ const ArticleReader = ({ articleId, onBack }) => {
         })
         .catch(err => console.error(err));
     }
-  }, [selectedWord]);
+  }, [selectedWord, glossary]);
 
   // 当文章加载时，或者用户点击播放时，去获取音频链接
   const fetchAudio = async () => {
@@ -41,7 +53,16 @@ const ArticleReader = ({ articleId, onBack }) => {
     
     setLoadingAudio(true);
     try {
-      const res = await client.get(`/reading/${articleId}/audio`);
+      // 第一次请求会提交合成任务 (202)，之后每秒轮询一次直到合成完。
+      // 轮询的是文章地址而不是 job_id：文件已经缓存时后端返回的任务不会登记，按 id 查会 404。
+      // 合成失败 / 接口报错 (非 2xx 会直接抛出) / 超过次数上限都停下来
+      let res = await client.get(`/reading/${articleId}/audio`);
+      for (let attempt = 1; res.status !== 'done'; attempt++) {
+        if (res.status === 'failed') throw new Error(res.error || 'TTS generation failed');
+        if (attempt > AUDIO_POLL_MAX_ATTEMPTS) throw new Error('TTS generation timed out');
+        await new Promise(resolve => setTimeout(resolve, AUDIO_POLL_INTERVAL_MS));
+        res = await client.get(`/reading/${articleId}/audio`);
+      }
 
       // 我们直接用当前的 origin (域名) 拼接，或者直接用相对路径
       const relativeUrl = res.audio_url; 
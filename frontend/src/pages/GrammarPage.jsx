@@ -6,10 +6,25 @@ const GrammarPage = ({ onBack }) => {
   const [loading, setLoading] = useState(false);
   const [result, setResult] = useState(null);
   const [history, setHistory] = useState([]); // 1. 新增历史记录状态
+  const [nextCursor, setNextCursor] = useState(null); // 历史分页：下一页的 before_id
+
+  const loadHistory = () => {
+    return client.get('/grammar/history').then(page => {
+      setHistory(page.items);
+      setNextCursor(page.next_cursor);
+    });
+  };
+
+  const loadMoreHistory = () => {
+    client.get('/grammar/history', { params: { before_id: nextCursor } }).then(page => {
+      setHistory(prev => [...prev, ...page.items]);
+      setNextCursor(page.next_cursor);
+    });
+  };
 
   // 2. 初始化加载历史
   useEffect(() => {
-    client.get('/grammar/history').then(setHistory).catch(console.error);
+    loadHistory().catch(console.error);
   }, []);
 
   // 3. 核心分析函数 (修复了报错的部分)
@@ -23,7 +38,7 @@ const GrammarPage = ({ onBack }) => {
       .then(data => {
         setResult(data);
         // 分析成功后，立刻刷新底部的历史列表
-        client.get('/grammar/history').then(setHistory);
+        loadHistory();
         setLoading(false);
       })
       .catch(err => {
@@ -47,10 +62,13 @@ const GrammarPage = ({ onBack }) => {
 
   // 4. 点击历史记录回填
   const loadHistoryItem = (item) => {
-      setSentence(item.sentence);
-      setResult(item.analysis_result);
-      // 滚回到顶部看结果
-      window.scrollTo({ top: 0, behavior: 'smooth' });
+      // 列表里只有原句和译文，点开再取完整分析
+      client.get(`/grammar/${item.id}`).then(detail => {
+          setSentence(detail.sentence);
+          setResult(detail.analysis_result);
+          // 滚回到顶部看结果
+          window.scrollTo({ top: 0, behavior: 'smooth' });
+      });
   }
 
   // 2. 新增：滚动到底部
@@ -178,10 +196,15 @@ const GrammarPage = ({ onBack }) => {
                             className="bg-white p-4 rounded-xl shadow-sm border border-indigo-50 cursor-pointer hover:border-indigo-300 transition active:scale-[0.99]"
                         >
                             <p className="text-gray-800 font-medium line-clamp-1">{item.sentence}</p>
-                            <p className="text-xs text-gray-400 mt-1">{item.analysis_result.translation}</p>
+                            <p className="text-xs text-gray-400 mt-1">{item.translation}</p>
                         </div>
                     ))}
                 </div>
+                {nextCursor && (
+                    <button onClick={loadMoreHistory} className="w-full mt-4 py-3 text-sm text-gray-400 hover:text-indigo-600 transition">
+                        加载更多
+                    </button>
+                )}
                 <div className="h-20"></div>
             </div>
         )}
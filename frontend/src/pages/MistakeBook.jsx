@@ -4,14 +4,23 @@ import client from '../api/client';
 const MistakeBook = ({ onBack }) => {
   const [mistakes, setMistakes] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState(null); // 分页：下一页的 before_id
 
   const fetchMistakes = () => {
-    client.get('/mistakes/list').then(data => {
-      setMistakes(data);
+    client.get('/mistakes/list').then(page => {
+      setMistakes(page.items);
+      setNextCursor(page.next_cursor);
       setLoading(false);
     });
   };
 
+  const fetchMore = () => {
+    client.get('/mistakes/list', { params: { before_id: nextCursor } }).then(page => {
+      setMistakes(prev => [...prev, ...page.items]);
+      setNextCursor(page.next_cursor);
+    });
+  };
+
   useEffect(() => {
     fetchMistakes();
   }, []);
@@ -80,6 +89,11 @@ const MistakeBook = ({ onBack }) => {
             </div>
           ))
         )}
+        {!loading && nextCursor && (
+          <button onClick={fetchMore} className="w-full py-3 text-sm text-gray-400 hover:text-red-500 transition">
+            加载更多
+          </button>
+        )}
       </div>
     </div>
   );
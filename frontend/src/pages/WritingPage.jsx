@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import client from '../api/client';
+import { postStream } from '../api/stream';
 
 const WritingPage = ({ onBack }) => {
   const [topic, setTopic] = useState("");
@@ -7,6 +8,7 @@ const WritingPage = ({ onBack }) => {
   const [loading, setLoading] = useState(false);
   const [result, setResult] = useState(null); // 存储批改结果
   const [history, setHistory] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null); // 历史分页：下一页的 before_id
 
   // 初始化：获取一个随机题目，也获取历史
   useEffect(() => {
@@ -15,22 +17,47 @@ const WritingPage = ({ onBack }) => {
   }, []);
 
   const loadHistory = () => {
-    client.get('/writing/history').then(setHistory);
+    client.get('/writing/history').then(page => {
+      setHistory(page.items);
+      setNextCursor(page.next_cursor);
+    });
+  };
+
+  const loadMoreHistory = () => {
+    client.get('/writing/history', { params: { before_id: nextCursor } }).then(page => {
+      setHistory(prev => [...prev, ...page.items]);
+      setNextCursor(page.next_cursor);
+    });
   };
 
   const handleSubmit = () => {
     if (!content.trim()) return;
     setLoading(true);
     
-    client.post('/writing/evaluate', { topic, content })
-      .then(data => {
-        setResult(data);
-	loadHistory();
+    // 流式批改：分数、点评、每条纠错陆续出现，不用等整篇返回
+    let feedback = { corrections: [] };
+    postStream('/writing/evaluate/stream', { topic, content }, (event, data) => {
+      if (event === 'field') {
+        feedback = { ...feedback, [data.key]: data.value };
+      } else if (event === 'item' && data.key === 'corrections') {
+        feedback = { ...feedback, corrections: [...feedback.corrections, data.value] };
+      } else if (event === 'delta') {
+        feedback = { ...feedback, [data.key]: (feedback[data.key] || "") + data.text };
+      } else if (event === 'done') {
+        feedback = data.ai_feedback;
+      } else {
+        return;
+      }
+      setResult({ ai_feedback: feedback });
+    })
+      .then(() => {
+        loadHistory();
         setLoading(false);
       })
       .catch(err => {
         console.error(err);
         alert("AI 批改失败，请重试");
+        setResult(null);
         setLoading(false);
       });
   };
@@ -44,12 +71,15 @@ const WritingPage = ({ onBack }) => {
 
   // 新增：加载历史记录到主区域
   const handleLoadHistoryItem = (item) => {
-    setTopic(item.topic);
-    setContent(item.original_content); // 或者是 item.content，取决于你 schema 怎么定义的
-    setResult({ ai_feedback: item.ai_feedback }); // 恢复结果展示
-    
-    // 滚回到顶部看结果
-    window.scrollTo({ top: 0, behavior: 'smooth' });
+    // 列表里只有摘要，点开再取完整的原文和批改
+    client.get(`/writing/${item.id}`).then(detail => {
+      setTopic(detail.topic);
+      setContent(detail.original_content);
+      setResult({ ai_feedback: detail.ai_feedback }); // 恢复结果展示
+
+      // 滚回到顶部看结果
+      window.scrollTo({ top: 0, behavior: 'smooth' });
+    });
   };
 
   // 3. 新增：滚动到底部历史区
@@ -135,11 +165,11 @@ const WritingPage = ({ onBack }) => {
                     <h3 className="font-bold text-gray-800 mb-4 flex items-center gap-2">
                         <span>🛠️</span> 纠错与建议
                     </h3>
-                    {result.ai_feedback.corrections.length === 0 ? (
+                    {(result.ai_feedback.corrections || []).length === 0 ? (
                         <p className="text-green-500">完美！没有发现明显的语法错误。</p>
                     ) : (
                         <div className="space-y-4">
-                            {result.ai_feedback.corrections.map((item, idx) => (
+                            {(result.ai_feedback.corrections || []).map((item, idx) => (
                                 <div key={idx} className="bg-red-50 p-4 rounded-xl border border-red-100">
                                     <div className="flex items-center gap-2 mb-1 text-red-500 line-through text-sm">
                                         ❌ {item.original}
@@ -187,15 +217,21 @@ const WritingPage = ({ onBack }) => {
                         >
                             <div className="flex justify-between items-center mb-2">
                                 <h4 className="font-bold text-gray-800 line-clamp-1">{item.topic}</h4>
-                                <span className="bg-blue-100 text-blue-700 px-2 py-1 rounded text-xs font-bold">{item.ai_feedback.score}分</span>
+                                <span className="bg-blue-100 text-blue-700 px-2 py-1 rounded text-xs font-bold">{item.score}分</span>
                             </div>
-                            <p className="text-gray-500 text-sm line-clamp-2">{item.original_content}</p>
+                            <p className="text-gray-500 text-sm line-clamp-2">{item.excerpt}</p>
                             <div className="text-xs text-gray-300 mt-2">
                                 {new Date(item.created_at).toLocaleDateString()}
                             </div>
                         </div>
                     ))}
                 </div>
+
+                {nextCursor && (
+                    <button onClick={loadMoreHistory} className="w-full mt-4 py-3 text-sm text-gray-400 hover:text-blue-600 transition">
+                        加载更多
+                    </button>
+                )}
                 
                 {/* 底部留白，方便滚动 */}
                 <div className="h-20"></div> 
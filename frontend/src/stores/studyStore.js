@@ -1,15 +1,21 @@
 import { create } from 'zustand';
-import client from '../api/client';
+import client, { baseURL } from '../api/client';
+
+// 攒够这么多张卡片就批量提交一次
+const BATCH_SIZE = 5;
 
 const useStudyStore = create((set, get) => ({
   queue: [],        // 待背单词队列
   currentIndex: 0,  // 当前背到第几个
   isLoading: false,
   isFinished: false, // 是否背完
+  pending: [],      // 还没提交的学习结果
 
   // 初始化：从后端拉取单词
   fetchQueue: async () => {
     set({ isLoading: true, isFinished: false });
+    // 上一组没交完的结果先交掉，新队列才算得对
+    await get().flushResults();
     try {
       const data = await client.get('/study/queue');
       set({ queue: data, currentIndex: 0, isLoading: false });
@@ -21,27 +27,50 @@ const useStudyStore = create((set, get) => ({
 
   // 提交结果并切换下一个
   submitResult: async (quality) => {
-    const { queue, currentIndex } = get();
+    const { queue, currentIndex, pending } = get();
     const currentWord = queue[currentIndex];
+    const isLast = currentIndex >= queue.length - 1;
 
     // 1. 乐观更新：先切到下一张卡片，让用户感觉不到延迟
-    if (currentIndex < queue.length - 1) {
-      set({ currentIndex: currentIndex + 1 });
-    } else {
-      set({ isFinished: true });
+    //    结果先攒起来，带上复习时间，后端按顺序回放
+    const results = [...pending, {
+      word_id: currentWord.id,
+      quality: quality, // 0=忘记, 3=模糊, 5=认识
+      reviewed_at: new Date().toISOString()
+    }];
+    set(isLast ? { isFinished: true, pending: results } : { currentIndex: currentIndex + 1, pending: results });
+
+    // 2. 攒够一批或者背完了，后台一次提交
+    if (isLast || results.length >= BATCH_SIZE) {
+      await get().flushResults();
     }
+  },
 
-    // 2. 后台默默提交给 Python
+  // 把攒着的结果一次性提交给 Python
+  flushResults: async () => {
+    const { pending } = get();
+    if (pending.length === 0) return;
+    set({ pending: [] });
     try {
-      await client.post('/study/submit', {
-        word_id: currentWord.id,
-        quality: quality // 0=忘记, 3=模糊, 5=认识
-      });
+      await client.post('/study/submit_batch', { results: pending });
     } catch (e) {
       console.error("提交失败", e);
+      // 放回去，下次一起提交
+      set({ pending: [...pending, ...get().pending] });
     }
   },
 
+  // 页面关闭 / 切到后台：普通请求会被浏览器掐掉，用 sendBeacon 把没交的结果发出去
+  // sendBeacon 不能带自定义请求头，用户 ID 放在 ?uid= 里；text/plain 不会触发 CORS 预检
+  beaconResults: () => {
+    const { pending } = get();
+    if (pending.length === 0 || !navigator.sendBeacon) return;
+    const userId = localStorage.getItem("clerk_user_id") || '';
+    const url = `${baseURL}/study/submit_batch?uid=${encodeURIComponent(userId)}`;
+    const body = new Blob([JSON.stringify({ results: pending })], { type: 'text/plain' });
+    if (navigator.sendBeacon(url, body)) set({ pending: [] });
+  },
+
   // 播放发音 (调用有道 API)
   playAudio: (word) => {
     const audioUrl = `https://dict.youdao.com/dictvoice?audio=${word}&type=1`; // type=1 美音
@@ -50,4 +79,10 @@ const useStudyStore = create((set, get) => ({
   }
 }));
 
+window.addEventListener('pagehide', () => useStudyStore.getState().beaconResults());
+document.addEventListener('visibilitychange', () => {
+  // 手机上切走 App 后常常不会再触发 pagehide
+  if (document.visibilityState === 'hidden') useStudyStore.getState().beaconResults();
+});
+
 export default useStudyStore;
@@ -0,0 +1,73 @@
+import sys
+import os
+import time
+import argparse
+import statistics
+
+# 这一步是为了能导入 backend 目录下的模块
+sys.path.append(os.getcwd())
+
+from sqlalchemy import func, text
+
+from backend.app.database import SessionLocal
+from backend.app.levels import LEVEL_CONFIG
+from backend.app.model import Word
+from backend.app.word_levels import in_level
+
+# 对比按等级筛词的两种写法 (先导入完整的 ECDICT 再跑，结果才有参考价值):
+#   old: Word.tag LIKE '%level%'          全表扫描，还会误匹配子串
+#   new: word_levels 主键 (level, word_id) 索引范围扫描
+# 打印执行计划 (Postgres 用 EXPLAIN ANALYZE，SQLite 用 EXPLAIN QUERY PLAN)、耗时中位数和命中行数
+# 用法: python scripts/bench_level_filter.py --levels cet4 ielts --repeat 20
+
+
+def compile_sql(db, query):
+    return str(query.statement.compile(dialect=db.get_bind().dialect, compile_kwargs={"literal_binds": True}))
+
+
+def explain(db, sql):
+    if db.get_bind().dialect.name == "postgresql":
+        rows = db.execute(text("EXPLAIN (ANALYZE, BUFFERS) " + sql)).all()
+        return "\n".join(r[0] for r in rows)
+    rows = db.execute(text("EXPLAIN QUERY PLAN " + sql)).all()
+    return "\n".join(str(r[-1]) for r in rows)
+
+
+def timed(db, sql, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = db.execute(text(sql)).scalar()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return result, statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare LIKE tag filtering with the word_levels index")
+    parser.add_argument("--levels", nargs="*", default=list(LEVEL_CONFIG))
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--plans", action="store_true", help="print full query plans")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        print(f"words: {db.query(func.count(Word.id)).scalar()}")
+        for level in args.levels:
+            queries = {
+                "old": db.query(func.count(Word.id)).filter(Word.tag.contains(level)),
+                "new": db.query(func.count(Word.id)).filter(in_level(level)),
+            }
+            line = []
+            for name, query in queries.items():
+                sql = compile_sql(db, query)
+                if args.plans:
+                    print(f"\n--- {level} / {name} ---\n{sql}\n{explain(db, sql)}")
+                count, ms = timed(db, sql, args.repeat)
+                line.append(f"{name}: {count:>6} rows {ms:8.2f} ms")
+            print(f"{level:>6}  " + "  |  ".join(line))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+import sys
+import os
+import time
+
+# 这一步是为了能导入 backend 目录下的模块
+sys.path.append(os.getcwd())
+
+from backend.app.database import SessionLocal
+from backend.app.lexicon import build_lexicon, LEXICON_PATH
+
+# 在仓库根目录下运行：python scripts/build_lexicon.py [输出路径]
+# 默认生成到 backend/data/lexicon.bin；也可以用 LEXICON_PATH 指定
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else LEXICON_PATH
+    db = SessionLocal()
+    try:
+        t0 = time.time()
+        result = build_lexicon(db, path)
+        print(f"✅ Built {path}: {result['entries']} entries, {result['keys']} keys in {time.time() - t0:.1f}s")
+    finally:
+        db.close()
@@ -1,69 +1,73 @@
 import sys
 import os
 import json
-import time
+import asyncio
+import argparse
 from dotenv import load_dotenv
-from openai import OpenAI # DeepSeek 兼容 OpenAI SDK
 
 sys.path.append(os.getcwd())
-from sqlalchemy.orm import Session
 from backend.app.database import SessionLocal
-from backend.app.model import Word
+from backend.app.levels import LEVEL_CONFIG
+from backend.app.enrichment import enrich_words, BATCH_WORDS, CONCURRENCY, RPM
+from backend.app.study_queue import extend_level_orders
 
 # 加载 .env
 load_dotenv()
 
-# 读取 Key
-API_KEY = os.getenv("DEEPSEEK_API_KEY")
-BASE_URL = os.getenv("DEEPSEEK_BASE_URL")
-
-if not API_KEY:
+if not os.getenv("DEEPSEEK_API_KEY"):
     raise ValueError("❌ 错误：未找到 DEEPSEEK_API_KEY，请检查 .env 文件")
 
-client = OpenAI(api_key=API_KEY, base_url=BASE_URL)
+# 断点文件：每完成一批就记下处理到的单词 id 和没补上的词，中断后重跑会从这里继续，没补上的先重试
+CHECKPOINT_PATH = 'scripts/enrich.checkpoint.json'
 
-def generate_sentence(word_spell):
-    prompt = f"""
-    你是初中英语老师。请为单词 "{word_spell}" 生成：
-    1. 一个非常简单、易懂的英文例句（适合初二水平）。
-    2. 该例句的中文翻译。
-    请严格按照JSON格式返回，不要包含markdown标记：
-    {{"en": "英文句子", "cn": "中文翻译"}}
-    """
-    
-    try:
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[{"role": "user", "content": prompt}],
-            response_format={"type": "json_object"},
-            temperature=1.0
-        )
-        return json.loads(response.choices[0].message.content)
-    except Exception as e:
-        print(f"AI Error for {word_spell}: {e}")
-        return None
+def load_checkpoint(level):
+    """返回 (断点 id, 要重试的词 id)"""
+    if not os.path.exists(CHECKPOINT_PATH):
+        return 0, []
+    with open(CHECKPOINT_PATH) as f:
+        state = json.load(f)
+    # 换了等级就从头开始
+    if state.get("level") != level:
+        return 0, []
+    return state.get("last_id", 0), state.get("failed_ids", [])
+
+async def process_words(level=None, limit=None, restart=False, batch=BATCH_WORDS, concurrency=CONCURRENCY, rpm=RPM):
+    after_id, retry_ids = (0, []) if restart else load_checkpoint(level)
+    print(f"Generating sentences with DeepSeek (level={level or 'all'}, after id {after_id}, "
+          f"{len(retry_ids)} to retry, {batch} words/request, {concurrency} concurrent, {rpm} rpm)...")
+
+    def checkpoint(stats):
+        with open(CHECKPOINT_PATH, 'w') as f:
+            json.dump({"level": level, "last_id": stats["last_id"], "failed_ids": stats["failed_ids"]}, f)
+        print(f" -> {stats['words']} words saved, {stats['failed']} failed | "
+              f"{stats['words_per_min']:.0f} words/min | ${stats['cost_per_word']:.6f}/word | last id {stats['last_id']}")
 
-def process_words(limit=10):
     db = SessionLocal()
-    # 选出还没有例句的单词
-    words = db.query(Word).filter(Word.ai_sentence == None).limit(limit).all()
-    
-    print(f"Processing {len(words)} words using DeepSeek...")
-    
-    for w in words:
-        print(f"Generating for: {w.spell}...")
-        result = generate_sentence(w.spell)
-        
-        if result:
-            w.ai_sentence = result
-            db.commit()
-            print(f" -> Saved: {result['en']}")
-        
-        # 避免触发 API 速率限制
-        time.sleep(1) 
-        
-    db.close()
+    try:
+        stats = await enrich_words(db, level_tag=level, limit=limit, after_id=after_id, retry_ids=retry_ids,
+                                   batch_words=batch, concurrency=concurrency, rpm=rpm, on_batch=checkpoint)
+        print(f"✅ Finished! {stats['words']} words in {stats['elapsed']:.1f}s "
+              f"({stats['words_per_min']:.0f} words/min), {stats['failed']} failed, "
+              f"cost ${stats['cost_usd']:.4f} (${stats['cost_per_word']:.6f}/word, "
+              f"{stats['prompt_tokens']} in / {stats['completion_tokens']} out tokens)")
+        # 还有没补上的词就留着断点，下次先重试它们
+        if stats["failed_ids"]:
+            print(f"{len(stats['failed_ids'])} words still without a sentence, run again to retry them")
+        elif os.path.exists(CHECKPOINT_PATH):
+            os.remove(CHECKPOINT_PATH)
+
+        # 有了例句的词才会出现在背词队列里，追加到各等级的新词顺序
+        print(f"New words queued: {extend_level_orders(db)}")
+    finally:
+        db.close()
 
 if __name__ == "__main__":
-    # 先试跑 5 个词，别一次跑太多费钱
-    process_words(limit=100)
+    parser = argparse.ArgumentParser(description="Fill Word.ai_sentence in bulk with DeepSeek")
+    parser.add_argument("--level", choices=list(LEVEL_CONFIG), help="only words with this tag (also sets the prompt level)")
+    parser.add_argument("--limit", type=int, help="process at most this many words (先试跑一小批，别一次跑太多费钱)")
+    parser.add_argument("--batch", type=int, default=BATCH_WORDS, help="words per request")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="requests in flight")
+    parser.add_argument("--rpm", type=int, default=RPM, help="max requests per minute")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start from the first word")
+    args = parser.parse_args()
+    asyncio.run(process_words(args.level, args.limit, args.restart, args.batch, args.concurrency, args.rpm))
@@ -1,83 +1,53 @@
 import sys
 import os
-import json
-import random
-from openai import OpenAI
+import asyncio
+import argparse
 from dotenv import load_dotenv
 sys.path.append(os.getcwd())
-from sqlalchemy.orm import Session
 from backend.app.database import SessionLocal
-from backend.app.model import Word, Article
+from backend.app.levels import LEVEL_CONFIG
+from backend.app.article_gen import generate_article
+from backend.app.article_pool import refill_pool, POOL_WATERMARK
 
 # 加载 .env
 load_dotenv()
 
-# 读取 Key
-API_KEY = os.getenv("DEEPSEEK_API_KEY")
-BASE_URL = os.getenv("DEEPSEEK_BASE_URL")
-
-if not API_KEY:
+if not os.getenv("DEEPSEEK_API_KEY"):
     raise ValueError("❌ 错误：未找到 DEEPSEEK_API_KEY，请检查 .env 文件")
 
-# 配置 DeepSeek
-client = OpenAI(api_key=API_KEY, base_url=BASE_URL)
 
-def generate_daily_article():
+async def generate_daily_article(level_tag="zk", pooled=True):
+    """生成一篇文章；pooled=True 时放进文章池，等学生来领"""
     db = SessionLocal()
-    
-    # 1. 随机选 5-8 个中考(zk)单词作为“今日核心词汇”
-    # (实际项目中，这里应该选用户"刚背过"但"掌握度不高"的词)
-    words = db.query(Word).filter(Word.tag.contains("zk")).limit(100).all()
-    target_words = random.sample(words, 8)
-    
-    word_list_str = ", ".join([w.spell for w in target_words])
-    word_ids = [w.id for w in target_words]
-    
-    print(f"Target Words: {word_list_str}")
-
-    # 2. 让 AI 写故事
-    prompt = f"""
-    请写一篇约150词的英语短文（适合初二学生阅读）。
-    要求必须自然地包含以下单词：{word_list_str}。
-    
-    请以JSON格式返回：
-    {{
-        "title": "文章标题",
-        "content": "英文正文内容...",
-        "translation": "中文全篇翻译..."
-    }}
-    """
-
     try:
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[{"role": "user", "content": prompt}],
-            response_format={"type": "json_object"}
-        )
-        data = json.loads(response.choices[0].message.content)
-        
-        # 3. 存入数据库
-        article = Article(
-            title=data['title'],
-            content=data['content'],
-            translation=data['translation'],
-            difficulty="Level 2",
-            vocab_list=word_ids
-        )
-        db.add(article)
-        db.commit()
-        print(f"✅ Generated Article: {data['title']}")
-        
+        article = await generate_article(db, level_tag, pooled=pooled)
+        print(f"✅ Generated Article: {article.title}")
     except Exception as e:
         print(f"Error: {e}")
     finally:
         db.close()
 
+
+async def main():
+    parser = argparse.ArgumentParser(description="生成阅读文章")
+    parser.add_argument("--level", action="append", choices=list(LEVEL_CONFIG),
+                        help="只处理这些等级 (可重复)，默认全部")
+    parser.add_argument("--count", type=int, default=0,
+                        help="每个等级额外生成几篇；不填则把文章池补到水位线")
+    parser.add_argument("--public", action="store_true",
+                        help="配合 --count：直接出现在文章列表里，不进文章池")
+    args = parser.parse_args()
+
+    if args.count:
+        for level in args.level or list(LEVEL_CONFIG):
+            for i in range(args.count):
+                print(f"--- Generating {level} Article {i+1}/{args.count} ---")
+                await generate_daily_article(level, pooled=not args.public)
+    else:
+        print(f"开始补充文章池 (每个等级 {POOL_WATERMARK} 篇)...")
+        created = await refill_pool(args.level)
+        print(f"✅ 文章池补充完成，新生成 {created} 篇")
+
+
 if __name__ == "__main__":
-    print("开始生成今日阅读材料...")
-    for i in range(5):
-        print(f"--- Generating Article {i+1}/5 ---")
-        generate_daily_article()
-        # 稍微停顿一下防止 API 报错
-        import time
-        time.sleep(2)
+    asyncio.run(main())
@@ -1,16 +1,26 @@
-import csv
 import sys
 import os
+import json
+import argparse
 
 # 这一步是为了能导入 backend 目录下的模块
 sys.path.append(os.getcwd())
 
-from sqlalchemy.orm import Session
-from backend.app.database import SessionLocal, engine
-from backend.app.model import Word
+from backend.app.database import SessionLocal
+from backend.app.importer import import_ecdict, refresh_after_import
 
-def import_data():
-    csv_path = 'scripts/ecdict.csv' # 确保文件名正确
+# 断点文件：每提交一批就记下读到的字节偏移，中断后重跑会从这里继续
+CHECKPOINT_PATH = 'scripts/ecdict.import.json'
+
+def load_offset(csv_path):
+    if not os.path.exists(CHECKPOINT_PATH):
+        return 0
+    with open(CHECKPOINT_PATH) as f:
+        state = json.load(f)
+    # 换了 CSV 文件就从头开始
+    return state.get("offset", 0) if state.get("csv") == csv_path else 0
+
+def import_data(csv_path='scripts/ecdict.csv', full=False, offset=None):
     # 定义我们支持的标签映射
     VALID_TAGS = ['zk', 'gk', 'cet4', 'cet6', 'ky', 'toefl', 'ielts', 'gre']
     
@@ -18,51 +28,34 @@ def import_data():
         print(f"Error: {csv_path} not found.")
         return
 
+    start = load_offset(csv_path) if offset is None else offset
+    print(f"Start importing from byte {start}...")
+
+    def checkpoint(stats):
+        with open(CHECKPOINT_PATH, 'w') as f:
+            json.dump({"csv": csv_path, "offset": stats["offset"]}, f)
+        print(f"Imported {stats['inserted']} words "
+              f"({stats['scanned']} rows scanned, {stats['rows_per_sec']:.0f} rows/s, offset {stats['offset']})")
+
     db = SessionLocal()
-    count = 0
-    
-    print("Start importing... This might take a while.")
-    
     try:
-        with open(csv_path, newline='', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            
-            for row in reader:
-                tags = row.get('tag', '')
-                
-                # === 核心逻辑：只导入中考(zk)和高考(gk)词汇 ===
-                # 如果你想做全量，可以去掉这个 if
-                if any(t in tags for t in VALID_TAGS):
-                    
-                    # 检查是否已存在（避免重复运行报错）
-                    existing = db.query(Word).filter(Word.spell == row['word']).first()
-                    if existing:
-                        continue
+        # 默认只导入带考试标签的词，--full 全量导入
+        stats = import_ecdict(db, csv_path, tags=None if full else VALID_TAGS,
+                              start_offset=start, on_chunk=checkpoint)
+        print(f"✅ Finished! Total imported: {stats['inserted']} words in {stats['elapsed']:.1f}s "
+              f"({stats['rows_per_sec']:.0f} rows/s).")
+        os.remove(CHECKPOINT_PATH)
 
-                    word = Word(
-                        spell=row['word'],
-                        phonetic=row['phonetic'],
-                        definition=row['definition'],
-                        translation=row['translation'],
-                        exchange=row['exchange'],
-                        tag=tags
-                    )
-                    db.add(word)
-                    count += 1
-                    
-                    # 每 1000 个提交一次，避免内存溢出
-                    if count % 1000 == 0:
-                        db.commit()
-                        print(f"Imported {count} words...")
-            
-            db.commit() # 提交剩余的数据
-            print(f"✅ Finished! Total imported: {count} words.")
-            
+        print(f"Refreshing word orders and lexicon: {refresh_after_import(db)}")
     except Exception as e:
-        print(f"❌ Error: {e}")
-        db.rollback()
+        print(f"❌ Error: {e} (rerun to resume from the last checkpoint)")
     finally:
         db.close()
 
 if __name__ == "__main__":
-    import_data()
+    parser = argparse.ArgumentParser(description="Import ECDICT csv into the words table")
+    parser.add_argument("csv_path", nargs="?", default='scripts/ecdict.csv')
+    parser.add_argument("--full", action="store_true", help="import every row, not just exam vocabulary")
+    parser.add_argument("--offset", type=int, help="resume from this byte offset (overrides the checkpoint file)")
+    args = parser.parse_args()
+    import_data(args.csv_path, args.full, args.offset)
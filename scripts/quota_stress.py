@@ -0,0 +1,79 @@
+import sys
+import os
+import uuid
+import argparse
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+# 这一步是为了能导入 backend 目录下的模块
+sys.path.append(os.getcwd())
+
+from backend.app.database import SessionLocal
+from backend.app.model import UserStats
+from backend.app.quota import consume_quota, QUOTA_LIMITS
+
+# 额度并发压测：同一个用户同时打很多请求，放行的次数必须正好等于额度，一次不多一次不少
+# 用法: python scripts/quota_stress.py --users 5 --requests 40 --workers 16
+# 会在当前 DATABASE_URL 指向的库里建几个临时用户，跑完删掉
+
+def hit(user_id, quota_type):
+    db = SessionLocal()
+    try:
+        return consume_quota(db, user_id, quota_type) is not None
+    except Exception as e:
+        print(f"❌ {user_id}: {e}")
+        return False
+    finally:
+        db.close()
+
+def run_round(pool, user_ids, quota_type, requests):
+    jobs = [(u, pool.submit(hit, u, quota_type)) for u in user_ids for _ in range(requests)]
+    admitted = {u: 0 for u in user_ids}
+    for u, job in jobs:
+        admitted[u] += job.result()
+    return admitted
+
+def main():
+    parser = argparse.ArgumentParser(description="Prove AI quota limits are exact under parallel load")
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=40, help="parallel requests per user and round")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--type", default="reading", choices=list(QUOTA_LIMITS))
+    args = parser.parse_args()
+
+    limit = QUOTA_LIMITS[args.type]
+    user_ids = [f"quota-stress-{uuid.uuid4().hex[:8]}" for _ in range(args.users)]
+    ok = True
+    try:
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            # 1. 全新用户 (第一次请求还要并发插入 UserStats)
+            admitted = run_round(pool, user_ids, args.type, args.requests)
+            print(f"Round 1 (new users): admitted {sorted(set(admitted.values()))}, expected {limit}")
+            ok &= all(n == limit for n in admitted.values())
+
+            # 2. 模拟跨天：把日期改成昨天，额度应该重新算
+            db = SessionLocal()
+            db.query(UserStats).filter(UserStats.user_id.in_(user_ids)).update(
+                {"last_ai_date": date.today() - timedelta(days=1)}, synchronize_session=False)
+            db.commit()
+            db.close()
+            admitted = run_round(pool, user_ids, args.type, args.requests)
+            print(f"Round 2 (next day):  admitted {sorted(set(admitted.values()))}, expected {limit}")
+            ok &= all(n == limit for n in admitted.values())
+
+            db = SessionLocal()
+            rows = db.query(UserStats).filter(UserStats.user_id.in_(user_ids)).count()
+            db.close()
+            print(f"UserStats rows: {rows}, expected {len(user_ids)}")
+            ok &= rows == len(user_ids)
+    finally:
+        db = SessionLocal()
+        db.query(UserStats).filter(UserStats.user_id.in_(user_ids)).delete(synchronize_session=False)
+        db.commit()
+        db.close()
+
+    print("✅ Quota limits are exact" if ok else "❌ Quota limits violated")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
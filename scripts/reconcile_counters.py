@@ -0,0 +1,23 @@
+import sys
+import os
+import time
+
+# 这一步是为了能导入 backend 目录下的模块
+sys.path.append(os.getcwd())
+
+from backend.app.database import SessionLocal
+from backend.app.counters import reconcile_learned_counts
+
+# 按进度表重算仪表盘的已学计数 (总数 + 每个等级)，只改对不上的行
+# 上线时 init_db.py 已经回填过一次；之后放进 cron 每天低峰期跑一次，例如:
+#   python scripts/reconcile_counters.py            # 所有用户
+#   python scripts/reconcile_counters.py user_abc   # 指定用户
+if __name__ == "__main__":
+    user_ids = sys.argv[1:] or None
+    db = SessionLocal()
+    try:
+        t0 = time.time()
+        fixed = reconcile_learned_counts(db, user_ids)
+        print(f"✅ Reconciled learned counters: {fixed} users corrected in {time.time() - t0:.1f}s")
+    finally:
+        db.close()
@@ -0,0 +1,136 @@
+import sys
+import os
+import time
+import argparse
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# 这一步是为了能导入 backend 目录下的模块
+sys.path.append(os.getcwd())
+
+from backend.app.srs_algo import calculate_review, calculate_review_batch
+
+START = datetime(2026, 1, 1, 8, 0, 0)
+
+
+def make_reviews(cards, steps, seed):
+    """生成 steps 轮、每轮 cards 张卡片的复习评分，以及每轮的复习时间"""
+    rng = np.random.default_rng(seed)
+    # 评分分布大致贴近线上：多数是 3~5，少量忘记
+    qualities = rng.choice([0, 1, 2, 3, 4, 5], size=(steps, cards), p=[0.05, 0.05, 0.1, 0.25, 0.3, 0.25])
+    # 每轮在上一轮基础上往后推 0~3 天，加一点秒级抖动
+    offsets = rng.integers(0, 3 * 86400, size=(steps, cards)).cumsum(axis=0)
+    return qualities, offsets
+
+
+def replay_scalar(qualities, offsets):
+    steps, cards = qualities.shape
+    ef = [2.5] * cards
+    iv = [0] * cards
+    rp = [0] * cards
+    nxt = [None] * cards
+    q_list = qualities.tolist()
+    o_list = offsets.tolist()
+    for s in range(steps):
+        qs, os_ = q_list[s], o_list[s]
+        for i in range(cards):
+            ef[i], iv[i], rp[i], nxt[i] = calculate_review(
+                qs[i], ef[i], iv[i], rp[i], now=START + timedelta(seconds=os_[i])
+            )
+    return ef, iv, rp, nxt
+
+
+def replay_batch(qualities, offsets):
+    steps, cards = qualities.shape
+    ef = np.full(cards, 2.5)
+    iv = np.zeros(cards, dtype=np.int64)
+    rp = np.zeros(cards, dtype=np.int64)
+    nxt = None
+    start = np.datetime64(START, "us")
+    for s in range(steps):
+        now = start + offsets[s].astype("timedelta64[s]")
+        ef, iv, rp, nxt = calculate_review_batch(qualities[s], ef, iv, rp, now)
+    return ef, iv, rp, nxt
+
+
+def check_agree(scalar, batch):
+    ef, iv, rp, nxt = scalar
+    b_ef, b_iv, b_rp, b_nxt = batch
+    mismatches = 0
+    mismatches += int(np.count_nonzero(np.asarray(ef) != b_ef))
+    mismatches += int(np.count_nonzero(np.asarray(iv) != b_iv))
+    mismatches += int(np.count_nonzero(np.asarray(rp) != b_rp))
+    mismatches += int(np.count_nonzero(np.array(nxt, dtype="datetime64[us]") != b_nxt))
+    return mismatches
+
+
+def simulate(cards, steps, seed, skip_scalar=False):
+    qualities, offsets = make_reviews(cards, steps, seed)
+    total = cards * steps
+    print(f"Replaying {total:,} synthetic reviews ({cards:,} cards x {steps} rounds)...")
+
+    t0 = time.perf_counter()
+    batch = replay_batch(qualities, offsets)
+    t_batch = time.perf_counter() - t0
+    print(f"  batch : {t_batch:.3f}s  {total / t_batch:,.0f} reviews/s")
+
+    if skip_scalar:
+        return
+
+    t0 = time.perf_counter()
+    scalar = replay_scalar(qualities, offsets)
+    t_scalar = time.perf_counter() - t0
+    print(f"  scalar: {t_scalar:.3f}s  {total / t_scalar:,.0f} reviews/s")
+    print(f"  speedup: {t_scalar / t_batch:.1f}x")
+
+    mismatches = check_agree(scalar, batch)
+    if mismatches:
+        print(f"❌ {mismatches} fields disagree between scalar and batch")
+        sys.exit(1)
+    print("✅ scalar and batch results agree exactly")
+
+
+def what_if(quality):
+    """对整张 user_word_progress 表假设 "现在都以 quality 复习一次"，看排期会怎么变"""
+    from backend.app.database import SessionLocal
+    from backend.app.model import UserWordProgress
+
+    db = SessionLocal()
+    try:
+        rows = db.query(
+            UserWordProgress.easiness, UserWordProgress.interval, UserWordProgress.repetitions
+        ).all()
+    finally:
+        db.close()
+    if not rows:
+        print("user_word_progress is empty")
+        return
+
+    t0 = time.perf_counter()
+    ef = np.array([r[0] if r[0] is not None else 2.5 for r in rows])
+    iv = np.array([r[1] or 0 for r in rows], dtype=np.int64)
+    rp = np.array([r[2] or 0 for r in rows], dtype=np.int64)
+    q = np.full(len(rows), quality)
+    _, new_iv, _, _ = calculate_review_batch(q, ef, iv, rp, np.datetime64(datetime.utcnow(), "us"))
+    elapsed = time.perf_counter() - t0
+
+    print(f"What-if quality={quality} over {len(rows):,} progress rows ({elapsed:.3f}s)")
+    for p in (50, 90, 99):
+        print(f"  p{p} next interval: {np.percentile(new_iv, p):.0f} days")
+    print(f"  due again within 7 days: {np.count_nonzero(new_iv <= 7) / len(rows):.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SM-2 scheduler simulation / benchmark")
+    parser.add_argument("--cards", type=int, default=200_000)
+    parser.add_argument("--steps", type=int, default=10) # 轮数别太大，全对的卡片间隔是指数增长的
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-scalar", action="store_true", help="只跑向量化版本")
+    parser.add_argument("--what-if", type=int, metavar="QUALITY", help="对数据库里的进度表做 what-if 分析")
+    args = parser.parse_args()
+
+    if args.what_if is not None:
+        what_if(args.what_if)
+    else:
+        simulate(args.cards, args.steps, args.seed, args.skip_scalar)